@@ -0,0 +1,150 @@
+"""
+转录任务准入控制
+
+在解码之前先探测音频时长，根据实测的实时率（RTF，模型推理耗时 / 实际识别的音频时长）估算任务耗时：
+- 超过时长或耗时上限的任务直接拒绝
+- 正在处理的任务总耗时超过预算时，新任务排队等待
+- 损坏或不支持的文件在探测阶段就被拒绝，不会进入解码
+
+限制可通过环境变量配置:
+    WHISPER_MAX_AUDIO_SECONDS   单个文件最大音频时长，默认 4 小时
+    WHISPER_MAX_JOB_SECONDS     单个任务最大预计处理时间，默认 1 小时
+    WHISPER_MAX_PENDING_SECONDS 同时处理中的任务预计总耗时上限，默认 30 分钟
+"""
+
+import os
+import json
+import time
+import pathlib
+import logging
+import threading
+
+from whisper_transcriber import probe_audio
+
+MAX_AUDIO_SECONDS = float(os.environ.get('WHISPER_MAX_AUDIO_SECONDS', 4 * 3600))
+MAX_JOB_SECONDS = float(os.environ.get('WHISPER_MAX_JOB_SECONDS', 3600))
+MAX_PENDING_SECONDS = float(os.environ.get('WHISPER_MAX_PENDING_SECONDS', 1800))
+
+# 尚未实测时使用的保守实时率
+DEFAULT_RTF = 0.5
+# 新测量值在滑动平均中的权重
+RTF_SMOOTHING = 0.3
+
+RTF_STATS_PATH = pathlib.Path(__file__).parent / "log" / "rtf_stats.json"
+
+def format_seconds(seconds):
+    """把秒数格式化为便于阅读的文字"""
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} 秒"
+    if seconds < 3600:
+        return f"{seconds // 60} 分 {seconds % 60} 秒"
+    return f"{seconds // 3600} 小时 {seconds % 3600 // 60} 分"
+
+class AdmissionController:
+    """
+    根据预计耗时决定任务是接受、排队还是拒绝
+    """
+
+    def __init__(self, max_audio_seconds=MAX_AUDIO_SECONDS, max_job_seconds=MAX_JOB_SECONDS,
+                 max_pending_seconds=MAX_PENDING_SECONDS, stats_path=RTF_STATS_PATH):
+        self.max_audio_seconds = max_audio_seconds
+        self.max_job_seconds = max_job_seconds
+        self.max_pending_seconds = max_pending_seconds
+        self.stats_path = pathlib.Path(stats_path)
+        self.rtf, self.preset_rtf = self._load_rtf()
+        self.pending_seconds = 0.0
+        self.running_jobs = 0
+        self._condition = threading.Condition()
+
+    def _load_rtf(self):
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                stats = json.load(f)
+            presets = {name: float(rtf) for name, rtf in stats.get('presets', {}).items()}
+            return float(stats['rtf']), presets
+        except (OSError, ValueError, KeyError, AttributeError):
+            return DEFAULT_RTF, {}
+
+    def _save_rtf(self):
+        try:
+            self.stats_path.parent.mkdir(exist_ok=True)
+            with open(self.stats_path, 'w', encoding='utf-8') as f:
+                json.dump({'rtf': self.rtf, 'presets': self.preset_rtf, 'updated': time.time()}, f)
+        except OSError as e:
+            logging.warning(f"保存实时率统计失败: {str(e)}")
+
+    def rtf_for(self, preset=None):
+        """预设的实时率，该预设还没有实测数据时使用总体实时率"""
+        return self.preset_rtf.get(preset, self.rtf) if preset else self.rtf
+
+    def estimate(self, audio_path, preset=None):
+        """
+        探测音频并估算处理耗时
+
+        参数:
+            preset: 可选，识别预设名称，按该预设的实测实时率估算
+        返回:
+            dict: probe_audio 的结果，外加 estimated_seconds
+        异常:
+            ValueError: 文件损坏、不支持或超出限制
+        """
+        info = probe_audio(audio_path)
+        duration = info['duration']
+        if duration is None:
+            raise ValueError("无法读取音频时长，文件可能已损坏")
+        if duration <= 0:
+            raise ValueError("音频为空")
+        if duration > self.max_audio_seconds:
+            raise ValueError(f"音频时长 {format_seconds(duration)} 超过上限 {format_seconds(self.max_audio_seconds)}")
+
+        info['estimated_seconds'] = duration * self.rtf_for(preset)
+        if info['estimated_seconds'] > self.max_job_seconds:
+            raise ValueError(f"预计处理时间 {format_seconds(info['estimated_seconds'])} "
+                             f"超过上限 {format_seconds(self.max_job_seconds)}")
+        return info
+
+    def acquire(self, estimate, on_wait=None):
+        """
+        等待直到处理中的任务总耗时留出足够预算
+
+        参数:
+            estimate: estimate() 的返回值
+            on_wait: 需要排队时调用一次，参数为预计等待秒数
+        """
+        cost = estimate['estimated_seconds']
+        with self._condition:
+            def has_room():
+                return self.running_jobs == 0 or self.pending_seconds + cost <= self.max_pending_seconds
+
+            if not has_room() and on_wait is not None:
+                on_wait(self.pending_seconds)
+            self._condition.wait_for(has_room)
+            self.pending_seconds += cost
+            self.running_jobs += 1
+
+    def release(self, estimate):
+        with self._condition:
+            self.pending_seconds = max(0.0, self.pending_seconds - estimate['estimated_seconds'])
+            self.running_jobs -= 1
+            self._condition.notify_all()
+
+    def record(self, audio_seconds, elapsed_seconds, preset=None):
+        """
+        用一次实际运行结果更新实时率（总体和所用预设各一份）
+
+        参数:
+            audio_seconds: 实际经过模型识别的音频时长（不含复用缓存的部分），为 0 时不更新
+            elapsed_seconds: 模型推理耗时（不含排队、解码等待）
+        """
+        if audio_seconds <= 0:
+            return
+        measured = elapsed_seconds / audio_seconds
+        with self._condition:
+            self.rtf = (1 - RTF_SMOOTHING) * self.rtf + RTF_SMOOTHING * measured
+            if preset:
+                previous = self.preset_rtf.get(preset)
+                self.preset_rtf[preset] = measured if previous is None else \
+                    (1 - RTF_SMOOTHING) * previous + RTF_SMOOTHING * measured
+            self._save_rtf()
+        logging.info(f"本次实时率 {measured:.3f}，平均实时率更新为 {self.rtf:.3f}")
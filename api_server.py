@@ -0,0 +1,417 @@
+"""
+语音转文字 HTTP 接口
+
+提供一个支持分块上传的 REST 接口：上传的字节一边到达一边送入 ffmpeg 解码，
+每凑够一个识别窗口就立即开始推理，上传和识别可以同时进行。
+
+接口:
+    POST /api/transcribe?filename=xxx.mp3&wait=true
+        请求体为音频文件的原始字节（支持 Transfer-Encoding: chunked）。
+        wait=true 时等待识别完成后返回转录结果，wait=false 时上传结束即返回任务 ID。
+    GET /api/jobs/{job_id}
+        查询任务状态和结果。
+    GET /api/models
+        各模型的加载耗时、驻留情况等指标。
+    以上识别接口都支持 model 参数（tiny/base/small/medium 或本地模型名），默认使用默认模型。
+    WebSocket /api/live?format=s16le&latency=2.0
+        实时转录。客户端持续发送 16kHz 单声道 PCM 二进制帧（format 为 s16le 或 f32le），发送文本 "EOS" 表示结束；
+        服务端推送 JSON 事件：{"type": "partial", ...} 临时结果，{"type": "final", ...} 确认片段，
+        {"type": "error", ...} 出错（格式不支持、接收或识别失败），之后连接关闭。
+
+示例:
+    curl -T meeting.mp3 "http://127.0.0.1:7860/api/transcribe?filename=meeting.mp3"
+"""
+
+import os
+import time
+import asyncio
+import uuid
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+from fastapi import APIRouter, HTTPException, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+
+from model_registry import ModelRegistry
+from presets import cache_scope, get_preset, pipeline_options
+from live_transcriber import LiveTranscriber, PcmFrameDecoder
+from whisper_transcriber import (
+    FfmpegPcmDecoder,
+    convert_audio_to_wav,
+    find_split_point,
+    get_ffmpeg_binary,
+    load_audio,
+    process_text_with_punctuation,
+    save_transcript,
+    setup_directories_and_logging,
+    transcribe_segment,
+)
+
+# 每个识别窗口的长度，等于 pipeline 一个批次能处理的音频时长（15 秒 x 16）
+STREAM_WINDOW_SECONDS = 240
+# 在窗口末尾这段范围内寻找静音位置作为切分点
+SPLIT_SEARCH_SECONDS = 5
+# 最多保留的已完成任务数
+MAX_FINISHED_JOBS = 100
+
+SAMPLE_RATE = 16000
+
+class StreamingJob:
+    """
+    一次流式上传对应的识别任务
+
+    上传线程通过 feed() 写入字节；识别线程在解码结果凑够一个窗口后立即推理。
+    上传内容同时落盘，流式解码失败（例如 moov 在文件末尾的 MP4）时改为对完整文件识别。
+    """
+
+    def __init__(self, pipe, filename, infer=None, release=None):
+        self.job_id = uuid.uuid4().hex
+        self.pipe = pipe
+        # 任务结束（完成、失败或中断）后调用，释放对模型的占用
+        self.release = release
+        self.infer = infer if infer is not None else (lambda audio: transcribe_segment(pipe, audio))
+        self.filename = os.path.basename(filename) or "upload"
+        self.status = "uploading"
+        self.text = None
+        self.error = None
+        self.result_file = None
+        self.bytes_received = 0
+        self.audio_seconds = 0.0
+        self.created = time.time()
+        self.finished_at = None
+        self.uploaded = threading.Event()
+        self.done = threading.Event()
+
+        suffix = os.path.splitext(self.filename)[1] or '.bin'
+        spool = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        self.spool_path = spool.name
+        self.spool = spool
+
+        self.decoder = None
+        if get_ffmpeg_binary() is not None:
+            self.decoder = FfmpegPcmDecoder(sr=SAMPLE_RATE)
+        elif suffix.lower() != '.wav':
+            spool.close()
+            os.remove(self.spool_path)
+            raise Exception("ffmpeg 未正确安装，只能上传 WAV 格式的音频")
+        # 没有 ffmpeg 时 WAV 不边传边解码，上传完成后直接读取文件（与网页界面相同）
+        self.decoder_failed = self.decoder is None
+        self.segments = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def feed(self, data):
+        """写入一段上传数据"""
+        self.bytes_received += len(data)
+        self.spool.write(data)
+        if not self.decoder_failed:
+            try:
+                self.decoder.feed(data)
+            except (BrokenPipeError, OSError):
+                # ffmpeg 提前退出，剩余部分等上传完成后按完整文件处理
+                self.decoder_failed = True
+
+    def finish_upload(self):
+        """上传结束"""
+        self.spool.close()
+        if self.decoder is not None:
+            self.decoder.close()
+        # 识别线程可能已经先结束（例如识别失败），不能覆盖它的状态
+        if self.status == "uploading":
+            self.status = "transcribing"
+        self.uploaded.set()
+
+    def abort(self):
+        """客户端断开，放弃任务"""
+        self.error = "上传中断"
+        self.spool.close()
+        if self.decoder is not None:
+            self.decoder.kill()
+        self.uploaded.set()
+
+    def wait(self):
+        self.done.wait()
+
+    def _run(self):
+        try:
+            if self.decoder is None:
+                self._transcribe_spooled_file()
+            else:
+                self._transcribe_stream()
+
+            text = process_text_with_punctuation(''.join(self.segments))
+            _, result_file_path = setup_directories_and_logging()
+            save_transcript(result_file_path, self.filename, text)
+            self.text = text
+            self.result_file = str(result_file_path)
+            self.status = "done"
+            logging.info(f"流式任务 {self.job_id} 完成，结果已保存到: {result_file_path}")
+        except Exception as e:
+            self.status = "failed"
+            self.error = self.error or str(e)
+            logging.error(f"流式任务 {self.job_id} 失败: {str(e)}")
+        finally:
+            self.finished_at = time.time()
+            if os.path.exists(self.spool_path):
+                try:
+                    os.remove(self.spool_path)
+                except OSError:
+                    pass
+            if self.release is not None:
+                self.release()
+            self.done.set()
+
+    def _transcribe_stream(self):
+        """边接收边识别，每凑够一个窗口就开始推理"""
+        window = STREAM_WINDOW_SECONDS * SAMPLE_RATE
+        search = SPLIT_SEARCH_SECONDS * SAMPLE_RATE
+        position = 0
+
+        # 上传过程中，每凑够一个窗口就开始识别
+        while True:
+            available = self.decoder.wait_for_samples(position + window)
+            if available >= position + window:
+                tail_start = position + window - search
+                tail = self.decoder.get_samples(tail_start, position + window)
+                end = tail_start + find_split_point(tail, len(tail), search)
+                self._transcribe(self.decoder.get_samples(position, end))
+                position = end
+                # 已识别的部分不再需要，长上传时内存中只保留不到一个窗口的音频
+                self.decoder.discard(position)
+            elif self.decoder.finished:
+                break
+
+        try:
+            self.decoder.wait()
+        except Exception as e:
+            # 只有解码失败时才改为完整文件识别；识别本身的错误直接使任务失败
+            if self.error is not None:
+                raise
+            logging.warning(f"流式解码失败，改为完整文件识别: {str(e)}")
+            self._transcribe_spooled_file()
+            return
+        self._transcribe(self.decoder.get_samples(position, self.decoder.num_samples))
+        self.audio_seconds = self.decoder.num_samples / SAMPLE_RATE
+
+    def _transcribe(self, audio):
+        if len(audio) > 0:
+            self.segments.append(self.infer(audio))
+
+    def _transcribe_spooled_file(self):
+        # 等待上传线程写完整个文件
+        self.uploaded.wait()
+        if self.error is not None:
+            raise Exception(self.error)
+        self.segments = []
+        wav_path = convert_audio_to_wav(self.spool_path)
+        try:
+            audio, _ = load_audio(wav_path, sr=SAMPLE_RATE)
+            self.audio_seconds = len(audio) / SAMPLE_RATE
+            self._transcribe(audio)
+        finally:
+            if wav_path != self.spool_path and os.path.exists(wav_path):
+                os.remove(wav_path)
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "filename": self.filename,
+            "status": self.status,
+            "text": self.text,
+            "error": self.error,
+            "result_file": self.result_file,
+            "bytes_received": self.bytes_received,
+            "audio_seconds": round(self.audio_seconds, 2),
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.created, 2),
+        }
+
+class JobStore:
+    """
+    保存最近的任务，超出上限时丢弃最早完成的任务
+    """
+
+    def __init__(self, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._jobs[job.job_id] = job
+            finished = [job_id for job_id, j in self._jobs.items() if j.done.is_set()]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+async def _acquire_model(registry, model=None, dtype=None):
+    """
+    在线程池中取得模型并保持占用（加载可能需要较长时间），占用期间模型不会被卸载
+
+    返回:
+        tuple: (pipeline, 释放占用的函数)
+    """
+    lease = registry.acquire(model, dtype)
+    pipe = await run_in_threadpool(lease.__enter__)
+    return pipe, lambda: lease.__exit__(None, None, None)
+
+async def _close_with_error(websocket, message):
+    """向客户端发送错误事件并关闭连接（连接已断开时忽略）"""
+    try:
+        await websocket.send_json({"type": "error", "message": message})
+        await websocket.close()
+    except Exception:
+        pass
+
+def create_api_router(registry, scheduler=None):
+    """
+    创建 HTTP 接口路由
+
+    参数:
+        registry: ModelRegistry，按请求的模型取得 pipeline
+        scheduler: 可选的 JobScheduler，提供时上传任务的识别窗口交给调度器排队
+    返回:
+        APIRouter: 可挂载到 FastAPI 应用上的路由
+    """
+    router = APIRouter(prefix="/api")
+    jobs = JobStore()
+
+    @router.post("/transcribe")
+    async def transcribe_upload(request: Request, filename: str = "upload", wait: bool = True,
+                                model: str = None, preset: str = None):
+        try:
+            preset = get_preset(preset)
+            model = model or preset["model"]
+            # 整个任务期间占用模型，由 StreamingJob 结束时释放
+            pipe, release = await _acquire_model(registry, model, preset["dtype"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"模型未能正确加载: {str(e)}")
+
+        options = pipeline_options(preset)
+        if scheduler is not None:
+            user = request.client.host if request.client else "anonymous"
+            infer = lambda audio: scheduler.transcribe(
+                audio, user=user, priority="normal", model=model, options=options, dtype=preset["dtype"],
+                cache_scope=cache_scope(preset, model))
+        else:
+            infer = lambda audio: transcribe_segment(pipe, audio, options=options)
+
+        try:
+            job = StreamingJob(pipe, filename, infer=infer, release=release)
+        except Exception as e:
+            release()
+            raise HTTPException(status_code=500, detail=str(e))
+        jobs.add(job)
+        job.start()
+
+        try:
+            async for chunk in request.stream():
+                if chunk:
+                    await run_in_threadpool(job.feed, chunk)
+        except ClientDisconnect:
+            job.abort()
+            raise HTTPException(status_code=400, detail="上传中断")
+        await run_in_threadpool(job.finish_upload)
+
+        if not wait:
+            return job.to_dict()
+        await run_in_threadpool(job.wait)
+        if job.status == "failed":
+            raise HTTPException(status_code=500, detail=job.error)
+        return job.to_dict()
+
+    @router.get("/jobs/{job_id}")
+    async def get_job(job_id: str):
+        job = jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        return job.to_dict()
+
+    @router.get("/models")
+    async def model_metrics():
+        return {"models": registry.metrics()}
+
+    @router.websocket("/live")
+    async def live_transcribe(websocket: WebSocket, format: str = "s16le", latency: float = 2.0,
+                              model: str = None):
+        await websocket.accept()
+        try:
+            frames = PcmFrameDecoder(format)
+        except ValueError as e:
+            await websocket.send_json({"type": "error", "message": str(e)})
+            await websocket.close()
+            return
+        try:
+            pipe, release = await _acquire_model(registry, model)
+        except Exception as e:
+            await websocket.send_json({"type": "error", "message": f"模型未能正确加载: {str(e)}"})
+            await websocket.close()
+            return
+
+        session = LiveTranscriber(pipe, latency_target=latency)
+        ended = asyncio.Event()
+        disconnected = asyncio.Event()
+
+        async def receive_audio():
+            # 接收出错或连接断开时都要设置 disconnected，否则主循环会一直等待下去
+            try:
+                while True:
+                    message = await websocket.receive()
+                    if message["type"] == "websocket.disconnect":
+                        return
+                    if message.get("bytes"):
+                        session.push(frames.decode(message["bytes"]))
+                    elif message.get("text") == "EOS":
+                        ended.set()
+                        return
+            except Exception as e:
+                logging.error(f"接收实时音频失败: {str(e)}")
+                await _close_with_error(websocket, f"接收音频失败: {str(e)}")
+            finally:
+                if not ended.is_set():
+                    disconnected.set()
+
+        receiver = asyncio.create_task(receive_audio())
+        try:
+            while not disconnected.is_set():
+                if session.ready():
+                    events = await run_in_threadpool(session.step)
+                elif ended.is_set():
+                    for event in await run_in_threadpool(session.flush):
+                        await websocket.send_json(event)
+                    await websocket.send_json({"type": "done", "audio_end": round(session.audio_end, 3)})
+                    await websocket.close()
+                    break
+                else:
+                    await asyncio.sleep(0.02)
+                    continue
+                for event in events:
+                    await websocket.send_json(event)
+        except Exception as e:
+            logging.error(f"实时转录连接异常: {str(e)}")
+            await _close_with_error(websocket, f"识别失败: {str(e)}")
+        finally:
+            receiver.cancel()
+            release()
+
+    return router
+
+if __name__ == "__main__":
+    import uvicorn
+    from fastapi import FastAPI
+
+    setup_directories_and_logging()
+    api_registry = ModelRegistry()
+    api_registry.get()
+    app = FastAPI(title="语音转文字接口")
+    app.include_router(create_api_router(api_registry))
+    uvicorn.run(app, host="127.0.0.1", port=7861)
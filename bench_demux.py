@@ -0,0 +1,94 @@
+"""
+视频文件音频提取速度对比
+
+对比两种把视频中的音频读成 16kHz float32 数组的方式:
+    pydub   convert_audio_to_wav（AudioSegment.from_file 解码后导出临时 WAV）+ load_audio
+    demux   decode_audio_stream（ffmpeg 只解码音频流，PCM 通过管道直接读入数组）
+报告耗时、ffmpeg 子进程 CPU 时间（仅 Linux/macOS）和本进程 RSS 峰值增量（需要 psutil），
+并检查两种方式的结果是否一致。
+
+用法:
+    python bench_demux.py 录屏1.mp4 录屏2.mkv --repeat 3
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+
+from memory_guard import MemoryTracker
+from whisper_transcriber import convert_audio_to_wav, decode_audio_stream, load_audio
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+def children_cpu_seconds():
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+def via_pydub(path):
+    wav_path = convert_audio_to_wav(path)
+    try:
+        audio, _ = load_audio(wav_path, sr=16000)
+        return np.array(audio)
+    finally:
+        if wav_path != path:
+            os.remove(wav_path)
+
+def via_demux(path):
+    return decode_audio_stream(path, sr=16000)
+
+def measure(method, path, repeat):
+    best = None
+    for _ in range(repeat):
+        cpu_before = children_cpu_seconds()
+        with MemoryTracker() as tracker:
+            with tracker.stage("decode"):
+                start = time.perf_counter()
+                audio = method(path)
+                elapsed = time.perf_counter() - start
+        cpu_after = children_cpu_seconds()
+        run = {
+            "seconds": elapsed,
+            "child_cpu": None if cpu_before is None else cpu_after - cpu_before,
+            "rss_mb": tracker.report()["stages"]["decode"]["rss_over_baseline_mb"],
+        }
+        if best is None or run["seconds"] < best["seconds"]:
+            best = run
+    return best, audio
+
+def main():
+    parser = argparse.ArgumentParser(description="视频文件音频提取速度对比")
+    parser.add_argument("files", nargs="+", help="视频文件")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式的测量次数（取最快一次）")
+    args = parser.parse_args()
+
+    methods = [("pydub", via_pydub), ("demux", via_demux)]
+    for path in args.files:
+        size_gb = os.path.getsize(path) / 1024 ** 3
+        print(f"\n{path}（{size_gb:.2f} GB）")
+        results = {}
+        for name, method in methods:
+            try:
+                run, audio = measure(method, path, args.repeat)
+            except Exception as e:
+                print(f"  {name:<6} 失败: {str(e)}")
+                continue
+            results[name] = audio
+            cpu = '-' if run["child_cpu"] is None else f"{run['child_cpu']:.1f}s"
+            rss = '-' if run["rss_mb"] is None else f"{run['rss_mb']:.0f} MB"
+            print(f"  {name:<6} 耗时 {run['seconds']:.2f}s  ffmpeg CPU {cpu}  RSS 增量 {rss}  "
+                  f"音频 {len(audio) / 16000:.1f}s")
+        if len(results) == 2:
+            a, b = results["pydub"], results["demux"]
+            n = min(len(a), len(b))
+            diff = float(np.max(np.abs(a[:n] - b[:n]))) if n else 0.0
+            print(f"  长度差 {abs(len(a) - len(b))} 个采样，最大差值 {diff:.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+流水线执行吞吐量测试
+
+对长音频比较三种执行方式的耗时:
+    stock       transformers pipeline（每批先编码再解码，15 秒分块带重叠）
+    sequential  PipelinedPipeline(depth=0)：与流水线相同的 30 秒分块，但逐批先编码再解码
+    pipelined   PipelinedPipeline：编码第 N+1 批与解码第 N 批重叠执行
+sequential 与 pipelined 的差别只在于是否重叠，用来单独衡量流水线带来的收益。
+
+用法:
+    python bench_pipelined.py 讲座.mp3 会议.wav --model small --batch-size 16
+"""
+
+import time
+import argparse
+
+from model_registry import available_models, resolve_model
+from pipelined import PipelinedPipeline
+from whisper_transcriber import build_pipeline, read_audio_file
+
+def measure(pipe, audio, repeat, **kwargs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = pipe(audio, **kwargs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result["text"]
+
+def main():
+    parser = argparse.ArgumentParser(description="流水线执行吞吐量测试")
+    parser.add_argument("files", nargs="+", help="音频文件（建议 10 分钟以上）")
+    parser.add_argument("--model", default="small", choices=available_models())
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--depth", type=int, default=2, help="编码最多领先解码的批数")
+    parser.add_argument("--repeat", type=int, default=1, help="每种方式的测量次数（取最快一次）")
+    args = parser.parse_args()
+
+    model_id, _ = resolve_model(args.model)
+    pipe = build_pipeline(model_id)
+    methods = [
+        ("stock", pipe, {"chunk_length_s": 15}),
+        ("sequential", PipelinedPipeline(pipe, depth=0), {}),
+        ("pipelined", PipelinedPipeline(pipe, depth=args.depth), {}),
+    ]
+    # 预热一次，避免 CUDA 初始化和算子选择计入第一种方式
+    pipe(read_audio_file(args.files[0])[:16000 * 30])
+
+    totals = {name: 0.0 for name, _, _ in methods}
+    audio_seconds = 0.0
+    for path in args.files:
+        audio = read_audio_file(path)
+        audio_seconds += len(audio) / 16000
+        print(f"\n{path}（{len(audio) / 16000 / 60:.1f} 分钟）")
+        for name, method, kwargs in methods:
+            elapsed, text = measure(method, audio, args.repeat, batch_size=args.batch_size, **kwargs)
+            totals[name] += elapsed
+            print(f"  {name:<10} {elapsed:7.1f}s  RTF {elapsed / (len(audio) / 16000):.3f}  文本 {len(text)} 字")
+
+    print("\n| 方式 | 总耗时 | 吞吐量（音频秒/秒） | 相对 stock |")
+    print("| --- | --- | --- | --- |")
+    for name, _, _ in methods:
+        print(f"| {name} | {totals[name]:.1f}s | {audio_seconds / totals[name]:.1f} | "
+              f"{totals['stock'] / totals[name]:.2f}x |")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+识别预设的速度与准确率测试
+
+对样本目录中的每个音频文件，用各预设识别并与同名 .txt 参考文本比较，报告:
+    RTF     实时率 = 识别耗时 / 音频时长（不含模型加载）
+    错误率  中文按字计算（CER），其他语言按词计算（WER）；比较前去掉标点和大小写差异
+
+样本目录格式:
+    samples/
+        会议片段.wav
+        会议片段.txt     参考文本（UTF-8）
+        lecture.mp3
+        lecture.txt
+
+用法:
+    python bench_presets.py --samples samples --presets fast balanced accurate
+输出的 Markdown 表格可以直接贴到 README 中。
+"""
+
+import os
+import re
+import time
+import argparse
+import unicodedata
+
+import numpy as np
+
+from model_registry import ModelRegistry
+from pcm_cache import default_pcm_cache
+from presets import PRESETS, get_preset, pipeline_options
+from whisper_transcriber import read_audio_file, transcribe_segments
+
+_CJK = re.compile(r'[㐀-鿿豈-﫿]')
+
+def tokenize(text):
+    """去掉标点后切分为比较单位：含中日文字符时按字，否则按词"""
+    text = unicodedata.normalize('NFKC', text).lower()
+    text = ''.join(ch for ch in text if not unicodedata.category(ch).startswith('P'))
+    if _CJK.search(text):
+        return [ch for ch in text if not ch.isspace()]
+    return text.split()
+
+def edit_distance(reference, hypothesis):
+    """词（字）级编辑距离"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        current = [i] + [0] * len(hypothesis)
+        for j, hyp in enumerate(hypothesis, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref != hyp))
+        previous = current
+    return previous[-1]
+
+def load_samples(directory, pcm_cache=None):
+    """返回 [(名称, 音频数组, 参考文本)]，没有参考文本的音频被跳过"""
+    samples = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        reference_path = os.path.join(directory, stem + '.txt')
+        if ext.lower() == '.txt' or not os.path.exists(reference_path):
+            continue
+        audio = np.asarray(read_audio_file(os.path.join(directory, name), pcm_cache=pcm_cache), dtype=np.float32)
+        with open(reference_path, 'r', encoding='utf-8') as f:
+            samples.append((stem, audio, f.read()))
+    return samples
+
+def run_preset(registry, preset_name, samples):
+    preset = get_preset(preset_name)
+    options = pipeline_options(preset)
+    audio_seconds = 0.0
+    elapsed = 0.0
+    errors = 0
+    tokens = 0
+    with registry.acquire(preset["model"], preset["dtype"]) as pipe:
+        for _, audio, reference in samples:
+            start = time.perf_counter()
+            text, _ = transcribe_segments(pipe, audio, options=options)
+            elapsed += time.perf_counter() - start
+            audio_seconds += len(audio) / 16000
+            reference_tokens = tokenize(reference)
+            errors += edit_distance(reference_tokens, tokenize(text))
+            tokens += len(reference_tokens)
+    return {
+        "preset": preset_name,
+        "model": preset["model"],
+        "rtf": elapsed / audio_seconds if audio_seconds else 0.0,
+        "error_rate": errors / tokens if tokens else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="识别预设的速度与准确率测试")
+    parser.add_argument("--samples", default="samples", help="样本目录（音频 + 同名 .txt 参考文本）")
+    parser.add_argument("--presets", nargs="+", default=list(PRESETS), choices=list(PRESETS))
+    args = parser.parse_args()
+
+    # WHISPER_PCM_CACHE=1 时重复测试不再重新解码样本
+    samples = load_samples(args.samples, default_pcm_cache())
+    if not samples:
+        parser.error(f"{args.samples} 中没有带参考文本的音频")
+    total = sum(len(audio) for _, audio, _ in samples) / 16000
+    print(f"样本 {len(samples)} 个，共 {total:.0f} 秒\n")
+
+    registry = ModelRegistry()
+    print("| 预设 | 模型 | RTF | 错误率 |")
+    print("| --- | --- | --- | --- |")
+    for name in args.presets:
+        result = run_preset(registry, name, samples)
+        print(f"| {result['preset']} | {result['model']} | {result['rtf']:.3f} | {result['error_rate']:.1%} |")
+
+if __name__ == "__main__":
+    main()
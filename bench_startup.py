@@ -0,0 +1,94 @@
+"""
+启动速度测试
+
+1. 在全新的 Python 进程中分别测量各模块的导入耗时
+2. 启动 webui.py，测量端口首次响应（/health 返回首字节）的时间，以及模型就绪（/ready 返回 200）的时间
+
+用法:
+    python bench_startup.py --port 7870 --ready-timeout 600
+"""
+
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.request
+import urllib.error
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT_TARGETS = ["whisper_transcriber", "webui", "gradio", "torch", "transformers", "librosa"]
+
+def measure_import(module, repeat):
+    """在新进程中导入模块，返回多次测量中的最短耗时（秒）"""
+    code = ("import time; t = time.perf_counter(); "
+            f"import {module}; print(time.perf_counter() - t)")
+    best = None
+    for _ in range(repeat):
+        completed = subprocess.run([sys.executable, "-c", code], cwd=current_dir,
+                                   capture_output=True, text=True)
+        if completed.returncode != 0:
+            return None
+        elapsed = float(completed.stdout.strip().splitlines()[-1])
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def poll(url, deadline, expect_ok):
+    """
+    轮询 url 直到有响应（expect_ok 为 True 时要求状态码 200），返回是否在 deadline 之前得到响应
+    """
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                response.read(1)
+                return True
+        except urllib.error.HTTPError:
+            if not expect_ok:
+                return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    return False
+
+def measure_server(port, ready_timeout):
+    env = dict(os.environ, WHISPER_PORT=str(port), WHISPER_NO_BROWSER="1")
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "webui.py"], cwd=current_dir, env=env,
+                               stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    try:
+        base = f"http://127.0.0.1:{port}"
+        deadline = start + ready_timeout
+        first_byte = time.perf_counter() - start if poll(f"{base}/health", deadline, False) else None
+        ready = time.perf_counter() - start if poll(f"{base}/ready", deadline, True) else None
+        return first_byte, ready
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description="启动速度测试")
+    parser.add_argument("--port", type=int, default=7870)
+    parser.add_argument("--repeat", type=int, default=3, help="每个模块导入测量次数")
+    parser.add_argument("--ready-timeout", type=float, default=600, help="等待模型就绪的最长秒数")
+    parser.add_argument("--skip-server", action="store_true", help="只测导入耗时")
+    args = parser.parse_args()
+
+    print("模块导入耗时（新进程，取最短）:")
+    for module in IMPORT_TARGETS:
+        elapsed = measure_import(module, args.repeat)
+        print(f"  {module:<22} {'导入失败' if elapsed is None else f'{elapsed:.2f}s'}")
+
+    if args.skip_server:
+        return
+    first_byte, ready = measure_server(args.port, args.ready_timeout)
+    print("\nwebui.py 启动:")
+    print(f"  首字节时间（/health）  {'超时' if first_byte is None else f'{first_byte:.2f}s'}")
+    print(f"  模型就绪时间（/ready） {'超时' if ready is None else f'{ready:.2f}s'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+分段识别结果缓存
+
+长音频按 split_audio 切分后，每段解码后的 PCM 计算指纹（SHA-256，连同模型名称一起计算），
+识别文本按指纹保存。重新提交追加或截断过的录音时，内容没有变化的段直接使用缓存，
+只有指纹变化的段需要重新识别，最后按顺序拼接成完整文本。
+
+切分点优先选在前后 2 分钟内最安静的位置（见 whisper_transcriber.quiet_points），只取决于附近的音频，
+所以在末尾追加内容时，前面的段保持不变，只有原来最后一两段和新增部分需要重新识别；从末尾截断时同理。
+从开头剪掉一段时，开头几分钟之后的切分点位置不变（相对内容而言），这些段同样可以复用。
+
+通过环境变量配置:
+    WHISPER_CHUNK_CACHE         设为 0 关闭缓存，默认开启
+    WHISPER_CHUNK_CACHE_DIR     缓存目录，默认程序目录下的 cache/chunks
+    WHISPER_CHUNK_CACHE_MB      缓存总大小上限（MB），默认 256，超过后按最近使用时间从旧到新删除
+"""
+
+import os
+import json
+import pathlib
+import hashlib
+import logging
+import tempfile
+import threading
+
+import numpy as np
+
+CHUNK_CACHE_ENABLED = os.environ.get('WHISPER_CHUNK_CACHE', '1') != '0'
+CHUNK_CACHE_DIR = pathlib.Path(os.environ.get(
+    'WHISPER_CHUNK_CACHE_DIR', pathlib.Path(__file__).parent / "cache" / "chunks"))
+CHUNK_CACHE_MB = float(os.environ.get('WHISPER_CHUNK_CACHE_MB', 256))
+
+# 每段的文件很小，每写入这么多段才检查一次总大小
+EVICT_EVERY = 64
+
+def chunk_fingerprint(audio, scope=''):
+    """
+    计算一段音频的指纹
+
+    参数:
+        audio: 单声道 float32 音频数组
+        scope: 影响识别结果的配置（模型名称等），不同配置的结果互不复用
+    返回:
+        str: 十六进制指纹
+    """
+    digest = hashlib.sha256(scope.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(np.ascontiguousarray(audio, dtype=np.float32).data)
+    return digest.hexdigest()
+
+class ChunkCache:
+    """
+    按指纹保存分段识别文本，每段一个 JSON 文件，多个进程可以共用同一个目录
+
+    参数:
+        directory: 缓存目录
+        budget_mb: 缓存总大小上限（MB）
+    """
+
+    def __init__(self, directory=CHUNK_CACHE_DIR, budget_mb=CHUNK_CACHE_MB):
+        self.directory = pathlib.Path(directory)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def get(self, key):
+        """返回缓存的识别文本，没有时返回 None"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = json.load(f)["text"]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logging.warning(f"读取分段缓存失败: {str(e)}")
+            return None
+        try:
+            # 修改时间记录最近使用时间，淘汰时优先删除最久未用的文件
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def put(self, key, text, seconds=None):
+        """保存一段的识别文本（先写临时文件再替换，读取方不会看到写了一半的文件）"""
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"text": text, "seconds": seconds}, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logging.warning(f"写入分段缓存失败: {str(e)}")
+            return
+        with self._lock:
+            self._puts += 1
+            check = self._puts % EVICT_EVERY == 1
+        if check:
+            self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """缓存总大小超过上限时，按最近使用时间从旧到新删除"""
+        entries = []
+        for path in self.directory.glob('*/*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+def default_chunk_cache():
+    """按环境变量创建缓存，关闭时返回 None"""
+    return ChunkCache() if CHUNK_CACHE_ENABLED else None
@@ -0,0 +1,319 @@
+"""
+解码循环检测与按语音时长限制生成长度
+
+Whisper 在噪声或音乐片段上有时会陷入重复循环，一直生成到 max_new_tokens（256）为止，
+这些分块耗费完整的解码时间却只产生无用的文字。这里在生成过程中逐步检查每个分块:
+    重复     末尾出现同一个 n-gram 连续重复（单个 token 重复 16 次，或 2~32 个 token 的片段重复 4 次以上）
+    压缩率   已生成文本的 zlib 压缩率超过 2.4（与 Whisper 温度回退使用的阈值相同）
+    长度     已生成的 token 数超过按该分块语音时长估算的上限
+满足任一条件的分块立即停止生成，整批都停止后解码结束。
+
+语音时长由梅尔频谱估算：特征提取把对数梅尔频谱限制在最大值以下 80 dB，填充和数字静音都落在这个下限上，
+比下限高 10 dB 以上的帧计为语音。宁可多算：连续说话没有停顿时不会低估，噪声会被算作语音，但循环仍由另外两项检测。
+上限 = 32 + 每秒语音 WHISPER_TOKENS_PER_SECOND 个 token，最多 256；静音分块只允许很短的输出。
+中文每个字通常对应 1~3 个 token，正常语速每秒语音约 10~20 个 token，默认值留有余量。
+因长度上限停止的分块可能截断了正常文字，会记录警告并在任务状态中提示。
+
+节省的 token 数和时间写入任务元数据（decoding）。因为无法知道被停止的分块原本会生成多少，
+按"循环会一直持续到 256 个 token"估算，节省时间 = 少执行的解码步数 x 该批实测的每步耗时。
+只统计循环和压缩率检测停止的分块；因长度上限停止的分块单独记为 budget_tokens，不算作节省。
+温度回退时 generate 会对部分分块重新生成，每次重新生成单独计数。
+
+通过环境变量配置:
+    WHISPER_LOOP_GUARD          设为 0 关闭检测和长度限制，默认开启
+    WHISPER_TOKENS_PER_SECOND   每秒语音允许的 token 数，默认 25；设为 0 只检测循环、不按时长限制
+"""
+
+import os
+import time
+import zlib
+import logging
+import threading
+import contextlib
+
+import numpy as np
+
+LOOP_GUARD_ENABLED = os.environ.get('WHISPER_LOOP_GUARD', '1') != '0'
+TOKENS_PER_SECOND = float(os.environ.get('WHISPER_TOKENS_PER_SECOND', 25))
+
+# 每个分块最多生成的 token 数（与 pipeline 的设置相同）
+MAX_NEW_TOKENS = 256
+# 按语音时长估算的上限之外额外允许的 token 数（语言、任务等特殊 token 和短句）
+BASE_TOKENS = 32
+
+# 梅尔频谱每帧 10ms；Whisper 的对数梅尔频谱中 1.0 相当于 40 dB，
+# 特征提取时低于最大值 80 dB（2.0）的部分被截断到下限
+FRAME_SECONDS = 0.01
+CLAMP_RANGE = 2.0
+VOICED_MARGIN = 0.25
+
+# 重复检测：周期为 1 的片段至少重复 16 次，更长的片段至少重复 4 次
+LOOP_MIN_TOKENS = 16
+LOOP_MIN_REPEATS = 4
+LOOP_MAX_PERIOD = 32
+COMPRESSION_RATIO_THRESHOLD = 2.4
+COMPRESSION_MIN_TOKENS = 48
+# 每生成多少个 token 检查一次
+CHECK_EVERY = 8
+
+_local = threading.local()
+
+def speech_seconds(features, frames=None):
+    """
+    由一个分块的对数梅尔频谱估算语音时长
+
+    参数:
+        features: 80 x 3000 的梅尔频谱（numpy 数组或张量）
+        frames: 分块实际长度对应的帧数，之后为填充部分；None 表示全部
+    """
+    features = np.asarray(features.float().cpu() if hasattr(features, 'cpu') else features, dtype=np.float32)
+    energy = features[:, :frames].mean(axis=0) if frames else features.mean(axis=0)
+    if len(energy) == 0:
+        return 0.0
+    # 以特征提取的截断下限为准，而不是分块内的能量分布：整块都在说话时分位数本身就是语音
+    floor = features.max() - CLAMP_RANGE
+    return float(np.count_nonzero(energy > floor + VOICED_MARGIN)) * FRAME_SECONDS
+
+def token_budget(seconds):
+    """按语音时长估算的 token 上限"""
+    if not LOOP_GUARD_ENABLED or TOKENS_PER_SECOND <= 0:
+        return MAX_NEW_TOKENS
+    return min(MAX_NEW_TOKENS, BASE_TOKENS + int(seconds * TOKENS_PER_SECOND + 0.5))
+
+def guard_settings():
+    """影响识别结果的检测设置，计入分段缓存的指纹范围"""
+    if not LOOP_GUARD_ENABLED:
+        return "guard=off"
+    return f"guard=on,tps={TOKENS_PER_SECOND:g}"
+
+def repeating_tail(tokens):
+    """末尾是否有片段连续重复，返回周期，没有时返回 None"""
+    for period in range(1, LOOP_MAX_PERIOD + 1):
+        length = period * max(LOOP_MIN_REPEATS, -(-LOOP_MIN_TOKENS // period))
+        if length > len(tokens):
+            break
+        tail = tokens[-length:]
+        if tail[period:] == tail[:-period]:
+            return period
+    return None
+
+def compression_ratio(text):
+    data = text.encode('utf-8')
+    return len(data) / len(zlib.compress(data)) if data else 0.0
+
+class DecodeStats:
+    """
+    一个任务的解码统计，由 collecting 激活后在 pipeline 内部累计
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chunks = 0
+        self.stopped = {"repetition": 0, "compression": 0, "budget": 0}
+        self.tokens_saved = 0
+        self.budget_tokens = 0
+        self.decode_seconds = 0.0
+        self.seconds_saved = 0.0
+
+    def add(self, criteria):
+        with self.lock:
+            self.chunks += len(criteria.budgets)
+            for reason, _ in criteria.stops:
+                self.stopped[reason] += 1
+            self.tokens_saved += criteria.tokens_saved()
+            self.budget_tokens += criteria.budget_tokens()
+            self.decode_seconds += criteria.elapsed()
+            self.seconds_saved += criteria.seconds_saved()
+
+    def truncation_warning(self):
+        """有分块因长度上限停止时返回提示文字，否则返回 None"""
+        with self.lock:
+            count = self.stopped["budget"]
+        if not count:
+            return None
+        return (f"{count} 个分块达到按语音时长估算的 token 上限后停止，可能有文字被截断；"
+                f"可调大 WHISPER_TOKENS_PER_SECOND 或设为 0 取消长度上限")
+
+    def report(self):
+        with self.lock:
+            return {
+                "chunks": self.chunks,
+                "stopped": dict(self.stopped),
+                "tokens_saved": self.tokens_saved,
+                "budget_tokens": self.budget_tokens,
+                "decode_seconds": round(self.decode_seconds, 2),
+                "seconds_saved": round(self.seconds_saved, 2),
+            }
+
+@contextlib.contextmanager
+def collecting(stats):
+    """在当前线程上激活 stats，之后本线程中的解码统计计入其中"""
+    previous = getattr(_local, "stats", None)
+    _local.stats = stats
+    try:
+        yield
+    finally:
+        _local.stats = previous
+
+class LoopStoppingCriteria:
+    """
+    generate 的停止条件，逐行（每个分块）判断是否停止，返回每行的布尔值
+
+    温度回退（accurate 预设）时 Whisper 的 generate 会用同一个停止条件对象，只对需要回退的一部分分块重新生成。
+    每次重新生成都从头计数；重新生成时行号与分块的对应关系未知，长度上限取所有分块中最大的一个。
+
+    参数:
+        budgets: 每个分块的 token 上限
+        tokenizer: 用于计算压缩率的分词器，None 时不检查压缩率
+    """
+
+    def __init__(self, budgets, tokenizer=None):
+        self.budgets = list(budgets)
+        self.tokenizer = tokenizer
+        # 每次停止一行记录 (原因, 已生成的 token 数)，包括重新生成时的停止
+        self.stops = []
+        # 每次生成: {"steps", "started", "finished", "loop_stopped"}
+        self.runs = []
+        self._run = None
+        self._prompt_length = None
+        self._rows = None
+        self._last_length = None
+        self._stopped_rows = set()
+
+    def _start_run(self, input_ids):
+        # 第一次调用时已经生成了一个 token，此前的部分是解码提示（语言、任务等）
+        self._prompt_length = input_ids.shape[1] - 1
+        self._rows = input_ids.shape[0]
+        self._stopped_rows = set()
+        self._run = {"steps": 0, "started": time.perf_counter(), "finished": None, "loop_stopped": False}
+        self.runs.append(self._run)
+
+    def _row_budget(self, row, rows):
+        if len(self.runs) > 1:
+            # 重新生成的只是部分分块，无法确定对应关系
+            return max(self.budgets)
+        # 束搜索时每个分块占 num_beams 行
+        beams = max(1, rows // len(self.budgets))
+        return self.budgets[min(row // beams, len(self.budgets) - 1)]
+
+    def _check(self, tokens):
+        if repeating_tail(tokens) is not None:
+            return "repetition"
+        if self.tokenizer is not None and len(tokens) >= COMPRESSION_MIN_TOKENS:
+            text = self.tokenizer.decode(tokens, skip_special_tokens=True)
+            if compression_ratio(text) > COMPRESSION_RATIO_THRESHOLD:
+                return "compression"
+        return None
+
+    def __call__(self, input_ids, scores=None, **kwargs):
+        import torch
+
+        return torch.tensor(self.stopped_rows(input_ids), dtype=torch.bool, device=input_ids.device)
+
+    def stopped_rows(self, input_ids):
+        """返回每一行是否应停止（input_ids 为二维张量或数组）"""
+        length, rows = input_ids.shape[1], input_ids.shape[0]
+        # 序列没有变长或批大小变化，说明 generate 开始了新的一次生成（温度回退）
+        if self._run is None or rows != self._rows or length <= self._last_length:
+            self._start_run(input_ids)
+        self._last_length = length
+        self._run["steps"] += 1
+        self._run["finished"] = time.perf_counter()
+        generated = length - self._prompt_length
+        done = [False] * rows
+        check = generated % CHECK_EVERY == 0
+        for row in range(rows):
+            reason = None
+            if generated >= self._row_budget(row, rows):
+                reason = "budget"
+            elif check:
+                reason = self._check(input_ids[row, self._prompt_length:].tolist())
+            if reason is not None:
+                done[row] = True
+                if row not in self._stopped_rows:
+                    self._stopped_rows.add(row)
+                    self.stops.append((reason, generated))
+                    if reason != "budget":
+                        self._run["loop_stopped"] = True
+        return done
+
+    def elapsed(self):
+        return sum(run["finished"] - run["started"] for run in self.runs)
+
+    def tokens_saved(self):
+        """循环和压缩率检测提前停止节省的 token 数（不含长度上限截断的部分）"""
+        return sum(MAX_NEW_TOKENS - length for reason, length in self.stops if reason != "budget")
+
+    def budget_tokens(self):
+        """因长度上限少生成的 token 数（可能截断了正常文字，单独统计）"""
+        return sum(MAX_NEW_TOKENS - length for reason, length in self.stops if reason == "budget")
+
+    def seconds_saved(self):
+        # 只有被循环检测停止的分块是整批中最后结束的，整批才会提前结束
+        saved = 0.0
+        for run in self.runs:
+            steps = run["steps"]
+            if run["loop_stopped"] and 0 < steps < MAX_NEW_TOKENS:
+                saved += (MAX_NEW_TOKENS - steps) * (run["finished"] - run["started"]) / steps
+        return saved
+
+def stopping_criteria(budgets, tokenizer=None):
+    """
+    创建停止条件，已关闭检测时返回 None
+
+    返回:
+        LoopStoppingCriteria 或 None
+    """
+    if not LOOP_GUARD_ENABLED:
+        return None
+    return LoopStoppingCriteria(budgets, tokenizer)
+
+def record(criteria):
+    """生成结束后把停止条件的统计计入当前线程激活的 DecodeStats"""
+    if criteria is None:
+        return
+    budget_stops = [length for reason, length in criteria.stops if reason == "budget"]
+    if budget_stops:
+        logging.warning(f"{len(budget_stops)} 个分块达到 token 上限后停止（{', '.join(map(str, budget_stops))} 个 token）")
+    stats = getattr(_local, "stats", None)
+    if stats is not None:
+        stats.add(criteria)
+
+def with_criteria(generate_kwargs, criteria):
+    """把停止条件加入 generate 参数（保留调用方已有的停止条件）"""
+    if criteria is None:
+        return generate_kwargs
+    from transformers import StoppingCriteriaList
+
+    kwargs = dict(generate_kwargs)
+    existing = kwargs.get("stopping_criteria") or []
+    kwargs["stopping_criteria"] = StoppingCriteriaList([*existing, criteria])
+    return kwargs
+
+def guard_pipeline(pipe):
+    """
+    给 pipeline 的推理步骤加上循环检测和按语音时长的长度限制（只需调用一次）
+    """
+    if getattr(pipe, "_loop_guarded", False) or not LOOP_GUARD_ENABLED:
+        return pipe
+    forward = pipe._forward
+
+    def guarded_forward(model_inputs, *args, **kwargs):
+        features = model_inputs.get("input_features")
+        # 超过 30 秒的输入由 Whisper 自行分段（长音频模式），不逐块限制
+        if features is None or features.shape[-1] > 3000:
+            return forward(model_inputs, *args, **kwargs)
+        # 分块识别时 stride 的第一项是分块的实际采样数，之后为填充
+        strides = model_inputs.get("stride") or [None] * len(features)
+        if isinstance(strides, tuple):
+            strides = [strides]
+        budgets = [token_budget(speech_seconds(f, stride[0] // 160 if stride else None))
+                   for f, stride in zip(features, strides)]
+        criteria = stopping_criteria(budgets, pipe.tokenizer)
+        output = forward(model_inputs, *args, **with_criteria(kwargs, criteria))
+        record(criteria)
+        return output
+
+    pipe._forward = guarded_forward
+    pipe._loop_guarded = True
+    return pipe
@@ -0,0 +1,497 @@
+"""
+转录任务代理（broker）
+
+前端把任务提交到代理，任意数量、任意主机上的 worker.py 进程从代理领取任务、定期发送心跳并写回结果。
+worker 失联（心跳超时）时，它手上的任务会自动重新排队。
+
+支持的后端（通过 URL 选择）:
+    sqlite:///path/to/jobs.db   SQLite 数据库（默认，多台主机时放在共享目录）
+    file:///path/to/queue       文件系统队列，每个任务一个 JSON 文件，用原子重命名领取
+    redis://host:6379/0         Redis（需要 pip install redis）
+
+所有后端的方法一致:
+    submit(payload) -> job_id
+    claim(worker_id) -> job 或 None
+    heartbeat(job_id, worker_id) -> 任务是否仍属于该 worker
+    complete(job_id, worker_id, result) / fail(job_id, worker_id, error)
+    get(job_id) -> job 或 None
+    requeue_stale(timeout) -> 重新排队的任务数
+
+job 为字典: job_id, status (queued/running/done/failed), payload, worker_id, heartbeat, attempts,
+result, error, created, updated
+"""
+
+import os
+import json
+import glob
+import time
+import uuid
+import sqlite3
+import contextlib
+from urllib.parse import urlparse
+
+from scheduler import PRIORITY_CLASSES
+
+# worker 超过这么多秒没有心跳即视为失联
+HEARTBEAT_TIMEOUT = 60
+# 同一任务最多被领取的次数，超过后标记为失败
+MAX_ATTEMPTS = 3
+
+def _priority_of(payload):
+    return PRIORITY_CLASSES.get(payload.get("priority", "normal"), PRIORITY_CLASSES["normal"])
+
+def _new_job(payload):
+    now = time.time()
+    return {
+        "job_id": uuid.uuid4().hex,
+        "status": "queued",
+        "payload": payload,
+        "worker_id": None,
+        "heartbeat": None,
+        "attempts": 0,
+        "result": None,
+        "error": None,
+        "created": now,
+        "updated": now,
+    }
+
+class SQLiteBroker:
+    """
+    基于 SQLite 的任务代理，用 BEGIN IMMEDIATE 事务保证同一任务只被一个 worker 领取
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    payload TEXT NOT NULL,
+                    worker_id TEXT,
+                    heartbeat REAL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, priority, created)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _row_to_job(row):
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop("priority")
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def submit(self, payload):
+        job = _new_job(payload)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, priority, payload, attempts, created, updated) "
+                "VALUES (?, 'queued', ?, ?, 0, ?, ?)",
+                (job["job_id"], _priority_of(payload), json.dumps(payload, ensure_ascii=False),
+                 job["created"], job["updated"]))
+        return job["job_id"]
+
+    def claim(self, worker_id):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = 'queued' "
+                    "ORDER BY priority, created LIMIT 1").fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                now = time.time()
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, heartbeat = ?, "
+                    "attempts = attempts + 1, updated = ? WHERE job_id = ?",
+                    (worker_id, now, now, row["job_id"]))
+                job = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (row["job_id"],)).fetchone()
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return self._row_to_job(job)
+
+    def heartbeat(self, job_id, worker_id):
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET heartbeat = ?, updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (now, now, job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def _finish(self, job_id, worker_id, status, result=None, error=None):
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? "
+                "WHERE job_id = ? AND worker_id = ? AND status = 'running'",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id, worker_id))
+            return cursor.rowcount == 1
+
+    def complete(self, job_id, worker_id, result):
+        return self._finish(job_id, worker_id, "done", result=result)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, "failed", error=error)
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row)
+
+    def requeue_stale(self, timeout=HEARTBEAT_TIMEOUT):
+        deadline = time.time() - timeout
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = 'worker 多次失联，任务放弃', updated = ? "
+                "WHERE status = 'running' AND heartbeat < ? AND attempts >= ?",
+                (now, deadline, MAX_ATTEMPTS))
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'queued', worker_id = NULL, heartbeat = NULL, updated = ? "
+                "WHERE status = 'running' AND heartbeat < ?",
+                (now, deadline))
+            return cursor.rowcount
+
+class FileQueueBroker:
+    """
+    基于文件系统的任务代理
+
+    每个任务是一个 JSON 文件，按状态放在 queued/running/done/failed 子目录中；
+    worker 通过把文件从 queued 重命名到 running 来领取任务（同一文件系统上的重命名是原子的）。
+    文件名以优先级和提交时间开头，目录排序即为领取顺序。
+    """
+
+    STATES = ("queued", "running", "done", "failed")
+
+    def __init__(self, root):
+        self.root = root
+        for state in self.STATES:
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+
+    def _path(self, state, name):
+        return os.path.join(self.root, state, name)
+
+    def _find(self, job_id):
+        for state in self.STATES:
+            matches = glob.glob(self._path(state, f"*-{job_id}.json"))
+            if matches:
+                return state, matches[0]
+        return None, None
+
+    @staticmethod
+    def _read(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def _write(path, job):
+        job["updated"] = time.time()
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False)
+        os.replace(temp_path, path)
+
+    def submit(self, payload):
+        job = _new_job(payload)
+        name = f"{_priority_of(payload)}-{int(job['created'] * 1000):015d}-{job['job_id']}.json"
+        self._write(self._path("queued", name), job)
+        return job["job_id"]
+
+    def claim(self, worker_id):
+        for name in sorted(os.listdir(os.path.join(self.root, "queued"))):
+            if not name.endswith(".json"):
+                continue
+            # 先原子地改名为只有本 worker 知道的临时名，写好状态、worker 和心跳后再改为正式文件名；
+            # running 目录中的 .json 文件总是带着心跳出现，requeue_stale 不会把刚领取的任务当成失联。
+            # 改名保留提交时的修改时间，所以领取时间写在临时名中（毫秒）
+            claim_path = self._path("running", f"{name}.{int(time.time() * 1000)}.{uuid.uuid4().hex}.claim")
+            try:
+                os.rename(self._path("queued", name), claim_path)
+            except OSError:
+                # 已被其他 worker 领取
+                continue
+            job = self._read(claim_path)
+            job.update(status="running", worker_id=worker_id, heartbeat=time.time(),
+                       attempts=job["attempts"] + 1, updated=time.time())
+            with open(claim_path, 'w', encoding='utf-8') as f:
+                json.dump(job, f, ensure_ascii=False)
+            os.replace(claim_path, self._path("running", name))
+            return job
+        return None
+
+    def heartbeat(self, job_id, worker_id):
+        state, path = self._find(job_id)
+        if state != "running":
+            return False
+        try:
+            job = self._read(path)
+        except (OSError, ValueError):
+            return False
+        if job["worker_id"] != worker_id:
+            return False
+        job["heartbeat"] = time.time()
+        self._write(path, job)
+        return True
+
+    def _finish(self, job_id, worker_id, status, result=None, error=None):
+        state, path = self._find(job_id)
+        if state != "running":
+            return False
+        job = self._read(path)
+        if job["worker_id"] != worker_id:
+            return False
+        job.update(status=status, result=result, error=error)
+        self._write(path, job)
+        try:
+            os.rename(path, self._path(status, os.path.basename(path)))
+        except OSError:
+            return False
+        return True
+
+    def complete(self, job_id, worker_id, result):
+        return self._finish(job_id, worker_id, "done", result=result)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, "failed", error=error)
+
+    def get(self, job_id):
+        state, path = self._find(job_id)
+        if path is None:
+            return None
+        try:
+            return self._read(path)
+        except (OSError, ValueError):
+            # 文件正在被移动，稍后重试即可
+            return None
+
+    def requeue_stale(self, timeout=HEARTBEAT_TIMEOUT):
+        deadline = time.time() - timeout
+        count = 0
+        for name in os.listdir(os.path.join(self.root, "running")):
+            if name.endswith(".claim"):
+                count += self._requeue_claim(name, deadline)
+                continue
+            if not name.endswith(".json"):
+                continue
+            path = self._path("running", name)
+            try:
+                job = self._read(path)
+            except (OSError, ValueError):
+                continue
+            if (job.get("heartbeat") or 0) >= deadline:
+                continue
+            if job["attempts"] >= MAX_ATTEMPTS:
+                job.update(status="failed", error="worker 多次失联，任务放弃")
+                target = "failed"
+            else:
+                job.update(status="queued", worker_id=None, heartbeat=None)
+                target = "queued"
+            self._write(path, job)
+            try:
+                os.rename(path, self._path(target, name))
+                count += target == "queued"
+            except OSError:
+                continue
+        return count
+
+    def _requeue_claim(self, name, deadline):
+        """领取到一半就退出的 worker 留下的临时文件，超时后放回队列"""
+        job_name, _, claim = name.partition(".json.")
+        try:
+            claimed = int(claim.split(".", 1)[0]) / 1000
+        except ValueError:
+            return 0
+        if claimed >= deadline:
+            return 0
+        try:
+            os.rename(self._path("running", name), self._path("queued", job_name + ".json"))
+        except OSError:
+            return 0
+        return 1
+
+class RedisBroker:
+    """
+    基于 Redis 的任务代理
+
+    每个优先级一个待处理列表，领取时在一个事务（WATCH + MULTI/EXEC）中移入 running 列表并写入心跳，
+    running 列表中的任务总是带着心跳，任务详情保存在哈希中。
+
+    参数:
+        client: redis.Redis 实例，或任何实现了同样命令的对象（例如测试用的 fakeredis.FakeRedis）
+        prefix: 键名前缀
+    """
+
+    def __init__(self, client, prefix="whisper"):
+        self.client = client
+        self.prefix = prefix
+
+    def _key(self, *parts):
+        return ":".join((self.prefix,) + parts)
+
+    @staticmethod
+    def _text(value):
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def _load(self, job_id):
+        raw = self.client.hgetall(self._key("job", job_id))
+        if not raw:
+            return None
+        data = {self._text(k): self._text(v) for k, v in raw.items()}
+        return {
+            "job_id": job_id,
+            "status": data["status"],
+            "payload": json.loads(data["payload"]),
+            "worker_id": data.get("worker_id") or None,
+            "heartbeat": float(data["heartbeat"]) if data.get("heartbeat") else None,
+            "attempts": int(data.get("attempts", 0)),
+            "result": json.loads(data["result"]) if data.get("result") else None,
+            "error": data.get("error") or None,
+            "created": float(data["created"]),
+            "updated": float(data["updated"]),
+        }
+
+    def submit(self, payload):
+        job = _new_job(payload)
+        self.client.hset(self._key("job", job["job_id"]), mapping={
+            "status": "queued",
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "attempts": 0,
+            "created": job["created"],
+            "updated": job["updated"],
+        })
+        self.client.lpush(self._key("queue", str(_priority_of(payload))), job["job_id"])
+        return job["job_id"]
+
+    def claim(self, worker_id):
+        from redis.exceptions import WatchError
+
+        for priority in sorted(set(PRIORITY_CLASSES.values())):
+            queue_key = self._key("queue", str(priority))
+            with self.client.pipeline() as pipe:
+                while True:
+                    try:
+                        # 队列在事务提交前被其他 worker 改动时 EXEC 失败，重新读取队尾
+                        pipe.watch(queue_key)
+                        job_id = pipe.lindex(queue_key, -1)
+                        if job_id is None:
+                            pipe.unwatch()
+                            break
+                        job_id = self._text(job_id)
+                        now = time.time()
+                        key = self._key("job", job_id)
+                        pipe.multi()
+                        pipe.rpoplpush(queue_key, self._key("running"))
+                        pipe.hincrby(key, "attempts", 1)
+                        pipe.hset(key, mapping={
+                            "status": "running", "worker_id": worker_id, "heartbeat": now, "updated": now})
+                        pipe.execute()
+                        return self._load(job_id)
+                    except WatchError:
+                        continue
+        return None
+
+    def _owned(self, job_id, worker_id):
+        key = self._key("job", job_id)
+        return (self._text(self.client.hget(key, "worker_id")) == worker_id
+                and self._text(self.client.hget(key, "status")) == "running")
+
+    def heartbeat(self, job_id, worker_id):
+        if not self._owned(job_id, worker_id):
+            return False
+        now = time.time()
+        self.client.hset(self._key("job", job_id), mapping={"heartbeat": now, "updated": now})
+        return True
+
+    def _finish(self, job_id, worker_id, status, result=None, error=None):
+        if not self._owned(job_id, worker_id):
+            return False
+        fields = {"status": status, "updated": time.time()}
+        if result is not None:
+            fields["result"] = json.dumps(result, ensure_ascii=False)
+        if error is not None:
+            fields["error"] = error
+        self.client.hset(self._key("job", job_id), mapping=fields)
+        self.client.lrem(self._key("running"), 0, job_id)
+        return True
+
+    def complete(self, job_id, worker_id, result):
+        return self._finish(job_id, worker_id, "done", result=result)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, "failed", error=error)
+
+    def get(self, job_id):
+        return self._load(job_id)
+
+    def requeue_stale(self, timeout=HEARTBEAT_TIMEOUT):
+        deadline = time.time() - timeout
+        count = 0
+        for job_id in self.client.lrange(self._key("running"), 0, -1):
+            job_id = self._text(job_id)
+            job = self._load(job_id)
+            if job is None or (job["heartbeat"] or 0) >= deadline:
+                continue
+            # LREM 返回 0 说明其他进程已经处理过这个任务
+            if not self.client.lrem(self._key("running"), 0, job_id):
+                continue
+            key = self._key("job", job_id)
+            if job["attempts"] >= MAX_ATTEMPTS:
+                self.client.hset(key, mapping={
+                    "status": "failed", "error": "worker 多次失联，任务放弃", "updated": time.time()})
+                continue
+            self.client.hset(key, mapping={
+                "status": "queued", "worker_id": "", "heartbeat": "", "updated": time.time()})
+            self.client.lpush(self._key("queue", str(_priority_of(job["payload"]))), job_id)
+            count += 1
+        return count
+
+def create_broker(url):
+    """
+    根据 URL 创建任务代理
+
+    参数:
+        url: sqlite:///path/to/jobs.db、file:///path/to/queue 或 redis://host:port/db
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        return SQLiteBroker(_local_path(parsed))
+    if parsed.scheme == "file":
+        return FileQueueBroker(_local_path(parsed))
+    if parsed.scheme in ("redis", "rediss"):
+        try:
+            import redis
+        except ImportError:
+            raise Exception("使用 Redis 代理需要先安装 redis: pip install redis")
+        return RedisBroker(redis.Redis.from_url(url))
+    raise ValueError(f"不支持的代理地址: {url}")
+
+def _local_path(parsed):
+    # sqlite:///E:/queue/jobs.db 解析出的路径为 /E:/queue/jobs.db，去掉 Windows 盘符前多余的斜杠
+    path = parsed.netloc + parsed.path
+    if len(path) > 2 and path[0] == '/' and path[2] == ':':
+        path = path[1:]
+    return path
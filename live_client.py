@@ -0,0 +1,95 @@
+"""
+实时转录测试客户端
+
+按真实播放速度把一个 WAV 文件推送到 /api/live，打印收到的临时结果和确认片段，
+并统计端到端延迟：收到结果的时刻减去对应音频"被说出"的时刻。
+
+用法:
+    python live_client.py meeting.wav --url ws://127.0.0.1:7860/api/live --latency 2.0
+
+WAV 文件需为 16kHz 单声道 16 位 PCM，其他格式可先用 ffmpeg 转换:
+    ffmpeg -i input.mp3 -ac 1 -ar 16000 -sample_fmt s16 output.wav
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+import wave
+
+import websockets
+
+def read_pcm16(wav_path):
+    """
+    读取 16kHz 单声道 16 位 WAV 的原始 PCM 字节
+    """
+    with wave.open(wav_path, 'rb') as wav:
+        if wav.getnchannels() != 1 or wav.getsampwidth() != 2 or wav.getframerate() != 16000:
+            raise ValueError("请先将音频转换为 16kHz 单声道 16 位 WAV")
+        return wav.readframes(wav.getnframes())
+
+def percentile(values, q):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(name, values):
+    if not values:
+        print(f"{name}: 无数据")
+        return
+    print(f"{name}: 次数={len(values)} 平均={statistics.mean(values):.2f}s "
+          f"p50={percentile(values, 50):.2f}s p95={percentile(values, 95):.2f}s "
+          f"最大={max(values):.2f}s")
+
+async def replay(wav_path, url, latency, frame_ms):
+    pcm = read_pcm16(wav_path)
+    frame_bytes = 16000 * 2 * frame_ms // 1000
+    partial_latency = []
+    final_latency = []
+
+    async with websockets.connect(f"{url}?format=s16le&latency={latency}", max_size=None) as ws:
+        start = time.perf_counter()
+
+        async def send_audio():
+            for i, offset in enumerate(range(0, len(pcm), frame_bytes)):
+                # 按真实时间节奏发送
+                delay = start + i * frame_ms / 1000 - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                await ws.send(pcm[offset:offset + frame_bytes])
+            await ws.send("EOS")
+
+        sender = asyncio.create_task(send_audio())
+        async for message in ws:
+            event = json.loads(message)
+            now = time.perf_counter() - start
+            if event["type"] == "partial":
+                partial_latency.append(now - event["audio_end"])
+                print(f"[{now:7.2f}s] 临时: {event['text']}")
+            elif event["type"] == "final":
+                final_latency.append(now - event["end"])
+                print(f"[{now:7.2f}s] 确认 [{event['start']:.2f}-{event['end']:.2f}]: {event['text']}")
+            elif event["type"] == "error":
+                print(f"服务端错误: {event['message']}")
+                break
+            elif event["type"] == "done":
+                break
+        await sender
+
+    print("\n" + "=" * 50)
+    print(f"音频时长: {len(pcm) / 32000:.2f}s")
+    summarize("临时结果延迟", partial_latency)
+    summarize("确认片段延迟", final_latency)
+
+def main():
+    parser = argparse.ArgumentParser(description="实时转录测试客户端")
+    parser.add_argument("wav", help="16kHz 单声道 16 位 WAV 文件")
+    parser.add_argument("--url", default="ws://127.0.0.1:7860/api/live")
+    parser.add_argument("--latency", type=float, default=2.0, help="期望的临时结果延迟（秒）")
+    parser.add_argument("--frame-ms", type=int, default=100, help="每帧音频时长（毫秒）")
+    args = parser.parse_args()
+    asyncio.run(replay(args.wav, args.url, args.latency, args.frame_ms))
+
+if __name__ == "__main__":
+    main()
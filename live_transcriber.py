@@ -0,0 +1,199 @@
+"""
+实时流式转录
+
+接收连续的 PCM 音频流（麦克风、WebSocket 等），在滑动窗口上反复识别：
+每隔一小段时间输出一次临时结果（partial），
+连续两次识别结果一致且离窗口末尾足够远的片段视为稳定，作为最终结果（final）输出，
+并把窗口起点移动到该片段之后。
+"""
+
+import threading
+
+import numpy as np
+
+from whisper_transcriber import inference_lock
+
+SAMPLE_RATE = 16000
+
+class LiveTranscriber:
+    """
+    单路实时音频流的增量识别器
+
+    参数:
+        pipe: Whisper pipeline
+        latency_target: 期望的临时结果延迟（秒），决定多久识别一次
+        max_window_seconds: 滑动窗口最大长度，超过后强制确认已有片段
+        stable_margin: 片段结束时间距窗口末尾至少这么多秒才允许确认
+    """
+
+    def __init__(self, pipe, latency_target=2.0, max_window_seconds=25.0,
+                 stable_margin=1.0, sr=SAMPLE_RATE):
+        self.pipe = pipe
+        self.sr = sr
+        self.step_samples = max(int(latency_target / 2 * sr), sr // 4)
+        self.max_window_samples = int(max_window_seconds * sr)
+        self.stable_margin = stable_margin
+
+        self.window = np.zeros(0, dtype=np.float32)
+        self.window_offset = 0.0
+        self.previous = []
+        self._incoming = []
+        self._incoming_samples = 0
+        self._lock = threading.Lock()
+
+    def push(self, samples):
+        """写入一段新的 float32 音频"""
+        samples = np.asarray(samples, dtype=np.float32)
+        with self._lock:
+            self._incoming.append(samples)
+            self._incoming_samples += len(samples)
+
+    def ready(self):
+        """新到的音频是否已足够进行下一次识别"""
+        with self._lock:
+            return self._incoming_samples >= self.step_samples
+
+    @property
+    def audio_end(self):
+        """当前窗口末尾对应的音频时间（秒）"""
+        return self.window_offset + len(self.window) / self.sr
+
+    def step(self):
+        """
+        识别当前窗口，返回本次产生的事件列表
+        """
+        self._take_incoming()
+        if len(self.window) == 0:
+            return []
+
+        hypothesis = self._infer()
+        committed = self._stable_prefix(hypothesis)
+
+        # 窗口太长时强制确认除最后一个片段以外的所有片段
+        too_long = len(self.window) >= self.max_window_samples
+        if too_long:
+            forced = len(hypothesis) - 1 if len(hypothesis) > 1 else len(hypothesis)
+            committed = max(committed, forced)
+
+        events = self._commit(hypothesis, committed)
+        if too_long and len(self.window) >= self.max_window_samples:
+            # 整个窗口都没有识别出内容（静音或噪声），只保留末尾一小段
+            drop = len(self.window) - int(self.stable_margin * self.sr)
+            self.window_offset += drop / self.sr
+            self.window = self.window[drop:]
+        self.previous = hypothesis[committed:]
+        partial = ''.join(text for _, _, text in self.previous).strip()
+        events.append({"type": "partial", "text": partial, "audio_end": round(self.audio_end, 3)})
+        return events
+
+    def flush(self):
+        """
+        音频流结束，识别剩余音频并确认全部片段
+        """
+        self._take_incoming()
+        if len(self.window) == 0:
+            return []
+        hypothesis = self._infer()
+        events = self._commit(hypothesis, len(hypothesis))
+        self.previous = []
+        return events
+
+    def _take_incoming(self):
+        with self._lock:
+            incoming, self._incoming = self._incoming, []
+            self._incoming_samples = 0
+        if incoming:
+            self.window = np.concatenate([self.window] + incoming)
+
+    def _infer(self):
+        """
+        识别整个窗口，返回 [(开始秒, 结束秒, 文本)]，时间为整条音频流上的绝对时间
+        """
+        with inference_lock:
+            result = self.pipe(self.window.copy(), return_timestamps=True)
+        hypothesis = []
+        for chunk in result.get("chunks", []):
+            start, end = chunk["timestamp"]
+            start = self.window_offset + (start or 0.0)
+            end = None if end is None else self.window_offset + end
+            hypothesis.append((start, end, chunk["text"]))
+        return hypothesis
+
+    def _stable_prefix(self, hypothesis):
+        """
+        与上一次识别结果一致、且已经远离窗口末尾的前缀片段数
+        """
+        limit = self.audio_end - self.stable_margin
+        count = 0
+        for current, previous in zip(hypothesis, self.previous):
+            if current[2].strip() != previous[2].strip():
+                break
+            if current[1] is None or current[1] > limit:
+                break
+            count += 1
+        return count
+
+    def _commit(self, hypothesis, count):
+        """
+        确认前 count 个片段，并把窗口起点移到最后一个确认片段之后
+        """
+        events = []
+        for start, end, text in hypothesis[:count]:
+            end = self.audio_end if end is None else end
+            if text.strip():
+                events.append({"type": "final", "text": text.strip(),
+                               "start": round(start, 3), "end": round(end, 3)})
+        if count:
+            last_end = hypothesis[count - 1][1]
+            cut = len(self.window) if last_end is None else int((last_end - self.window_offset) * self.sr)
+            cut = min(max(cut, 0), len(self.window))
+            self.window = self.window[cut:]
+            self.window_offset += cut / self.sr
+        return events
+
+# 支持的样本格式及对应的 numpy 类型和缩放系数
+SAMPLE_FORMATS = {
+    "s16le": ('<i2', 1.0 / 32768),
+    "f32le": ('<f4', 1.0),
+}
+
+def decode_pcm_frame(data, sample_format="s16le"):
+    """
+    把 WebSocket 收到的二进制帧转换为 float32 数组，末尾不足一个样本的字节被丢弃
+
+    参数:
+        data: 原始字节
+        sample_format: s16le（16 位整数）或 f32le（32 位浮点）
+    异常:
+        ValueError: 不支持的样本格式
+    """
+    if sample_format not in SAMPLE_FORMATS:
+        raise ValueError(f"不支持的音频格式: {sample_format}，可选: {', '.join(SAMPLE_FORMATS)}")
+    dtype, scale = SAMPLE_FORMATS[sample_format]
+    usable = len(data) - len(data) % np.dtype(dtype).itemsize
+    samples = np.frombuffer(memoryview(data)[:usable], dtype=dtype).astype(np.float32)
+    return samples * scale if scale != 1.0 else samples
+
+class PcmFrameDecoder:
+    """
+    逐帧转换一路 PCM 流；帧长度不是样本大小的整数倍时，多出的字节与下一帧拼接，样本不会错位
+
+    参数:
+        sample_format: s16le 或 f32le
+    异常:
+        ValueError: 不支持的样本格式
+    """
+
+    def __init__(self, sample_format="s16le"):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"不支持的音频格式: {sample_format}，可选: {', '.join(SAMPLE_FORMATS)}")
+        self.sample_format = sample_format
+        self.sample_size = np.dtype(SAMPLE_FORMATS[sample_format][0]).itemsize
+        self._remainder = b''
+
+    def decode(self, data):
+        if self._remainder:
+            data = self._remainder + bytes(data)
+        tail = len(data) % self.sample_size
+        self._remainder = bytes(data[len(data) - tail:]) if tail else b''
+        return decode_pcm_frame(data, self.sample_format)
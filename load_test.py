@@ -0,0 +1,166 @@
+"""
+转录服务压力测试
+
+模拟 N 个并发客户端，按给定比例上传不同时长的音频，统计延迟分位数、吞吐量和错误率。
+测试音频是程序生成的 16kHz 单声道 16 位 PCM WAV，不需要准备样本；服务端读取 WAV 不需要 ffmpeg。
+
+配合模拟模型可以在没有 GPU 的机器上单独测量排队和服务开销:
+    WHISPER_STUB_MODEL=1 WHISPER_STUB_RTF=0.05 WHISPER_NO_BROWSER=1 python webui.py
+
+用法:
+    python load_test.py --clients 8 --requests 200 --mix 10:6,60:3,600:1
+    python load_test.py --target ui --clients 4 --requests 40     # 通过网页界面的 process_audio（需要 gradio_client）
+"""
+
+import os
+import sys
+import math
+import time
+import wave
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import http.client
+import urllib.parse
+from array import array
+
+def parse_mix(value):
+    """解析 "时长:权重,时长:权重"，返回 [(秒, 权重)]"""
+    mix = []
+    for item in value.split(','):
+        seconds, _, weight = item.partition(':')
+        mix.append((float(seconds), float(weight or 1)))
+    return mix
+
+def make_wav(path, seconds, seed):
+    """生成一段带噪声的正弦波 WAV，内容由 seed 决定"""
+    rng = random.Random(seed)
+    frequency = rng.uniform(150, 400)
+    samples = array('h')
+    block = [int(3000 * math.sin(2 * math.pi * frequency * i / 16000)) for i in range(16000)]
+    for _ in range(int(seconds)):
+        samples.extend(value + rng.randint(-300, 300) for value in block)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(samples.tobytes())
+
+def upload_api(base_url, path, preset):
+    """通过 /api/transcribe 上传，返回 HTTP 状态码"""
+    parsed = urllib.parse.urlsplit(base_url)
+    query = urllib.parse.urlencode({"filename": os.path.basename(path), **({"preset": preset} if preset else {})})
+    connection = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=3600)
+    try:
+        with open(path, 'rb') as f:
+            connection.request("POST", f"/api/transcribe?{query}", body=f,
+                               headers={"Content-Length": str(os.path.getsize(path))})
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+def make_ui_uploader(base_url):
+    """通过网页界面的 process_audio 提交（与浏览器走同一条路径）"""
+    try:
+        from gradio_client import Client, handle_file
+    except ImportError:
+        sys.exit("--target ui 需要安装 gradio_client")
+    local = threading.local()
+
+    def upload(_, path, preset):
+        if not hasattr(local, "client"):
+            local.client = Client(base_url, verbose=False)
+        result, _ = local.client.predict(handle_file(path), preset or "balanced", "", False,
+                                         api_name="/process_audio")
+        return 200 if result.startswith("✨") else 500
+    return upload
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def run(args, files, upload):
+    rng = random.Random(args.seed)
+    weights = [weight for _, weight in args.mix]
+    plan = rng.choices(range(len(files)), weights=weights, k=args.requests)
+    plan_lock = threading.Lock()
+    results = []
+
+    def client():
+        while True:
+            with plan_lock:
+                if not plan:
+                    return
+                index = plan.pop()
+            seconds, path = files[index]
+            start = time.perf_counter()
+            try:
+                status = upload(args.url, path, args.preset)
+                error = None if status == 200 else f"HTTP {status}"
+            except Exception as e:
+                error = type(e).__name__
+            with plan_lock:
+                results.append((seconds, time.perf_counter() - start, error))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start
+
+def report(results, wall_seconds):
+    latencies = [latency for _, latency, error in results if error is None]
+    errors = [error for _, _, error in results if error is not None]
+    audio_seconds = sum(seconds for seconds, _, error in results if error is None)
+    print(f"请求 {len(results)} 个，用时 {wall_seconds:.1f} 秒")
+    print(f"  吞吐量   {len(latencies) / wall_seconds:.2f} 请求/秒，{audio_seconds / wall_seconds:.1f} 音频秒/秒")
+    print(f"  错误率   {len(errors) / len(results):.1%}"
+          + (f"（{', '.join(sorted(set(errors)))}）" if errors else ""))
+    print(f"  延迟     p50 {percentile(latencies, 0.5):.2f}s  p95 {percentile(latencies, 0.95):.2f}s  "
+          f"p99 {percentile(latencies, 0.99):.2f}s  max {max(latencies, default=float('nan')):.2f}s")
+    print("  按时长:")
+    for seconds in sorted({seconds for seconds, _, _ in results}):
+        group = [latency for s, latency, error in results if s == seconds and error is None]
+        failed = sum(1 for s, _, error in results if s == seconds and error is not None)
+        print(f"    {seconds:>6.0f}s  {len(group):>4} 个  p50 {percentile(group, 0.5):.2f}s  "
+              f"p95 {percentile(group, 0.95):.2f}s  p99 {percentile(group, 0.99):.2f}s  失败 {failed}")
+
+def main():
+    parser = argparse.ArgumentParser(description="转录服务压力测试")
+    parser.add_argument("--url", default="http://127.0.0.1:7860")
+    parser.add_argument("--target", choices=["api", "ui"], default="api",
+                        help="api: /api/transcribe；ui: 网页界面的 process_audio")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数")
+    parser.add_argument("--requests", type=int, default=100, help="总请求数")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("10:6,60:3,600:1"),
+                        help="音频时长（秒）及比例，格式 时长:权重,时长:权重")
+    parser.add_argument("--preset", default=None, help="识别预设")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    upload = upload_api if args.target == "api" else make_ui_uploader(args.url)
+    workdir = tempfile.mkdtemp(prefix="whisper_load_")
+    try:
+        files = []
+        for index, (seconds, _) in enumerate(args.mix):
+            path = os.path.join(workdir, f"load_{int(seconds)}s.wav")
+            make_wav(path, seconds, args.seed + index)
+            files.append((seconds, path))
+        print(f"目标 {args.url}（{args.target}），并发 {args.clients}，"
+              f"时长比例 {', '.join(f'{s:.0f}s:{w:g}' for s, w in args.mix)}\n")
+        results, wall_seconds = run(args, files, upload)
+        report(results, wall_seconds)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
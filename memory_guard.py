@@ -0,0 +1,288 @@
+"""
+任务内存统计与预算控制
+
+MemoryTracker 按阶段记录一个任务的内存峰值：
+    decode    非 WAV 文件转换为 WAV（pydub 会把整段解码结果放在内存中）
+    load      读取为 16kHz float32 数组
+    features  pipeline 提取梅尔频谱特征
+    generate  模型推理（编码 + 自回归解码）
+RSS 和 CUDA 显存（torch.cuda.memory_allocated）由后台线程定时采样。两者都是整个进程的数值：
+其他任务同时运行时会一并计入；显存记录的是阶段内相对进入时的最大增量，
+不调用 torch.cuda.reset_peak_memory_stats（它会清掉其他任务和外层阶段的峰值）。
+
+MemoryGuard 在任务开始前根据音频时长估算内存占用：
+超出预算时改用低内存执行方式（ffmpeg 直接转换、按窗口读取音频、减小批大小），
+同时处理中的任务预计占用之和超出预算时，新任务排队等待。
+
+通过环境变量配置:
+    WHISPER_JOB_MEMORY_MB   所有处理中任务的内存预算（MB，不含模型权重），默认 4096
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+import contextlib
+
+MEMORY_BUDGET_MB = float(os.environ.get('WHISPER_JOB_MEMORY_MB', 4096))
+
+MB = 1024 * 1024
+# 每个 30 秒窗口的梅尔频谱特征：128 x 3000 个 float32
+FEATURE_BYTES_PER_CHUNK = 128 * 3000 * 4
+# 批内每条样本推理时的激活值估算
+GENERATE_BYTES_PER_ITEM = 64 * MB
+# 低内存模式下同时存在的音频窗口（当前窗口加切分点搜索）
+LOW_MEMORY_WINDOW_SECONDS = 2 * 240
+
+_local = threading.local()
+
+def _rss_bytes():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+def _cuda_bytes():
+    # 只在 torch 已被导入时统计显存，不为此额外导入 torch
+    torch = sys.modules.get('torch')
+    if torch is not None and torch.cuda.is_available():
+        return torch.cuda.memory_allocated()
+    return None
+
+class MemoryTracker:
+    """
+    记录一个任务各阶段的内存峰值；嵌套或并发进入的阶段各自统计，外层阶段包含内层的占用
+
+    用法:
+        with MemoryTracker() as tracker:
+            with tracker.stage("decode"):
+                ...
+        tracker.report()
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.stages = {}
+        # 正在进行的阶段: [(统计项, 本次进入的显存起点和峰值)]
+        self._open = []
+        self.baseline_rss = _rss_bytes()
+        self.peak_rss = self.baseline_rss
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def __enter__(self):
+        if self.baseline_rss is not None or _cuda_bytes() is not None:
+            self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+            self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        return False
+
+    def _sample_loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = _rss_bytes()
+        cuda = _cuda_bytes()
+        with self._lock:
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss or 0, rss)
+            for entry, visit in self._open:
+                if rss is not None:
+                    entry["rss_peak"] = max(entry["rss_peak"], rss)
+                if cuda is not None:
+                    visit["cuda_peak"] = max(visit["cuda_peak"], cuda)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """在 with 块内的内存占用计入 name 阶段，同一阶段多次进入时取最大值"""
+        cuda = _cuda_bytes() or 0
+        visit = {"cuda_start": cuda, "cuda_peak": cuda}
+        with self._lock:
+            entry = self.stages.setdefault(name, {"rss_peak": 0, "cuda_growth": 0, "seconds": 0.0})
+            self._open.append((entry, visit))
+        self._sample()
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._sample()
+            with self._lock:
+                self._open = [item for item in self._open if item[1] is not visit]
+                entry["seconds"] += time.perf_counter() - start_time
+                entry["cuda_growth"] = max(entry["cuda_growth"], visit["cuda_peak"] - visit["cuda_start"])
+
+    def report(self):
+        """
+        返回:
+            dict: 基线 RSS、任务期间 RSS 峰值，以及每个阶段的 RSS 峰值、相对基线的增量、显存相对进入时的最大增量（MB）和耗时
+        """
+        def to_mb(value):
+            return round(value / MB, 1)
+
+        # 没有安装 psutil 时无法统计 RSS，相关字段为 None
+        has_rss = self.baseline_rss is not None
+        with self._lock:
+            stages = {}
+            for name, entry in self.stages.items():
+                stages[name] = {
+                    "rss_peak_mb": to_mb(entry["rss_peak"]) if has_rss else None,
+                    "rss_over_baseline_mb": to_mb(max(0, entry["rss_peak"] - self.baseline_rss)) if has_rss else None,
+                    "cuda_growth_mb": to_mb(entry["cuda_growth"]),
+                    "seconds": round(entry["seconds"], 3),
+                }
+            return {
+                "baseline_rss_mb": to_mb(self.baseline_rss) if has_rss else None,
+                "peak_rss_mb": to_mb(self.peak_rss) if has_rss else None,
+                "stages": stages,
+            }
+
+@contextlib.contextmanager
+def tracking(tracker):
+    """在当前线程上激活 tracker，供 pipeline 内部的阶段统计使用"""
+    previous = getattr(_local, "tracker", None)
+    _local.tracker = tracker
+    try:
+        yield
+    finally:
+        _local.tracker = previous
+
+def active_stage(name):
+    """当前线程有激活的 tracker 时进入对应阶段，否则什么都不做"""
+    tracker = getattr(_local, "tracker", None)
+    if tracker is None:
+        return contextlib.nullcontext()
+    return tracker.stage(name)
+
+def instrument_pipeline(pipe):
+    """
+    给 pipeline 的特征提取和推理步骤加上阶段统计（只需调用一次，未激活 tracker 时开销可忽略）
+    """
+    if getattr(pipe, "_memory_instrumented", False):
+        return pipe
+    preprocess = pipe.preprocess
+    forward = pipe._forward
+
+    def tracked_preprocess(*args, **kwargs):
+        items = preprocess(*args, **kwargs)
+        # 分块 pipeline 的 preprocess 是生成器，每取一项都计入 features 阶段
+        if not hasattr(items, '__next__'):
+            return items
+        return _tracked_iter(items)
+
+    def _tracked_iter(items):
+        while True:
+            with active_stage("features"):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    return
+            yield item
+
+    def tracked_forward(*args, **kwargs):
+        with active_stage("generate"):
+            return forward(*args, **kwargs)
+
+    pipe.preprocess = tracked_preprocess
+    pipe._forward = tracked_forward
+    pipe._memory_instrumented = True
+    return pipe
+
+def project_job_memory(info, batch_size, low_memory=False):
+    """
+    估算任务在各阶段的内存占用（字节）
+
+    参数:
+        info: probe_audio 的结果（duration, channels, sample_rate, codec）
+        batch_size: pipeline 批大小
+        low_memory: 是否使用低内存执行方式
+    """
+    duration = info['duration'] or 0
+    is_pcm_wav = str(info.get('codec', '')).startswith('pcm_')
+    if low_memory:
+        decode = 0
+        audio = min(duration, LOW_MEMORY_WINDOW_SECONDS) * 16000 * 4
+    else:
+        # pydub 解码结果为 16 位整数，导出 WAV 时还会再复制一份
+        decode = 0 if is_pcm_wav else duration * (info.get('sample_rate') or 48000) * max(info.get('channels') or 2, 1) * 2 * 2
+        audio = duration * 16000 * 4
+    features = batch_size * FEATURE_BYTES_PER_CHUNK
+    generate = batch_size * GENERATE_BYTES_PER_ITEM
+    return {
+        "decode": int(decode),
+        "audio": int(audio),
+        "features": int(features),
+        "generate": int(generate),
+        # 解码缓冲在读取音频前已释放，峰值取两者中较大的
+        "total": int(max(decode, audio + features + generate)),
+    }
+
+class MemoryGuard:
+    """
+    根据预计内存占用选择执行方式，并限制同时处理中任务的总占用
+
+    参数:
+        budget_mb: 所有处理中任务的内存预算（不含模型权重）
+    """
+
+    def __init__(self, budget_mb=MEMORY_BUDGET_MB):
+        self.budget_bytes = budget_mb * MB
+        self.in_flight = 0
+        self.running_jobs = 0
+        self._condition = threading.Condition()
+
+    def plan(self, info, batch_size=16):
+        """
+        选择执行方式
+
+        返回:
+            dict: low_memory, batch_size, projected_mb（各阶段估算）
+        """
+        projection = project_job_memory(info, batch_size)
+        low_memory = False
+        if projection["total"] > self.budget_bytes:
+            low_memory = True
+            projection = project_job_memory(info, batch_size, low_memory=True)
+            while projection["total"] > self.budget_bytes and batch_size > 1:
+                batch_size //= 2
+                projection = project_job_memory(info, batch_size, low_memory=True)
+            if projection["total"] > self.budget_bytes:
+                logging.warning("任务在低内存模式下仍可能超出内存预算")
+        return {
+            "low_memory": low_memory,
+            "batch_size": batch_size,
+            "projected_bytes": projection["total"],
+            "projected_mb": {k: round(v / MB, 1) for k, v in projection.items()},
+        }
+
+    def acquire(self, plan, on_wait=None):
+        """
+        等待直到内存预算足够容纳该任务；没有其他任务在运行时总是放行
+
+        参数:
+            on_wait: 需要排队时调用一次，参数为当前处理中任务的预计占用（MB）
+        """
+        needed = plan["projected_bytes"]
+        with self._condition:
+            def has_room():
+                return self.running_jobs == 0 or self.in_flight + needed <= self.budget_bytes
+
+            if not has_room() and on_wait is not None:
+                on_wait(self.in_flight / MB)
+            self._condition.wait_for(has_room)
+            self.in_flight += needed
+            self.running_jobs += 1
+
+    def release(self, plan):
+        with self._condition:
+            self.in_flight = max(0, self.in_flight - plan["projected_bytes"])
+            self.running_jobs -= 1
+            self._condition.notify_all()
@@ -0,0 +1,328 @@
+"""
+多模型管理
+
+按需加载 tiny/base/small/medium 或本地微调模型，同一模型（同一精度）的 pipeline 在所有任务之间共享。
+已加载模型的预估内存总和超过预算时，按最近最少使用（LRU）顺序卸载当前没有任务在用的模型。
+
+通过环境变量配置:
+    WHISPER_DEFAULT_MODEL       默认模型，默认 small
+    WHISPER_MODEL_BUDGET_MB     已加载模型的内存/显存预算（MB），默认 6144
+    WHISPER_LOCAL_MODELS        本地模型列表，格式为 "名称=路径;名称=路径"
+    WHISPER_STUB_MODEL          设为 1 时使用 stub_model 中的模拟模型（压力测试用，不下载模型）
+    WHISPER_PIPELINED           设为 1 时编码和解码流水线执行（见 pipelined）
+"""
+
+import os
+import gc
+import time
+import logging
+import threading
+import contextlib
+from collections import OrderedDict
+
+from whisper_transcriber import build_pipeline
+
+USE_STUB_MODEL = os.environ.get('WHISPER_STUB_MODEL', '0') == '1'
+PIPELINED = os.environ.get('WHISPER_PIPELINED', '0') == '1'
+
+# 内置模型及其参数量（百万）
+MODEL_SPECS = {
+    "tiny": ("openai/whisper-tiny", 39),
+    "base": ("openai/whisper-base", 74),
+    "small": ("openai/whisper-small", 244),
+    "medium": ("openai/whisper-medium", 769),
+}
+
+DEFAULT_MODEL = os.environ.get('WHISPER_DEFAULT_MODEL', 'small')
+MODEL_BUDGET_MB = float(os.environ.get('WHISPER_MODEL_BUDGET_MB', 6144))
+
+# 权重之外 pipeline 运行时的额外占用（激活值、缓存等）按权重的比例估算
+RUNTIME_OVERHEAD = 1.3
+
+def _parse_local_models(value):
+    models = {}
+    for item in (value or '').split(';'):
+        if '=' in item:
+            name, path = item.split('=', 1)
+            models[name.strip()] = path.strip()
+    return models
+
+LOCAL_MODELS = _parse_local_models(os.environ.get('WHISPER_LOCAL_MODELS'))
+
+def _cuda_available():
+    try:
+        import torch
+    except ImportError:
+        return False
+    return torch.cuda.is_available()
+
+def _default_dtype():
+    if USE_STUB_MODEL:
+        return "float32"
+    return "float16" if _cuda_available() else "float32"
+
+def _effective_dtype(dtype):
+    """实际使用的精度：CPU 上始终为 float32（与 build_pipeline 一致）"""
+    default = _default_dtype()
+    return dtype if dtype is not None and default == "float16" else default
+
+def _bytes_per_param(dtype=None):
+    return 2 if _effective_dtype(dtype) == "float16" else 4
+
+def model_key(name=None, dtype=None):
+    """
+    模型池中的键：使用默认精度时就是模型名称，否则为 "名称:精度"
+    """
+    name = name or DEFAULT_MODEL
+    if dtype is None or _effective_dtype(dtype) == _default_dtype():
+        return name
+    return f"{name}:{_effective_dtype(dtype)}"
+
+def _local_model_params(path):
+    """根据权重文件大小估算本地模型参数量（百万），权重按 float32 计算"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(('.safetensors', '.bin')):
+                total += os.path.getsize(os.path.join(root, name))
+    return total / 4 / 1e6
+
+def available_models():
+    """可供选择的模型名称"""
+    return list(MODEL_SPECS) + list(LOCAL_MODELS)
+
+def split_model_key(key):
+    """model_key 的逆操作，返回 (模型名称, 精度或 None)"""
+    name, _, dtype = key.rpartition(':')
+    if name and dtype in ("float16", "float32"):
+        return name, dtype
+    return key, None
+
+def resolve_model(name, dtype=None):
+    """
+    解析模型名称
+
+    参数:
+        name: 内置模型名、WHISPER_LOCAL_MODELS 中的名称，或本地模型目录
+        dtype: 可选，加载精度，影响预估内存
+    返回:
+        tuple: (模型 ID 或路径, 预估内存字节数)
+    """
+    name = name or DEFAULT_MODEL
+    if name in MODEL_SPECS:
+        model_id, params = MODEL_SPECS[name]
+    elif name in LOCAL_MODELS or os.path.isdir(name):
+        model_id = LOCAL_MODELS.get(name, name)
+        params = _local_model_params(model_id)
+    else:
+        raise ValueError(f"未知的模型: {name}，可选: {', '.join(available_models())}")
+    return model_id, int(params * 1e6 * _bytes_per_param(dtype) * RUNTIME_OVERHEAD)
+
+class _Entry:
+    def __init__(self, model_id, estimated_bytes, dtype=None):
+        self.model_id = model_id
+        self.estimated_bytes = estimated_bytes
+        self.dtype = dtype
+        self.pipe = None
+        self.in_use = 0
+        self.load_lock = threading.Lock()
+        self.loading_since = None
+        self.stage = None
+        self.error = None
+        # 正在加载时已在预算中预留 estimated_bytes，并发加载的模型不会一起超出预算
+        self.reserved = False
+
+class ModelRegistry:
+    """
+    按需加载、LRU 卸载的模型池
+
+    参数:
+        budget_mb: 已加载模型的预估内存总和上限
+        loader: 根据模型 ID 构建 pipeline 的函数，签名同 whisper_transcriber.build_pipeline；
+                默认为 build_pipeline，设置 WHISPER_STUB_MODEL=1 时为 stub_model.load_stub_pipeline，
+                设置 WHISPER_PIPELINED=1 时为 pipelined.load_pipelined_pipeline
+    """
+
+    def __init__(self, budget_mb=MODEL_BUDGET_MB, loader=None):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        if loader is None:
+            if USE_STUB_MODEL:
+                from stub_model import load_stub_pipeline
+                loader = load_stub_pipeline
+            elif PIPELINED:
+                from pipelined import load_pipelined_pipeline
+                loader = load_pipelined_pipeline
+            else:
+                loader = build_pipeline
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._stats = {}
+
+    def _stat(self, name, model_id):
+        return self._stats.setdefault(name, {
+            "model": name,
+            "model_id": model_id,
+            "requests": 0,
+            "loads": 0,
+            "evictions": 0,
+            "last_load_seconds": None,
+            "total_load_seconds": 0.0,
+            "resident_since": None,
+            "resident_seconds": 0.0,
+        })
+
+    @contextlib.contextmanager
+    def acquire(self, name=None, dtype=None):
+        """
+        取得模型的 pipeline，使用期间该模型不会被卸载
+
+        参数:
+            name: 模型名称，默认模型为 None
+            dtype: 可选，加载精度（"float16"/"float32"），默认按设备自动选择；
+                   同一模型的不同精度分别加载
+        用法:
+            with registry.acquire("medium") as pipe:
+                pipe(audio)
+        """
+        model_name = name or DEFAULT_MODEL
+        model_id, estimated_bytes = resolve_model(model_name, dtype)
+        name = model_key(model_name, dtype)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                entry = self._entries[name] = _Entry(model_id, estimated_bytes, dtype)
+            entry.in_use += 1
+            self._entries.move_to_end(name)
+            self._stat(name, model_id)["requests"] += 1
+
+        try:
+            # 同一模型只加载一次，其他请求等待加载完成后直接共享
+            with entry.load_lock:
+                if entry.pipe is None:
+                    self._load(name, entry)
+            yield entry.pipe
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+
+    def get(self, name=None, dtype=None):
+        """取得模型的 pipeline（不保持占用）"""
+        with self.acquire(name, dtype) as pipe:
+            return pipe
+
+    def is_loaded(self, name=None, dtype=None):
+        """模型（指定精度）是否已加载，键与 acquire 相同"""
+        with self._lock:
+            entry = self._entries.get(model_key(name, dtype))
+            return entry is not None and entry.pipe is not None
+
+    def load_status(self, name=None, dtype=None):
+        """
+        模型（指定精度）的加载状态，键与 acquire 相同
+
+        返回:
+            dict: state（idle/loading/ready/failed）, stage（当前加载阶段）,
+                  elapsed_seconds（已加载时长）, error
+        """
+        with self._lock:
+            entry = self._entries.get(model_key(name, dtype))
+            if entry is None:
+                return {"state": "idle", "stage": None, "elapsed_seconds": 0.0, "error": None}
+            if entry.pipe is not None:
+                state = "ready"
+            elif entry.loading_since is not None:
+                state = "loading"
+            elif entry.error is not None:
+                state = "failed"
+            else:
+                state = "idle"
+            elapsed = time.time() - entry.loading_since if entry.loading_since else 0.0
+            return {"state": state, "stage": entry.stage,
+                    "elapsed_seconds": round(elapsed, 1), "error": entry.error}
+
+    def _load(self, name, entry):
+        self._make_room(name, entry)
+        logging.info(f"正在加载模型 {name}（{entry.model_id}）...")
+        start_time = time.time()
+        entry.loading_since = start_time
+        entry.error = None
+
+        def on_stage(message):
+            entry.stage = message
+
+        try:
+            pipe = self.loader(entry.model_id, status_callback=on_stage, dtype=entry.dtype)
+        except Exception as e:
+            entry.error = str(e)
+            with self._lock:
+                entry.reserved = False
+            raise
+        finally:
+            entry.loading_since = None
+        elapsed = time.time() - start_time
+
+        with self._lock:
+            entry.pipe = pipe
+            entry.reserved = False
+            entry.stage = "加载完成"
+            stat = self._stat(name, entry.model_id)
+            stat["loads"] += 1
+            stat["last_load_seconds"] = round(elapsed, 2)
+            stat["total_load_seconds"] = round(stat["total_load_seconds"] + elapsed, 2)
+            stat["resident_since"] = time.time()
+        logging.info(f"模型 {name} 加载完成，耗时 {elapsed:.1f} 秒")
+
+    def _make_room(self, name, entry):
+        """卸载最久未使用的空闲模型，直到新模型能放进预算，并为它预留预估内存（加载失败时由 _load 释放）"""
+        needed_bytes = entry.estimated_bytes
+        evicted = []
+        with self._lock:
+            # 其他正在加载的模型虽然还没有 pipe，也要计入
+            resident = sum(e.estimated_bytes for e in self._entries.values()
+                           if e is not entry and (e.pipe is not None or e.reserved))
+            for victim_name, victim in list(self._entries.items()):
+                if resident + needed_bytes <= self.budget_bytes:
+                    break
+                if victim_name == name or victim.pipe is None or victim.in_use > 0:
+                    continue
+                victim.pipe = None
+                del self._entries[victim_name]
+                resident -= victim.estimated_bytes
+                stat = self._stat(victim_name, victim.model_id)
+                stat["evictions"] += 1
+                stat["resident_seconds"] += time.time() - stat["resident_since"]
+                stat["resident_since"] = None
+                evicted.append(victim_name)
+
+            if resident + needed_bytes > self.budget_bytes:
+                logging.warning(f"模型 {name} 加载后将超出内存预算（其他模型正在使用或加载中）")
+            entry.reserved = True
+
+        if evicted:
+            logging.info(f"为加载 {name} 卸载了模型: {', '.join(evicted)}")
+            gc.collect()
+            if _cuda_available():
+                import torch
+                torch.cuda.empty_cache()
+
+    def metrics(self):
+        """
+        各模型的加载耗时、驻留情况和使用次数
+        """
+        now = time.time()
+        with self._lock:
+            result = []
+            for name, stat in self._stats.items():
+                entry = self._entries.get(name)
+                item = dict(stat)
+                item["resident"] = entry is not None and entry.pipe is not None
+                item["in_use"] = entry.in_use if entry is not None else 0
+                estimated_bytes = entry.estimated_bytes if entry is not None else resolve_model(*split_model_key(name))[1]
+                item["estimated_mb"] = round(estimated_bytes / 1024 / 1024)
+                if stat["resident_since"] is not None:
+                    item["resident_seconds"] = stat["resident_seconds"] + now - stat["resident_since"]
+                item["resident_seconds"] = round(item["resident_seconds"], 1)
+                item.pop("resident_since")
+                result.append(item)
+            return result
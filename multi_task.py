@@ -0,0 +1,207 @@
+"""
+多任务识别：一次编码，多次解码
+
+同一段录音经常需要几种结果：原语言转录、英文翻译（task="translate"）、换一个提示词重新识别。
+每种结果单独调用 pipeline 时，整段音频都要重新经过编码器，而编码约占一半的计算量。
+
+这里把音频按 30 秒（Whisper 的输入窗口）切分，每块只经过一次编码器，编码结果缓存起来，
+各任务的解码器直接使用缓存的编码结果（model.generate(encoder_outputs=...)）。
+缓存超过内存上限的部分写入临时目录，需要时再读回，长文件也不会占满显存。
+
+通过环境变量配置:
+    WHISPER_ENCODER_CACHE_MB    编码结果在内存中保留的上限（MB），默认 1024，超出部分写入磁盘
+"""
+
+import os
+import time
+import logging
+import tempfile
+import contextlib
+
+from decoding_guard import MAX_NEW_TOKENS, record, speech_seconds, stopping_criteria, token_budget, with_criteria
+from whisper_transcriber import inference_lock, split_audio
+
+ENCODER_CACHE_MB = float(os.environ.get('WHISPER_ENCODER_CACHE_MB', 1024))
+
+# 每块不超过 Whisper 的 30 秒输入窗口，切分点在块末尾 3 秒内的静音处
+CHUNK_SECONDS = 30
+CHUNK_SEARCH_SECONDS = 3
+ENCODE_BATCH_SIZE = 8
+
+class EncoderCache:
+    """
+    按块保存编码器输出，超过内存上限后的块保存到临时目录
+
+    参数:
+        budget_mb: 内存中保留的上限（MB）
+    """
+
+    def __init__(self, budget_mb=ENCODER_CACHE_MB):
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.resident_bytes = 0
+        self.batches = []
+        self.spilled = 0
+        self._directory = None
+
+    def add(self, hidden_states, budgets=None):
+        """保存一批编码结果（形状为 批 x 帧 x 维度 的张量）及各块的 token 上限"""
+        import torch
+
+        size = hidden_states.numel() * hidden_states.element_size()
+        if self.resident_bytes + size <= self.budget_bytes:
+            self.batches.append((hidden_states, budgets))
+            self.resident_bytes += size
+            return
+        if self._directory is None:
+            self._directory = tempfile.TemporaryDirectory(prefix="whisper_encoder_")
+        path = os.path.join(self._directory.name, f"{len(self.batches):05d}.pt")
+        torch.save((hidden_states.cpu(), budgets), path)
+        self.batches.append(path)
+        self.spilled += 1
+
+    def __iter__(self):
+        """按顺序返回各批 (编码结果, token 上限)，磁盘上的批读回原来的设备"""
+        import torch
+
+        device = next((item[0].device for item in self.batches if not isinstance(item, str)), None)
+        for item in self.batches:
+            if isinstance(item, str):
+                hidden_states, budgets = torch.load(item)
+                if device is not None:
+                    hidden_states = hidden_states.to(device)
+                item = (hidden_states, budgets)
+            yield item
+
+    def close(self):
+        self.batches = []
+        self.resident_bytes = 0
+        if self._directory is not None:
+            self._directory.cleanup()
+            self._directory = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def parse_task(spec):
+    """
+    解析任务描述 "任务[:语言]"，例如 transcribe、translate、transcribe:zh
+
+    返回:
+        dict: {"name", "task", "language", "prompt"}
+    """
+    task, _, language = spec.partition(':')
+    if task not in ("transcribe", "translate"):
+        raise ValueError(f"未知的任务: {task}，可选: transcribe, translate")
+    return {"name": spec.replace(':', '-'), "task": task, "language": language or None, "prompt": None}
+
+def _require_model(pipe):
+    if getattr(pipe, "model", None) is None or not hasattr(pipe.model, "get_encoder"):
+        raise ValueError("当前模型不支持多任务识别（需要 Whisper 模型的 pipeline）")
+
+def chunk_audio(audio, sr=16000):
+    """按 Whisper 输入窗口切块，返回非空的 [(start, end)]"""
+    chunks = split_audio(audio, sr=sr, segment_seconds=CHUNK_SECONDS, search_seconds=CHUNK_SEARCH_SECONDS)
+    return [(start, end) for start, end in chunks if end > start]
+
+def encode_chunks(pipe, chunks, sr=16000):
+    """
+    对一批音频块提取特征并运行编码器（不加锁，由调用方保证同一时间只有一个任务使用模型）
+
+    返回:
+        tuple: (编码器输出，形状为 块数 x 帧 x 维度; 按各块语音时长估算的 token 上限)
+    """
+    import torch
+
+    _require_model(pipe)
+    parameter = next(pipe.model.parameters())
+    features = pipe.feature_extractor(chunks, sampling_rate=sr, return_tensors="pt").input_features
+    budgets = [token_budget(speech_seconds(f, len(chunk) // 160)) for f, chunk in zip(features, chunks)]
+    features = features.to(parameter.device, dtype=parameter.dtype)
+    with torch.inference_mode():
+        return pipe.model.get_encoder()(features).last_hidden_state, budgets
+
+def generate_from_encoder(pipe, hidden_states, generate_kwargs=None, budgets=None):
+    """
+    用编码器输出解码一批音频块（不加锁），返回各块的文本
+
+    参数:
+        budgets: 可选，各块的 token 上限（见 decoding_guard），同时启用循环检测
+    """
+    import torch
+    from transformers.modeling_outputs import BaseModelOutput
+
+    kwargs = {"max_new_tokens": MAX_NEW_TOKENS, **(generate_kwargs or {})}
+    criteria = stopping_criteria(budgets or [MAX_NEW_TOKENS] * len(hidden_states), pipe.tokenizer)
+    with torch.inference_mode():
+        tokens = pipe.model.generate(encoder_outputs=BaseModelOutput(last_hidden_state=hidden_states),
+                                     **with_criteria(kwargs, criteria))
+    record(criteria)
+    return pipe.tokenizer.batch_decode(tokens, skip_special_tokens=True)
+
+def encode_audio(pipe, audio, sr=16000, cache=None, batch_size=ENCODE_BATCH_SIZE):
+    """
+    切块并逐批编码
+
+    返回:
+        tuple: (EncoderCache, 块数)
+    """
+    cache = cache if cache is not None else EncoderCache()
+    chunks = chunk_audio(audio, sr=sr)
+    for index in range(0, len(chunks), batch_size):
+        batch = [audio[start:end] for start, end in chunks[index:index + batch_size]]
+        with inference_lock:
+            cache.add(*encode_chunks(pipe, batch, sr=sr))
+    return cache, len(chunks)
+
+def decode_task(pipe, cache, task, generate_kwargs=None):
+    """
+    用缓存的编码结果为一个任务解码，返回原始文本
+
+    参数:
+        generate_kwargs: 可选，所有任务共用的 generate 参数（如预设的 num_beams、temperature）
+    """
+    generate_kwargs = {**(generate_kwargs or {}), "task": task["task"]}
+    if task.get("language"):
+        generate_kwargs["language"] = task["language"]
+    if task.get("prompt"):
+        generate_kwargs["prompt_ids"] = pipe.tokenizer.get_prompt_ids(
+            task["prompt"], return_tensors="pt").to(pipe.model.device)
+    texts = []
+    for hidden_states, budgets in cache:
+        with inference_lock:
+            texts.extend(generate_from_encoder(pipe, hidden_states, generate_kwargs, budgets))
+    return ''.join(texts)
+
+def transcribe_multi(pipe, audio, tasks, sr=16000, status_callback=None, tracker=None, generate_kwargs=None):
+    """
+    对同一段音频执行多个识别任务，编码器只运行一次
+
+    参数:
+        tasks: 任务列表（见 parse_task），prompt 为可选的提示词
+        generate_kwargs: 可选，各任务共用的 generate 参数（见 presets.pipeline_options）
+        tracker: 可选，MemoryTracker，编码和各任务解码分别计为一个阶段
+    返回:
+        tuple: ({任务名: 原始文本}, 统计信息 dict)
+    """
+    def stage(name):
+        return tracker.stage(name) if tracker is not None else contextlib.nullcontext()
+
+    start = time.perf_counter()
+    with EncoderCache() as cache:
+        with stage("encode"):
+            _, num_chunks = encode_audio(pipe, audio, sr=sr, cache=cache)
+        stats = {"chunks": num_chunks, "encode_seconds": round(time.perf_counter() - start, 2),
+                 "spilled_batches": cache.spilled, "decode_seconds": {}}
+        if status_callback:
+            status_callback(f"编码完成：{num_chunks} 块，用时 {stats['encode_seconds']} 秒")
+        results = {}
+        for task in tasks:
+            start = time.perf_counter()
+            with stage(f"decode:{task['name']}"):
+                results[task["name"]] = decode_task(pipe, cache, task, generate_kwargs)
+            stats["decode_seconds"][task["name"]] = round(time.perf_counter() - start, 2)
+            logging.info(f"任务 {task['name']} 解码完成，用时 {stats['decode_seconds'][task['name']]} 秒")
+    return results, stats
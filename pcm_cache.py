@@ -0,0 +1,153 @@
+"""
+解码音频缓存
+
+同一个文件换模型或解码设置重新识别时，convert_audio_to_wav 和 librosa.load 每次都要重新解码和重采样，
+压缩格式每分钟音频往往需要几秒。开启缓存后，解码得到的 16kHz 单声道 float32 音频保存为 .npy 文件，
+之后直接以内存映射方式打开，不再解码。
+
+缓存键由文件内容的 SHA-256、采样率和解码器版本共同决定：文件内容变化或解码方式升级后自动失效，
+改名或复制的文件仍然命中。缓存总大小超过上限时，按最近使用时间从旧到新删除。
+
+通过环境变量配置:
+    WHISPER_PCM_CACHE       设为 1 开启缓存，默认关闭
+    WHISPER_PCM_CACHE_DIR   缓存目录，默认程序目录下的 cache/pcm
+    WHISPER_PCM_CACHE_MB    缓存总大小上限（MB），默认 4096（约 18 小时音频）
+"""
+
+import os
+import time
+import pathlib
+import hashlib
+import logging
+import tempfile
+import threading
+
+import numpy as np
+
+PCM_CACHE_ENABLED = os.environ.get('WHISPER_PCM_CACHE', '0') == '1'
+PCM_CACHE_DIR = pathlib.Path(os.environ.get(
+    'WHISPER_PCM_CACHE_DIR', pathlib.Path(__file__).parent / "cache" / "pcm"))
+PCM_CACHE_MB = float(os.environ.get('WHISPER_PCM_CACHE_MB', 4096))
+
+# 解码方式（ffmpeg 参数、重采样方法等）改变、结果可能不同时加一，旧缓存随之失效
+DECODER_VERSION = 1
+
+_HASH_BLOCK = 1024 * 1024
+
+def file_digest(path):
+    """文件内容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+class PcmCache:
+    """
+    按内容指纹保存解码后的音频，每个文件一个 .npy，多个进程可以共用同一个目录
+
+    参数:
+        directory: 缓存目录
+        budget_mb: 缓存总大小上限（MB）
+    """
+
+    def __init__(self, directory=PCM_CACHE_DIR, budget_mb=PCM_CACHE_MB):
+        self.directory = pathlib.Path(directory)
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        # 同一进程内按 (路径, 大小, 修改时间) 记住文件指纹，查找和保存时不必重复计算
+        self._digests = {}
+        self._lock = threading.Lock()
+
+    def key(self, audio_path, sr=16000):
+        stat = os.stat(audio_path)
+        signature = (os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._digests.get(signature)
+        if digest is None:
+            digest = file_digest(audio_path)
+            with self._lock:
+                self._digests[signature] = digest
+        return hashlib.sha256(f"v{DECODER_VERSION}|{sr}|{digest}".encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.npy"
+
+    def get(self, key):
+        """
+        返回以只读内存映射方式打开的音频，没有缓存时返回 None
+        """
+        path = self._path(key)
+        try:
+            audio = np.load(path, mmap_mode='r')
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"读取解码缓存失败: {str(e)}")
+            return None
+        try:
+            # 修改时间记录最近使用时间，淘汰时优先删除最久未用的文件
+            os.utime(path)
+        except OSError:
+            pass
+        return audio
+
+    def put(self, key, audio):
+        """保存解码结果（先写临时文件再替换），然后按上限淘汰旧文件"""
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, np.ascontiguousarray(audio, dtype=np.float32))
+                os.replace(temp_path, path)
+            except BaseException:
+                os.remove(temp_path)
+                raise
+        except OSError as e:
+            logging.warning(f"写入解码缓存失败: {str(e)}")
+            return
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """缓存总大小超过上限时，按最近使用时间从旧到新删除"""
+        entries = []
+        for path in self.directory.glob('*/*.npy'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.budget_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                path.unlink()
+            except OSError:
+                # Windows 下正在被映射的文件无法删除，留到下次
+                continue
+            total -= size
+
+    def load(self, audio_path, decode, sr=16000):
+        """
+        读取缓存，没有时调用 decode() 解码并保存
+
+        返回:
+            tuple: (音频数组, 是否命中缓存)
+        """
+        start = time.perf_counter()
+        key = self.key(audio_path, sr)
+        audio = self.get(key)
+        if audio is not None:
+            logging.info(f"解码缓存命中: {audio_path}（{time.perf_counter() - start:.2f} 秒）")
+            return audio, True
+        audio = decode()
+        self.put(key, audio)
+        return audio, False
+
+def default_pcm_cache():
+    """按环境变量创建缓存，关闭时返回 None"""
+    return PcmCache() if PCM_CACHE_ENABLED else None
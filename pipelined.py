@@ -0,0 +1,134 @@
+"""
+编码与解码流水线执行
+
+transformers 的 pipeline 对每个批次先运行编码器，再运行完整的自回归解码，下一批要等解码结束才开始。
+自回归解码受延迟限制，每步的计算量很小，这段时间设备有一部分是空闲的。
+
+PipelinedPipeline 把两步拆开：后台线程编码第 N+1 批的同时，调用线程解码第 N 批。
+GPU 上编码使用单独的 CUDA 流，两个流上的计算可以同时执行，解码前等待对应批次的编码事件；
+CPU 上两步分别在两个线程中执行（PyTorch 计算时释放 GIL，但共用一个算子线程池，收益小于 GPU）。
+结果按块的顺序拼接，与逐批执行相同。
+
+与原 pipeline 的差异：按静音位置切成不超过 30 秒的块（见 multi_task.chunk_audio），
+块之间没有重叠，不使用 chunk_length_s；需要时间戳时仍交给原 pipeline 处理。
+
+通过环境变量配置:
+    WHISPER_PIPELINED       设为 1 时 ModelRegistry 加载的模型使用流水线执行，默认关闭
+    WHISPER_PIPELINE_DEPTH  编码最多领先解码的批数，默认 2
+"""
+
+import os
+import queue
+import threading
+import contextlib
+
+from memory_guard import active_stage
+from multi_task import chunk_audio, encode_chunks, generate_from_encoder
+
+PIPELINE_DEPTH = int(os.environ.get('WHISPER_PIPELINE_DEPTH', 2))
+
+class PipelinedPipeline:
+    """
+    与 transformers 语音识别 pipeline 调用方式相同、编码和解码重叠执行的包装
+
+    参数:
+        pipe: Whisper 模型的 transformers pipeline
+        batch_size: 默认批大小（每批的块数）
+        depth: 编码最多领先解码的批数；0 表示不重叠，逐批先编码再解码（用于对比测试）
+    """
+
+    def __init__(self, pipe, batch_size=16, depth=PIPELINE_DEPTH):
+        self.pipe = pipe
+        self.batch_size = batch_size
+        self.depth = depth
+
+    def __getattr__(self, name):
+        # model、tokenizer、feature_extractor 等属性直接使用原 pipeline 的
+        return getattr(self.pipe, name)
+
+    def __call__(self, audio, return_timestamps=False, batch_size=None, generate_kwargs=None,
+                 chunk_length_s=None, **kwargs):
+        if return_timestamps or kwargs:
+            options = {"batch_size": batch_size, "generate_kwargs": generate_kwargs, "chunk_length_s": chunk_length_s}
+            kwargs.update({name: value for name, value in options.items() if value is not None})
+            return self.pipe(audio, return_timestamps=return_timestamps, **kwargs)
+        items = audio if isinstance(audio, list) else [audio]
+        # 多段音频的块合并成一个序列，凑满批次后再按所属音频拼回
+        chunks = []
+        for owner, item in enumerate(items):
+            chunks.extend((owner, item[start:end]) for start, end in chunk_audio(item))
+        with active_stage("generate"):
+            texts = self.run([chunk for _, chunk in chunks], batch_size or self.batch_size, generate_kwargs)
+        results = [[] for _ in items]
+        for (owner, _), text in zip(chunks, texts):
+            results[owner].append(text)
+        results = [{"text": ''.join(parts)} for parts in results]
+        return results if isinstance(audio, list) else results[0]
+
+    def run(self, chunks, batch_size, generate_kwargs=None):
+        """
+        编码和解码重叠执行，返回与 chunks 一一对应的文本
+        """
+        batches = [chunks[i:i + batch_size] for i in range(0, len(chunks), batch_size)]
+        if self.depth <= 0:
+            texts = []
+            for batch in batches:
+                hidden_states, budgets = encode_chunks(self.pipe, batch)
+                texts.extend(generate_from_encoder(self.pipe, hidden_states, generate_kwargs, budgets))
+            return texts
+
+        import torch
+
+        device = next(self.pipe.model.parameters()).device
+        stream = torch.cuda.Stream(device) if device.type == "cuda" else None
+        ready = queue.Queue(maxsize=self.depth)
+        stop = threading.Event()
+
+        def encode_loop():
+            try:
+                with torch.cuda.stream(stream) if stream is not None else contextlib.nullcontext():
+                    for batch in batches:
+                        if stop.is_set():
+                            return
+                        hidden_states, budgets = encode_chunks(self.pipe, batch)
+                        event = None
+                        if stream is not None:
+                            event = torch.cuda.Event()
+                            event.record(stream)
+                        ready.put((hidden_states, budgets, event))
+            except BaseException as e:
+                ready.put(e)
+
+        encoder = threading.Thread(target=encode_loop, name="whisper-encoder", daemon=True)
+        encoder.start()
+        texts = []
+        try:
+            for _ in batches:
+                item = ready.get()
+                if isinstance(item, BaseException):
+                    raise item
+                hidden_states, budgets, event = item
+                if event is not None:
+                    # 解码流等待这一批编码完成；张量由编码流分配，告知分配器它也在解码流上使用
+                    current = torch.cuda.current_stream(device)
+                    current.wait_event(event)
+                    hidden_states.record_stream(current)
+                texts.extend(generate_from_encoder(self.pipe, hidden_states, generate_kwargs, budgets))
+        finally:
+            stop.set()
+            # 出错时取走队列中剩余的批次，让编码线程能够退出
+            while encoder.is_alive():
+                try:
+                    ready.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            encoder.join()
+        return texts
+
+def load_pipelined_pipeline(model_id, status_callback=None, dtype=None):
+    """
+    与 whisper_transcriber.build_pipeline 签名相同的加载函数，返回流水线执行的包装
+    """
+    from whisper_transcriber import build_pipeline
+
+    return PipelinedPipeline(build_pipeline(model_id, status_callback=status_callback, dtype=dtype))
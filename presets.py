@@ -0,0 +1,97 @@
+"""
+识别预设
+
+每个预设同时决定模型大小、束搜索宽度、温度回退、精度和分块方式:
+    fast      base 模型，贪心解码，30 秒分块，适合快速出草稿
+    balanced  默认模型（small），贪心解码，15 秒分块，与之前的固定设置相同
+    accurate  medium 模型，5 路束搜索，温度回退，float32，30 秒分块，适合最终稿
+
+各预设在自己的样本上的实时率和字/词错误率可以用 bench_presets.py 测量。
+
+通过环境变量配置:
+    WHISPER_DEFAULT_PRESET  默认预设，默认 balanced
+"""
+
+import os
+
+from decoding_guard import guard_settings
+from model_registry import DEFAULT_MODEL, PIPELINED, USE_STUB_MODEL
+
+# Whisper 论文中的温度回退序列：某个分块的输出压缩率过高或平均对数概率过低时，依次提高温度重新解码
+TEMPERATURE_FALLBACK = (0.0, 0.2, 0.4, 0.6, 0.8, 1.0)
+
+PRESETS = {
+    "fast": {
+        "label": "快速",
+        "model": "base",
+        "num_beams": 1,
+        "temperature": 0.0,
+        "dtype": None,
+        "chunk_length_s": 30,
+        "batch_size": 16,
+        "description": "base 模型、贪心解码，速度最快，适合草稿",
+    },
+    "balanced": {
+        "label": "均衡",
+        "model": DEFAULT_MODEL,
+        "num_beams": 1,
+        "temperature": 0.0,
+        "dtype": None,
+        "chunk_length_s": 15,
+        "batch_size": 16,
+        "description": f"{DEFAULT_MODEL} 模型、贪心解码",
+    },
+    "accurate": {
+        "label": "精确",
+        "model": "medium",
+        "num_beams": 5,
+        "temperature": TEMPERATURE_FALLBACK,
+        "dtype": "float32",
+        "chunk_length_s": 30,
+        "batch_size": 4,
+        "description": "medium 模型、5 路束搜索、温度回退、float32，最慢但最准确",
+    },
+}
+
+DEFAULT_PRESET = os.environ.get('WHISPER_DEFAULT_PRESET', 'balanced')
+
+def get_preset(name=None):
+    """
+    参数:
+        name: 预设名称，None 为默认预设
+    返回:
+        dict: 预设内容（含 name）
+    异常:
+        ValueError: 未知的预设
+    """
+    name = name or DEFAULT_PRESET
+    if name not in PRESETS:
+        raise ValueError(f"未知的预设: {name}，可选: {', '.join(PRESETS)}")
+    return dict(PRESETS[name], name=name)
+
+def pipeline_options(preset):
+    """
+    预设对应的 pipeline 调用参数（分块、批大小和 generate 参数）
+    """
+    generate_kwargs = {"num_beams": preset["num_beams"]}
+    if isinstance(preset["temperature"], tuple):
+        generate_kwargs.update({
+            "temperature": preset["temperature"],
+            "do_sample": False,
+            "compression_ratio_threshold": 1.35,
+            "logprob_threshold": -1.0,
+        })
+    return {
+        "chunk_length_s": preset["chunk_length_s"],
+        "batch_size": preset["batch_size"],
+        "generate_kwargs": generate_kwargs,
+    }
+
+def cache_scope(preset, model_name=None):
+    """计算分段指纹时使用的配置：模型、解码设置、循环检测设置或执行方式不同，结果互不复用"""
+    backend = "stub" if USE_STUB_MODEL else "pipelined" if PIPELINED else "pipeline"
+    return f"{model_name or preset['model']}|{preset['name']}|{guard_settings()}|{backend}"
+
+def preset_choices():
+    """界面下拉框的选项"""
+    return [(f"{p['label']}（{name}）：{p['description']}", name) for name, p in PRESETS.items()]
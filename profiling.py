@@ -0,0 +1,184 @@
+"""
+按任务开启的性能分析
+
+开启后在结果文件旁的 <结果文件名>.profile 目录中生成:
+    python.speedscope.json   采样式 Python 性能分析（格式转换、加载、识别等全部阶段），
+                             可在 https://www.speedscope.app 打开
+    inference-NNN.json       每次推理的 PyTorch profiler 跟踪，Chrome 跟踪格式，
+                             可在 chrome://tracing 或 https://ui.perfetto.dev 打开
+    operators.txt            每次推理耗时最多的算子汇总
+
+未开启时各处只多一次 None 判断，不采样、不导入 torch.profiler。
+"""
+
+import sys
+import json
+import time
+import pathlib
+import logging
+import threading
+import contextlib
+
+# Python 采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+# 算子汇总中每次推理显示的行数
+OPERATOR_ROWS = 30
+
+class JobProfiler:
+    """
+    一个任务的性能分析
+
+    进入 with 块的线程在整个任务期间被采样；执行推理的线程（例如调度器线程）
+    只在 inference() 期间被采样。
+
+    参数:
+        output_dir: 输出目录
+        interval: Python 采样间隔（秒）
+    """
+
+    def __init__(self, output_dir, interval=SAMPLE_INTERVAL):
+        self.output_dir = pathlib.Path(output_dir)
+        self.interval = interval
+        self.files = []
+        self._frames = []
+        self._frame_index = {}
+        self._samples = {}
+        self._threads = {}
+        self._operator_tables = []
+        self._inference_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._start_time = None
+
+    def __enter__(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._watch_thread()
+        self._start_time = time.perf_counter()
+        self._sampler = threading.Thread(target=self._sample_loop, daemon=True)
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._sampler.join()
+        try:
+            self._write_speedscope()
+            self._write_operators()
+        except OSError as e:
+            logging.warning(f"保存性能分析结果失败: {str(e)}")
+        return False
+
+    def _watch_thread(self):
+        thread = threading.current_thread()
+        with self._lock:
+            name, count = self._threads.get(thread.ident, (thread.name, 0))
+            self._threads[thread.ident] = (name, count + 1)
+
+    def _unwatch_thread(self):
+        ident = threading.get_ident()
+        with self._lock:
+            name, count = self._threads[ident]
+            if count > 1:
+                self._threads[ident] = (name, count - 1)
+            else:
+                del self._threads[ident]
+
+    def _frame_id(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self._frames)
+            self._frames.append({"name": code.co_name, "file": code.co_filename, "line": code.co_firstlineno})
+        return index
+
+    def _sample_loop(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight = now - last
+            last = now
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, (name, _) in self._threads.items():
+                    frame = frames.get(ident)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        stack.append(self._frame_id(frame.f_code))
+                        frame = frame.f_back
+                    stack.reverse()
+                    _, samples, weights = self._samples.setdefault(ident, (name, [], []))
+                    samples.append(stack)
+                    weights.append(weight)
+
+    @contextlib.contextmanager
+    def inference(self):
+        """
+        对一次推理调用进行 PyTorch profiler 跟踪，同时采样当前线程的 Python 调用栈
+        """
+        self._watch_thread()
+        try:
+            torch = sys.modules.get('torch')
+            if torch is None:
+                yield
+                return
+            from torch.profiler import ProfilerActivity, profile
+
+            use_cuda = torch.cuda.is_available()
+            activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if use_cuda else [])
+            with profile(activities=activities, record_shapes=True) as prof:
+                yield
+            with self._lock:
+                self._inference_count += 1
+                number = self._inference_count
+            trace_path = self.output_dir / f"inference-{number:03d}.json"
+            prof.export_chrome_trace(str(trace_path))
+            sort_by = "self_cuda_time_total" if use_cuda else "self_cpu_time_total"
+            table = prof.key_averages().table(sort_by=sort_by, row_limit=OPERATOR_ROWS)
+            with self._lock:
+                self.files.append(trace_path)
+                self._operator_tables.append((number, table))
+        finally:
+            self._unwatch_thread()
+
+    def _write_speedscope(self):
+        end_value = time.perf_counter() - self._start_time
+        profiles = []
+        for name, samples, weights in self._samples.values():
+            profiles.append({
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": end_value,
+                "samples": samples,
+                "weights": weights,
+            })
+        path = self.output_dir / "python.speedscope.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "$schema": "https://www.speedscope.app/file-format-schema.json",
+                "name": self.output_dir.name,
+                "exporter": "whisper_transcriber",
+                "activeProfileIndex": 0,
+                "shared": {"frames": self._frames},
+                "profiles": profiles,
+            }, f)
+        self.files.append(path)
+
+    def _write_operators(self):
+        if not self._operator_tables:
+            return
+        path = self.output_dir / "operators.txt"
+        with open(path, 'w', encoding='utf-8') as f:
+            for number, table in sorted(self._operator_tables):
+                f.write(f"推理 #{number}\n{table}\n\n")
+        self.files.append(path)
+
+def profiled_inference(profiler):
+    """profiler 为 None 时什么都不做"""
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.inference()
@@ -0,0 +1,246 @@
+"""
+转录任务调度
+
+所有识别请求先切分成若干段（见 whisper_transcriber.split_audio），由一个后台线程逐段执行。
+每执行完一段就重新挑选下一个任务，因此长任务可以在段边界被抢占：
+    1. 优先级高的类别先执行（interactive > normal > batch）
+    2. 同一优先级内按用户公平分配：已占用识别时长最少的用户先执行
+    3. 同一用户的任务按剩余音频时长从短到长执行（最短剩余作业优先）
+提交时先按分段指纹查找缓存（见 chunk_cache），内容未变化的段不再排队。
+"""
+
+import itertools
+import logging
+import threading
+import time
+
+from chunk_cache import chunk_fingerprint
+from model_registry import DEFAULT_MODEL
+from whisper_transcriber import FIRST_SEGMENT_SECONDS, split_audio, transcribe_segment
+
+# 优先级类别，数值越小越优先
+PRIORITY_CLASSES = {
+    "interactive": 0,
+    "normal": 1,
+    "batch": 2,
+}
+
+class FairShareQueue:
+    """
+    按 (优先级, 用户已占用时长, 剩余时长) 挑选下一个要执行的任务
+
+    任务对象需要有 user, priority, remaining_seconds, seq 属性。
+    用户从空闲变为活跃时，其已占用时长被提升到当前活跃用户中的最小值，
+    避免长时间没有提交任务的用户一回来就独占识别资源。
+    """
+
+    def __init__(self):
+        self.jobs = []
+        self.served = {}
+
+    def __len__(self):
+        return len(self.jobs)
+
+    def push(self, job):
+        active = {j.user for j in self.jobs}
+        if job.user not in active:
+            if active:
+                floor = min(self.served.get(user, 0.0) for user in active)
+                self.served[job.user] = max(self.served.get(job.user, 0.0), floor)
+            else:
+                # 队列空闲时重新计算份额
+                self.served = {job.user: 0.0}
+        self.jobs.append(job)
+
+    def pop(self):
+        """返回下一段应执行的任务（任务仍留在队列中，直到 remove）"""
+        return min(self.jobs, key=lambda job: (
+            PRIORITY_CLASSES.get(job.priority, PRIORITY_CLASSES["normal"]),
+            self.served.get(job.user, 0.0),
+            job.remaining_seconds,
+            job.seq,
+        ))
+
+    def account(self, job, audio_seconds):
+        """记录任务刚执行完的一段音频时长"""
+        self.served[job.user] = self.served.get(job.user, 0.0) + audio_seconds
+        job.remaining_seconds = max(0.0, job.remaining_seconds - audio_seconds)
+
+    def remove(self, job):
+        self.jobs.remove(job)
+
+class FifoQueue(FairShareQueue):
+    """
+    先来先服务，用于对比
+    """
+
+    def pop(self):
+        return min(self.jobs, key=lambda job: job.seq)
+
+class ScheduledJob:
+    """
+    一个排队中的识别任务
+    """
+
+    def __init__(self, audio, user, priority, seq, sr=16000, on_segment=None, model=None,
+                 batch_size=None, tracker=None, profiler=None, options=None, dtype=None, decode_stats=None,
+                 timer=None):
+        self.audio = audio
+        self.user = user
+        self.priority = priority
+        self.model = model
+        self.dtype = dtype
+        self.options = options
+        self.batch_size = batch_size
+        self.tracker = tracker
+        self.profiler = profiler
+        self.decode_stats = decode_stats
+        self.timer = timer
+        self.seq = seq
+        self.sr = sr
+        self.on_segment = on_segment
+        # 与 transcribe_segments 的切分方式相同，两条路径的分段缓存可以互相复用
+        self.segments = split_audio(audio, sr=sr, first_segment_seconds=FIRST_SEGMENT_SECONDS, stable=True)
+        self.texts = [None] * len(self.segments)
+        self.keys = [None] * len(self.segments)
+        # 尚未识别的段，按顺序执行
+        self.pending = list(range(len(self.segments)))
+        self.remaining_seconds = len(audio) / sr
+        self.cached_seconds = 0.0
+        self.submitted = time.time()
+        self.finished = None
+        self.error = None
+        self.done = threading.Event()
+
+    def use_cached(self, index, text):
+        """第 index 段直接使用缓存的识别文本"""
+        start, end = self.segments[index]
+        self.texts[index] = text
+        self.pending.remove(index)
+        self.remaining_seconds = max(0.0, self.remaining_seconds - (end - start) / self.sr)
+        self.cached_seconds += (end - start) / self.sr
+
+    def result(self):
+        """
+        等待任务完成并返回拼接后的识别文本
+        """
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return ''.join(self.texts)
+
+class JobScheduler:
+    """
+    后台线程按 FairShareQueue 的顺序逐段执行识别任务
+
+    参数:
+        registry: ModelRegistry，按任务指定的模型取得 pipeline
+        queue: 调度策略，默认 FairShareQueue
+        cache: 可选，ChunkCache，分段识别结果按指纹复用
+    """
+
+    def __init__(self, registry, queue=None, cache=None):
+        self.registry = registry
+        self.queue = queue if queue is not None else FairShareQueue()
+        self.cache = cache
+        self._seq = itertools.count()
+        self._condition = threading.Condition()
+        self._worker = threading.Thread(target=self._run, daemon=True)
+        self._worker.start()
+
+    def submit(self, audio, user="anonymous", priority="normal", on_segment=None, model=None,
+               batch_size=None, tracker=None, profiler=None, options=None, dtype=None, cache_scope=None,
+               decode_stats=None, timer=None):
+        """
+        提交一段音频
+
+        参数:
+            on_segment: 可选，每段完成后调用 on_segment(job, index, text)
+            model: 使用的模型名称，默认模型为 None
+            batch_size: 可选，覆盖 pipeline 的批大小
+            tracker: 可选，MemoryTracker，该任务各段的内存计入其中
+            profiler: 可选，JobProfiler，记录该任务各段推理的 PyTorch 跟踪
+            options: 可选，pipeline 调用参数（见 presets.pipeline_options）
+            dtype: 可选，模型加载精度
+            cache_scope: 计算分段指纹时附带的配置，默认为模型名称
+            decode_stats: 可选，DecodeStats，该任务各段循环检测的统计计入其中
+            timer: 可选，InferenceTime，该任务各段的推理耗时计入其中（不含排队和缓存命中的段）
+        返回:
+            ScheduledJob: 调用 result() 等待识别结果
+        """
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"未知的优先级: {priority}")
+        with self._condition:
+            seq = next(self._seq)
+        job = ScheduledJob(audio, user, priority, seq, on_segment=on_segment,
+                           model=model, batch_size=batch_size, tracker=tracker, profiler=profiler,
+                           options=options, dtype=dtype, decode_stats=decode_stats, timer=timer)
+        if self.cache is not None:
+            # 在提交线程里计算指纹，不占用识别线程；不同模型的结果互不复用
+            scope = cache_scope or model or DEFAULT_MODEL
+            for index, (start, end) in enumerate(job.segments):
+                job.keys[index] = chunk_fingerprint(audio[start:end], scope)
+                text = self.cache.get(job.keys[index])
+                if text is not None:
+                    job.use_cached(index, text)
+                    self._notify_segment(job, index, text)
+        if not job.pending:
+            job.finished = time.time()
+            job.done.set()
+            return job
+        with self._condition:
+            self.queue.push(job)
+            self._condition.notify()
+        return job
+
+    def transcribe(self, audio, user="anonymous", priority="normal", on_segment=None, model=None, **kwargs):
+        """提交并等待结果，其余参数同 submit"""
+        return self.submit(audio, user, priority, on_segment, model, **kwargs).result()
+
+    def _notify_segment(self, job, index, text):
+        if job.on_segment is not None:
+            try:
+                job.on_segment(job, index, text)
+            except Exception as e:
+                logging.warning(f"分段回调出错: {str(e)}")
+
+    def queue_length(self):
+        with self._condition:
+            return len(self.queue)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: len(self.queue) > 0)
+                job = self.queue.pop()
+            index = job.pending[0]
+            start, end = job.segments[index]
+
+            try:
+                with self.registry.acquire(job.model, job.dtype) as pipe:
+                    text = transcribe_segment(pipe, job.audio[start:end], job.batch_size, job.tracker,
+                                              job.profiler, job.options, job.decode_stats, job.timer)
+            except Exception as e:
+                logging.error(f"调度任务 {job.seq} 第 {index + 1} 段识别失败: {str(e)}")
+                with self._condition:
+                    self.queue.remove(job)
+                job.error = e
+                job.finished = time.time()
+                job.done.set()
+                continue
+
+            if job.keys[index] is not None:
+                self.cache.put(job.keys[index], text, (end - start) / job.sr)
+
+            with self._condition:
+                job.texts[index] = text
+                job.pending.pop(0)
+                self.queue.account(job, (end - start) / job.sr)
+                finished = not job.pending
+                if finished:
+                    self.queue.remove(job)
+
+            self._notify_segment(job, index, text)
+            if finished:
+                job.finished = time.time()
+                job.done.set()
@@ -0,0 +1,60 @@
+"""
+模拟识别模型（压力测试用）
+
+在没有 GPU、不下载模型的机器上测量排队和服务本身的开销。识别结果只取决于音频长度，
+耗时 = 固定延迟 + 音频时长 x 实时率，用 sleep 模拟，结果和耗时都是确定的。
+
+启动服务时设置 WHISPER_STUB_MODEL=1 即可使用，延迟通过环境变量配置:
+    WHISPER_STUB_RTF            每秒音频的识别耗时（秒），默认 0.05
+    WHISPER_STUB_LATENCY        每次调用的固定延迟（秒），默认 0.2
+    WHISPER_STUB_LOAD_SECONDS   模型加载耗时（秒），默认 0
+"""
+
+import os
+import time
+
+STUB_RTF = float(os.environ.get('WHISPER_STUB_RTF', 0.05))
+STUB_LATENCY = float(os.environ.get('WHISPER_STUB_LATENCY', 0.2))
+STUB_LOAD_SECONDS = float(os.environ.get('WHISPER_STUB_LOAD_SECONDS', 0))
+
+class StubPipeline:
+    """
+    与 transformers 语音识别 pipeline 调用方式相同的模拟模型
+
+    参数:
+        model_id: 模型名称，只用于生成结果文本
+        rtf: 每秒音频的识别耗时
+        latency: 每次调用的固定延迟
+        sr: 输入音频采样率
+    """
+
+    def __init__(self, model_id="stub", rtf=STUB_RTF, latency=STUB_LATENCY, sr=16000):
+        self.model_id = model_id
+        self.rtf = rtf
+        self.latency = latency
+        self.sr = sr
+        self.calls = 0
+
+    def __call__(self, audio, return_timestamps=False, **kwargs):
+        # 传入列表时按一次批量调用计算：固定延迟只计一次
+        items = audio if isinstance(audio, list) else [audio]
+        durations = [len(item) / self.sr for item in items]
+        time.sleep(self.latency + sum(durations) * self.rtf)
+        self.calls += 1
+        results = []
+        for duration in durations:
+            text = f"[{self.model_id} {duration:.2f}s]"
+            result = {"text": text}
+            if return_timestamps:
+                result["chunks"] = [{"timestamp": (0.0, duration), "text": text}]
+            results.append(result)
+        return results if isinstance(audio, list) else results[0]
+
+def load_stub_pipeline(model_id, status_callback=None, dtype=None):
+    """
+    与 whisper_transcriber.build_pipeline 签名相同的加载函数
+    """
+    if status_callback:
+        status_callback(f"正在加载模拟模型 {model_id}...")
+    time.sleep(STUB_LOAD_SECONDS)
+    return StubPipeline(model_id)
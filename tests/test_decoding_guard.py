@@ -0,0 +1,67 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from decoding_guard import MAX_NEW_TOKENS, LoopStoppingCriteria, repeating_tail, speech_seconds, token_budget
+
+def whisper_features(frame_levels, frames=3000, seed=0):
+    """按 WhisperFeatureExtractor 的方式构造对数梅尔频谱：截断到最大值以下 8，再 (x + 4) / 4"""
+    rng = np.random.default_rng(seed)
+    log_spec = np.full((80, frames), -12.0)
+    for start, end, level in frame_levels:
+        log_spec[:, start:end] = level + rng.normal(0, 0.3, size=(80, end - start))
+    log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+def test_continuous_speech_gets_full_budget():
+    # 30 秒连续说话没有停顿，响度在 20 dB 范围内起伏
+    levels = [(i, i + 100, -2.0 - (i // 100 % 3) * 0.7) for i in range(0, 3000, 100)]
+    features = whisper_features(levels)
+
+    assert speech_seconds(features, 3000) >= 29.0
+    assert token_budget(speech_seconds(features, 3000)) == MAX_NEW_TOKENS
+
+def test_padding_is_not_speech():
+    features = whisper_features([(0, 500, -2.0)])
+
+    assert speech_seconds(features, 3000) == pytest.approx(5.0, abs=0.1)
+    assert speech_seconds(features, 500) == pytest.approx(5.0, abs=0.1)
+
+def test_repeating_tail():
+    assert repeating_tail([1, 2, 3] + [7, 8] * 8) == 2
+    assert repeating_tail(list(range(40))) is None
+
+def generate_steps(criteria, prompt, rows, steps, loop_row=None):
+    """模拟 generate 逐步调用停止条件，loop_row 那一行一直重复同一个 token"""
+    ids = np.full((rows, prompt), 50258)
+    for step in range(steps):
+        column = np.arange(rows) + 100 + step
+        if loop_row is not None:
+            column[loop_row] = 7
+        ids = np.concatenate([ids, column[:, None]], axis=1)
+        done = criteria.stopped_rows(ids)
+        if all(done):
+            break
+    return done
+
+def test_fallback_rerun_restarts_counting():
+    criteria = LoopStoppingCriteria([40, 200, 200])
+    # 第一次生成：3 个分块，第一块达到长度上限
+    generate_steps(criteria, prompt=4, rows=3, steps=60)
+    # 温度回退只重新生成 1 个分块，提示变长（带上前文）
+    done = generate_steps(criteria, prompt=10, rows=1, steps=50)
+
+    assert len(criteria.runs) == 2
+    assert criteria.runs[1]["steps"] == 50
+    # 重新生成的行使用最大的上限，不会被第一块的 40 截断
+    assert done == [False]
+    assert criteria.stops == [("budget", 40)]
+
+def test_budget_stops_are_not_savings():
+    criteria = LoopStoppingCriteria([40, 200])
+    generate_steps(criteria, prompt=4, rows=2, steps=40, loop_row=1)
+
+    assert ("budget", 40) in criteria.stops
+    assert ("repetition", 16) in criteria.stops
+    assert criteria.tokens_saved() == MAX_NEW_TOKENS - 16
+    assert criteria.budget_tokens() == MAX_NEW_TOKENS - 40
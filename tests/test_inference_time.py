@@ -0,0 +1,42 @@
+import contextlib
+import time
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from chunk_cache import ChunkCache
+from scheduler import JobScheduler
+from stub_model import StubPipeline
+from whisper_transcriber import InferenceTime
+
+class StubRegistry:
+    def __init__(self, pipe):
+        self.pipe = pipe
+
+    @contextlib.contextmanager
+    def acquire(self, name=None, dtype=None):
+        yield self.pipe
+
+def test_timer_counts_only_inferred_audio(tmp_path):
+    scheduler = JobScheduler(StubRegistry(StubPipeline(rtf=0.01, latency=0.01)), cache=ChunkCache(tmp_path))
+    audio = np.random.default_rng(0).normal(0, 0.1, 16000 * 20).astype(np.float32)
+
+    first = InferenceTime()
+    scheduler.submit(audio, timer=first).result()
+    assert first.audio_seconds == pytest.approx(20.0)
+    assert 0 < first.seconds < 5
+
+    # 第二次全部命中缓存，没有推理时间可以计入实时率
+    second = InferenceTime()
+    job = scheduler.submit(audio, timer=second)
+    job.result()
+    assert job.cached_seconds == pytest.approx(20.0)
+    assert second.audio_seconds == 0 and second.seconds == 0
+
+def test_timer_excludes_time_before_measure():
+    timer = InferenceTime()
+    time.sleep(0.05)
+    with timer.measure(2.0):
+        pass
+    assert timer.seconds < 0.05 and timer.audio_seconds == 2.0
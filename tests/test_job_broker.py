@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from job_broker import FileQueueBroker, RedisBroker, SQLiteBroker
+
+@pytest.fixture(params=["sqlite", "file", "redis"])
+def broker(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteBroker(str(tmp_path / "jobs.db"))
+    if request.param == "file":
+        return FileQueueBroker(str(tmp_path / "queue"))
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisBroker(fakeredis.FakeRedis())
+
+def test_claim_heartbeat_complete(broker):
+    low = broker.submit({"audio_path": "a.wav", "priority": "batch"})
+    high = broker.submit({"audio_path": "b.wav", "priority": "interactive"})
+
+    job = broker.claim("worker-1")
+    assert job["job_id"] == high and job["status"] == "running" and job["attempts"] == 1
+    assert broker.heartbeat(high, "worker-1")
+    assert not broker.heartbeat(high, "worker-2")
+    assert broker.complete(high, "worker-1", {"text": "你好"})
+    assert broker.get(high)["result"] == {"text": "你好"}
+    assert broker.claim("worker-1")["job_id"] == low
+    assert broker.claim("worker-1") is None
+
+def test_stale_job_is_requeued(broker):
+    job_id = broker.submit({"audio_path": "a.wav"})
+    broker.claim("worker-1")
+
+    assert broker.requeue_stale(timeout=60) == 0
+    time.sleep(0.05)
+    assert broker.requeue_stale(timeout=0.01) == 1
+    assert not broker.heartbeat(job_id, "worker-1")
+    job = broker.claim("worker-2")
+    assert job["job_id"] == job_id and job["attempts"] == 2
+
+def test_concurrent_claims_and_requeue_run_each_job_once(broker):
+    job_ids = {broker.submit({"audio_path": f"{i}.wav"}) for i in range(30)}
+    claimed = []
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def worker(name):
+        while True:
+            job = broker.claim(name)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["job_id"])
+
+    def reaper():
+        while not stop.is_set():
+            broker.requeue_stale(timeout=60)
+
+    threads = [threading.Thread(target=worker, args=(f"worker-{i}",)) for i in range(4)]
+    reaper_thread = threading.Thread(target=reaper)
+    reaper_thread.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    reaper_thread.join()
+
+    assert sorted(claimed) == sorted(job_ids)
+
+class InterleavedBroker(FileQueueBroker):
+    """在 claim 读取任务文件时插入另一个 worker 的 requeue_stale"""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.requeued = None
+
+    def _read(self, path):
+        if self.requeued is None:
+            self.requeued = self.requeue_stale()
+        return super()._read(path)
+
+def job_files(root):
+    return {state: os.listdir(os.path.join(root, state)) for state in FileQueueBroker.STATES}
+
+@pytest.mark.parametrize("queued_seconds", [0, 600])
+def test_requeue_during_claim_does_not_duplicate(tmp_path, queued_seconds):
+    broker = InterleavedBroker(str(tmp_path))
+    job_id = broker.submit({"audio_path": "a.wav"})
+    # 在队列中等待了很久的任务，文件修改时间早于心跳超时
+    name = os.listdir(tmp_path / "queued")[0]
+    old = time.time() - queued_seconds
+    os.utime(tmp_path / "queued" / name, (old, old))
+
+    job = broker.claim("worker-1")
+
+    assert job["job_id"] == job_id and job["heartbeat"] is not None
+    assert broker.requeued == 0
+    files = job_files(str(tmp_path))
+    assert files["queued"] == [] and len(files["running"]) == 1
+    assert broker.claim("worker-2") is None
+    assert broker.get(job_id)["worker_id"] == "worker-1"
+
+def test_abandoned_claim_is_requeued(tmp_path):
+    broker = FileQueueBroker(str(tmp_path))
+    job_id = broker.submit({"audio_path": "a.wav"})
+    name = os.listdir(tmp_path / "queued")[0]
+    claimed = int((time.time() - 600) * 1000)
+    os.rename(tmp_path / "queued" / name, tmp_path / "running" / f"{name}.{claimed}.deadbeef.claim")
+
+    assert broker.requeue_stale(timeout=60) == 1
+    assert broker.claim("worker-2")["job_id"] == job_id
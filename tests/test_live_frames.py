@@ -0,0 +1,21 @@
+import struct
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from live_transcriber import PcmFrameDecoder, decode_pcm_frame
+
+def test_misaligned_f32_frames_keep_remainder():
+    data = struct.pack('<4f', 0.5, -0.25, 0.125, 1.0)
+    decoder = PcmFrameDecoder("f32le")
+
+    samples = [decoder.decode(data[:6]), decoder.decode(data[6:11]), decoder.decode(data[11:])]
+
+    assert np.concatenate(samples).tolist() == [0.5, -0.25, 0.125, 1.0]
+
+def test_unknown_format_rejected():
+    with pytest.raises(ValueError):
+        PcmFrameDecoder("mp3")
+    with pytest.raises(ValueError):
+        decode_pcm_frame(b'\x00\x00', "u8")
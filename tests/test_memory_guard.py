@@ -0,0 +1,35 @@
+import sys
+import types
+
+from memory_guard import MB, MemoryTracker
+
+class FakeCuda:
+    """只模拟 memory_allocated；没有 reset_peak_memory_stats，调用它会直接报错"""
+
+    def __init__(self):
+        self.allocated = 0
+
+    def is_available(self):
+        return True
+
+    def memory_allocated(self):
+        return self.allocated
+
+def test_nested_stages_keep_their_own_cuda_growth(monkeypatch):
+    cuda = FakeCuda()
+    monkeypatch.setitem(sys.modules, "torch", types.SimpleNamespace(cuda=cuda))
+    tracker = MemoryTracker()
+
+    cuda.allocated = 100 * MB
+    with tracker.stage("generate"):
+        cuda.allocated = 300 * MB
+        tracker._sample()
+        with tracker.stage("features"):
+            cuda.allocated = 350 * MB
+            tracker._sample()
+        cuda.allocated = 120 * MB
+    stages = tracker.report()["stages"]
+
+    assert stages["features"]["cuda_growth_mb"] == 50.0
+    # 外层阶段包含内层的占用，不因内层阶段进入而丢失
+    assert stages["generate"]["cuda_growth_mb"] == 250.0
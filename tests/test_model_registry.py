@@ -0,0 +1,73 @@
+import threading
+
+import pytest
+
+from model_registry import ModelRegistry
+
+def local_model(tmp_path, name, megabytes=3):
+    """本地模型目录，权重文件只占逻辑大小（估算约 megabytes x 1.3 MB）"""
+    directory = tmp_path / name
+    directory.mkdir()
+    with open(directory / "model.safetensors", "wb") as f:
+        f.truncate(megabytes * 1024 * 1024)
+    return str(directory)
+
+class GatedLoader:
+    """gated 模型的加载一直阻塞到 release()，fail=True 时随后抛出异常"""
+
+    def __init__(self, gated, fail=False):
+        self.gated = gated
+        self.fail = fail
+        self.started = threading.Event()
+        self.gate = threading.Event()
+
+    def __call__(self, model_id, status_callback=None, dtype=None):
+        if model_id == self.gated:
+            self.started.set()
+            self.gate.wait(5)
+            if self.fail:
+                raise RuntimeError("加载失败")
+        return object()
+
+def load_in_background(registry, name):
+    errors = []
+
+    def run():
+        try:
+            registry.get(name)
+        except RuntimeError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, errors
+
+@pytest.mark.parametrize("fail", [False, True])
+def test_loading_model_is_counted_in_budget(tmp_path, fail):
+    a, b, c = (local_model(tmp_path, n) for n in "abc")
+    loader = GatedLoader(b, fail=fail)
+    # 预算只能容纳两个模型
+    registry = ModelRegistry(budget_mb=10, loader=loader)
+    registry.get(a)
+    thread, errors = load_in_background(registry, b)
+    assert loader.started.wait(5)
+    if fail:
+        loader.gate.set()
+        thread.join()
+        assert errors and registry.load_status(b)["state"] == "failed"
+
+    registry.get(c)
+    # b 正在加载时已预留预算，加载 c 需要卸载空闲的 a；b 加载失败后预留被释放，a 保留
+    assert registry.is_loaded(a) == fail
+    assert registry.is_loaded(c)
+    loader.gate.set()
+    thread.join()
+
+def test_status_uses_same_key_as_acquire(tmp_path):
+    a = local_model(tmp_path, "a")
+    registry = ModelRegistry(budget_mb=10, loader=GatedLoader(None))
+    with registry.acquire(a, "float32"):
+        pass
+
+    assert registry.is_loaded(a, "float32")
+    assert registry.load_status(a, "float32")["state"] == "ready"
@@ -0,0 +1,39 @@
+import struct
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("soundfile")
+
+import whisper_transcriber
+
+def write_pcm24_wav(path, seconds=2.5, sample_rate=16000, channels=1):
+    frames = int(seconds * sample_rate)
+    data = b'\x00\x10\x00' * frames * channels
+    block_align = channels * 3
+    header = b'RIFF' + struct.pack('<I', 36 + len(data)) + b'WAVE'
+    header += b'fmt ' + struct.pack('<IHHIIHH', 16, 1, channels, sample_rate,
+                                    sample_rate * block_align, block_align, 24)
+    header += b'data' + struct.pack('<I', len(data))
+    path.write_bytes(header + data)
+
+def test_probe_24bit_wav_without_ffprobe(tmp_path, monkeypatch):
+    path = tmp_path / "pcm24.wav"
+    write_pcm24_wav(path, channels=2)
+    # 24 位 WAV 不能内存映射，也不应该需要 ffprobe
+    assert whisper_transcriber.read_wav_info(str(path)) is None
+    monkeypatch.setattr(whisper_transcriber, "get_ffprobe_binary", lambda: None)
+
+    info = whisper_transcriber.probe_audio(str(path))
+
+    assert info['duration'] == pytest.approx(2.5)
+    assert info['channels'] == 2
+    assert info['sample_rate'] == 16000
+
+def test_probe_unknown_format_without_ffprobe(tmp_path, monkeypatch):
+    path = tmp_path / "audio.mp3"
+    path.write_bytes(b'\xff\xfb' + b'\x00' * 64)
+    monkeypatch.setattr(whisper_transcriber, "get_ffprobe_binary", lambda: None)
+
+    with pytest.raises(ValueError):
+        whisper_transcriber.probe_audio(str(path))
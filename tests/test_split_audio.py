@@ -0,0 +1,42 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from chunk_cache import chunk_fingerprint
+from whisper_transcriber import FIRST_SEGMENT_SECONDS, split_audio
+
+SR = 16000
+
+def speech_with_pauses(seconds, seed=0):
+    """说话片段（5~40 秒）之间夹着 0.3~1.5 秒的低噪声停顿"""
+    rng = np.random.default_rng(seed)
+    parts = []
+    total = 0
+    while total < seconds * SR:
+        parts.append(rng.normal(0, 0.1, int(rng.uniform(5, 40) * SR)))
+        parts.append(rng.normal(0, rng.uniform(1e-3, 5e-3), int(rng.uniform(0.3, 1.5) * SR)))
+        total += len(parts[-2]) + len(parts[-1])
+    return np.concatenate(parts).astype(np.float32)
+
+def fingerprints(audio):
+    segments = split_audio(audio, first_segment_seconds=FIRST_SEGMENT_SECONDS, stable=True)
+    return [chunk_fingerprint(audio[start:end]) for start, end in segments]
+
+def test_head_trimmed_file_reuses_segments():
+    audio = speech_with_pauses(30 * 60)
+    original = fingerprints(audio)
+    # 从开头剪掉 37 秒多，不落在帧边界上
+    trimmed = fingerprints(audio[37 * SR + 12345:])
+
+    reused = set(original) & set(trimmed)
+    # 只有开头几分钟内的段会变化
+    assert len(reused) >= len(original) - 5
+    assert trimmed[-1] == original[-1]
+
+def test_segments_cover_audio_without_gaps():
+    audio = speech_with_pauses(20 * 60, seed=1)
+    segments = split_audio(audio, first_segment_seconds=FIRST_SEGMENT_SECONDS, stable=True)
+
+    assert segments[0][0] == 0 and segments[-1][1] == len(audio)
+    assert all(end == start for (_, end), (start, _) in zip(segments, segments[1:]))
+    assert max(end - start for start, end in segments) <= 240 * SR
@@ -0,0 +1,92 @@
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("fastapi")
+
+import api_server
+
+class FakeDecoder:
+    """已经解码完毕的流，wait() 可以模拟 ffmpeg 解码失败"""
+
+    def __init__(self, samples, error=None):
+        self.samples = samples
+        self.error = error
+        self.finished = True
+        self.num_samples = len(samples)
+
+    def feed(self, data):
+        pass
+
+    def close(self):
+        pass
+
+    def kill(self):
+        pass
+
+    def wait_for_samples(self, count, timeout=None):
+        return self.num_samples
+
+    def get_samples(self, start, end):
+        return self.samples[start:end]
+
+    def discard(self, before):
+        pass
+
+    def wait(self):
+        if self.error is not None:
+            raise Exception(self.error)
+
+def wav_bytes(path, seconds):
+    with wave.open(str(path), 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(16000)
+        f.writeframes(np.full(int(seconds * 16000), 1000, dtype='<i2').tobytes())
+    return path.read_bytes()
+
+@pytest.fixture
+def make_job(tmp_path, monkeypatch):
+    monkeypatch.setattr(api_server, "get_ffmpeg_binary", lambda: "ffmpeg")
+    monkeypatch.setattr(api_server, "process_text_with_punctuation", lambda text: text)
+    monkeypatch.setattr(api_server, "setup_directories_and_logging",
+                        lambda: (tmp_path / "job.log", tmp_path / "result.txt"))
+
+    def make(decoder, infer):
+        monkeypatch.setattr(api_server, "FfmpegPcmDecoder", lambda sr: decoder)
+        job = api_server.StreamingJob(None, "upload.wav", infer=infer)
+        job.feed(wav_bytes(tmp_path / "upload.wav", 2))
+        job.start()
+        job.finish_upload()
+        job.wait()
+        return job
+
+    return make
+
+def test_inference_error_on_last_window_fails_job(make_job):
+    calls = []
+
+    def infer(audio):
+        calls.append(len(audio))
+        raise RuntimeError("CUDA out of memory")
+
+    job = make_job(FakeDecoder(np.zeros(32000, dtype=np.float32)), infer)
+
+    assert job.status == "failed"
+    assert "CUDA out of memory" in job.error
+    # 没有改为完整文件再识别一遍
+    assert calls == [32000]
+
+def test_decode_failure_falls_back_to_spooled_file(make_job):
+    calls = []
+
+    def infer(audio):
+        calls.append(len(audio))
+        return "你好"
+
+    job = make_job(FakeDecoder(np.zeros(0, dtype=np.float32), error="moov atom not found"), infer)
+
+    assert job.status == "done"
+    assert calls == [32000]
+    assert job.audio_seconds == pytest.approx(2.0)
@@ -0,0 +1,150 @@
+"""
+命令行转录
+
+用法:
+    python transcribe_cli.py 会议录音.mp3
+    python transcribe_cli.py 会议录音.mp3 --preset accurate --profile
+    python transcribe_cli.py 会议录音.mp3 --tasks transcribe translate    # 编码一次，同时输出转录和英文翻译
+"""
+
+import sys
+import argparse
+import contextlib
+
+from chunk_cache import default_chunk_cache
+from decoding_guard import DecodeStats, collecting
+from pcm_cache import default_pcm_cache
+from memory_guard import MemoryGuard, MemoryTracker
+from multi_task import parse_task, transcribe_multi
+from model_registry import ModelRegistry, available_models
+from presets import DEFAULT_PRESET, PRESETS, cache_scope, get_preset, pipeline_options
+from profiling import JobProfiler
+from whisper_transcriber import (probe_audio, process_text_with_punctuation, read_audio_file, save_metadata,
+                                 save_transcript, setup_directories_and_logging, transcribe_audio)
+
+def transcribe_file(registry, audio_path, preset_name=None, model_name=None, profile=False, use_cache=True):
+    """
+    转录一个文件
+
+    参数:
+        preset_name: 识别预设，None 为默认预设
+        model_name: 可选，覆盖预设中的模型
+
+    返回:
+        tuple: (转录文本, 结果文件路径, 性能分析目录或 None)
+    """
+    preset = get_preset(preset_name)
+    model_name = model_name or preset["model"]
+    _, result_file_path = setup_directories_and_logging()
+    memory_plan = MemoryGuard().plan(probe_audio(audio_path), batch_size=preset["batch_size"])
+    batch_size = memory_plan["batch_size"] if memory_plan["low_memory"] else None
+    metadata = {"model": model_name, "preset": preset["name"],
+                "projected_memory_mb": memory_plan["projected_mb"]}
+    profile_dir = result_file_path.with_suffix('.profile') if profile else None
+
+    if profile_dir is not None:
+        metadata["profile_dir"] = str(profile_dir)
+
+    with registry.acquire(model_name, preset["dtype"]) as pipe, \
+            (JobProfiler(profile_dir) if profile else contextlib.nullcontext()) as profiler:
+        text = transcribe_audio(pipe, audio_path, result_file_path,
+                                low_memory=memory_plan["low_memory"], batch_size=batch_size,
+                                metadata=metadata, cache=default_chunk_cache() if use_cache else None,
+                                cache_scope=cache_scope(preset, model_name), profiler=profiler,
+                                options=pipeline_options(preset),
+                                pcm_cache=default_pcm_cache() if use_cache else None)
+    return text, result_file_path, profile_dir
+
+def transcribe_file_multi(registry, audio_path, tasks, preset_name=None, model_name=None, use_cache=True):
+    """
+    对一个文件执行多个识别任务（编码器只运行一次），每个任务保存一个结果文件
+
+    参数:
+        tasks: 任务列表（见 multi_task.parse_task）
+        use_cache: 是否使用解码缓存
+
+    返回:
+        dict: {任务名: 结果文件路径}
+    """
+    preset = get_preset(preset_name)
+    model_name = model_name or preset["model"]
+    _, result_file_path = setup_directories_and_logging()
+    decode_stats = DecodeStats()
+    with MemoryTracker() as tracker:
+        with tracker.stage("decode"):
+            audio = read_audio_file(audio_path, pcm_cache=default_pcm_cache() if use_cache else None)
+        with registry.acquire(model_name, preset["dtype"]) as pipe, collecting(decode_stats):
+            texts, stats = transcribe_multi(pipe, audio, tasks, tracker=tracker,
+                                            generate_kwargs=pipeline_options(preset)["generate_kwargs"])
+    paths = {}
+    for index, task in enumerate(tasks):
+        path = result_file_path if index == 0 else result_file_path.with_name(
+            f"{result_file_path.stem}-{task['name']}.txt")
+        save_transcript(path, audio_path, process_text_with_punctuation(texts[task["name"]]),
+                        task["language"] or 'unknown')
+        paths[task["name"]] = path
+    save_metadata(result_file_path, {
+        "audio_path": str(audio_path),
+        "audio_seconds": round(len(audio) / 16000, 2),
+        "model": model_name,
+        "preset": preset["name"],
+        "tasks": tasks,
+        "results": {name: str(path) for name, path in paths.items()},
+        "memory": tracker.report(),
+        "decoding": decode_stats.report(),
+        **stats,
+    })
+    return paths
+
+def main():
+    parser = argparse.ArgumentParser(description="命令行转录")
+    parser.add_argument("audio", nargs="+", help="音频文件")
+    parser.add_argument("--preset", default=DEFAULT_PRESET, choices=list(PRESETS),
+                        help="识别预设：fast 适合草稿，accurate 适合最终稿")
+    parser.add_argument("--model", choices=available_models(), help="覆盖预设中的模型")
+    parser.add_argument("--profile", action="store_true",
+                        help="在结果旁保存 PyTorch 跟踪、Python 采样和算子汇总")
+    parser.add_argument("--no-cache", action="store_true", help="不复用分段识别缓存和解码缓存")
+    parser.add_argument("--tasks", nargs="+", metavar="TASK",
+                        help="多任务识别，编码器只运行一次：transcribe、translate 或 任务:语言（如 transcribe:zh）")
+    parser.add_argument("--prompt", help="与 --tasks 一起使用，额外用该提示词重新识别一遍")
+    args = parser.parse_args()
+
+    tasks = None
+    if args.tasks or args.prompt:
+        try:
+            tasks = [parse_task(spec) for spec in args.tasks or ["transcribe"]]
+        except ValueError as e:
+            parser.error(str(e))
+        if args.prompt:
+            tasks.append({"name": "prompt", "task": "transcribe", "language": None, "prompt": args.prompt})
+
+    registry = ModelRegistry()
+    failed = 0
+    for audio_path in args.audio:
+        if tasks is not None:
+            try:
+                paths = transcribe_file_multi(registry, audio_path, tasks, args.preset, args.model,
+                                              use_cache=not args.no_cache)
+            except Exception as e:
+                print(f"{audio_path}: 转录失败: {str(e)}")
+                failed += 1
+                continue
+            for name, path in paths.items():
+                print(f"{audio_path}: {name} 结果已保存至 {path}")
+            continue
+        try:
+            _, result_file_path, profile_dir = transcribe_file(
+                registry, audio_path, args.preset, args.model, profile=args.profile,
+                use_cache=not args.no_cache)
+        except Exception as e:
+            print(f"{audio_path}: 转录失败: {str(e)}")
+            failed += 1
+            continue
+        print(f"{audio_path}: 结果已保存至 {result_file_path}")
+        if profile_dir is not None:
+            print(f"{audio_path}: 性能分析结果已保存至 {profile_dir}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
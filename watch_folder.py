@@ -0,0 +1,381 @@
+"""
+监视文件夹自动转录
+
+录音设备把文件写入共享目录后，不必再逐个通过网页上传：本程序监视一个或多个目录，
+新文件写完后自动转录。
+
+    发现新文件   安装了 watchdog 时使用系统文件事件（Linux 上为 inotify），否则定期扫描；
+                 网络共享上其他机器写入的文件不一定产生事件，可以用 --poll 强制扫描
+    等待写完     文件大小和修改时间连续 --debounce 秒不变才视为写完
+    成批识别     同时到达的短文件（不超过一个切分段）合并成一次 pipeline 调用，
+                 长文件按段识别；两者都复用分段识别缓存
+    保存结果     --output next 写到源文件旁的 <文件名>.transcript.txt，
+                 --output result 写到程序目录下的 result 目录
+    记录进度     已处理的文件记录在状态文件中（默认 log/watch_state.json），
+                 重启后不会重新转录；文件内容修改后（大小或修改时间变化）会重新转录
+
+用法:
+    python watch_folder.py //nas/recordings --recursive
+    python watch_folder.py 录音 --preset fast --output result --poll
+"""
+
+import os
+import json
+import time
+import pathlib
+import logging
+import argparse
+import tempfile
+import threading
+from datetime import datetime
+
+from chunk_cache import chunk_fingerprint, default_chunk_cache
+from decoding_guard import DecodeStats
+from model_registry import ModelRegistry
+from pcm_cache import default_pcm_cache
+from presets import DEFAULT_PRESET, PRESETS, cache_scope, get_preset, pipeline_options
+from whisper_transcriber import (SEGMENT_SECONDS, VIDEO_EXTENSIONS, process_text_with_punctuation,
+                                 read_audio_file, save_metadata, save_transcript,
+                                 setup_directories_and_logging, transcribe_batch, transcribe_segments)
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+AUDIO_EXTENSIONS = {'.mp3', '.wav', '.m4a', '.flac', '.ogg', '.opus', '.aac', '.wma'} | VIDEO_EXTENSIONS
+TRANSCRIPT_SUFFIX = '.transcript.txt'
+DEFAULT_STATE_FILE = pathlib.Path(__file__).parent / "log" / "watch_state.json"
+
+class WatchState:
+    """
+    已处理文件的记录，按绝对路径保存大小、修改时间和结果，每处理完一个文件即写入磁盘
+
+    参数:
+        path: 状态文件路径
+    """
+
+    def __init__(self, path=DEFAULT_STATE_FILE):
+        self.path = pathlib.Path(path)
+        self.files = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logging.warning(f"状态文件 {self.path} 无法读取，将重新开始记录: {str(e)}")
+
+    def is_handled(self, path, stat):
+        """文件已经处理过（成功或失败）且之后没有修改"""
+        entry = self.files.get(str(path))
+        return (entry is not None and entry["size"] == stat.st_size
+                and entry["mtime"] == stat.st_mtime)
+
+    def record(self, path, stat, status, result=None, error=None):
+        self.files[str(path)] = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "status": status,
+            "result": result,
+            "error": error,
+            "time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        self.save()
+
+    def save(self):
+        # 先写临时文件再替换，中途退出也不会留下损坏的状态文件
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({"files": self.files}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+class _EventHandler(FileSystemEventHandler):
+    """把文件事件转成待检查的候选文件"""
+
+    def __init__(self, watcher):
+        self.watcher = watcher
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.src_path)
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            self.watcher.notice(event.dest_path)
+
+class FolderWatcher:
+    """
+    监视目录并成批转录新文件
+
+    参数:
+        directories: 监视的目录列表
+        registry: ModelRegistry
+        state: WatchState
+        preset_name: 识别预设
+        output: "next" 写到源文件旁，"result" 写到 result 目录
+        debounce: 文件大小和修改时间保持不变多少秒后视为写完
+        batch_size: 每批最多处理的文件数
+        batch_window: 第一个文件就绪后再等待多少秒收集同一批文件
+        poll_interval: 扫描间隔（秒）
+        use_events: 是否使用系统文件事件（需要 watchdog）
+        recursive: 是否包含子目录
+        cache: 可选，ChunkCache
+        pcm_cache: 可选，PcmCache
+    """
+
+    def __init__(self, directories, registry, state, preset_name=None, output="next", debounce=5.0,
+                 batch_size=8, batch_window=2.0, poll_interval=10.0, use_events=True, recursive=False,
+                 cache=None, pcm_cache=None):
+        self.directories = [pathlib.Path(d).resolve() for d in directories]
+        self.registry = registry
+        self.state = state
+        self.preset = get_preset(preset_name)
+        self.options = pipeline_options(self.preset)
+        self.scope = cache_scope(self.preset)
+        self.output = output
+        self.debounce = debounce
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.poll_interval = poll_interval
+        self.use_events = use_events and Observer is not None
+        self.recursive = recursive
+        self.cache = cache
+        self.pcm_cache = pcm_cache
+        self.result_dir = pathlib.Path(__file__).parent / "result"
+        # 候选文件: 路径 -> (大小, 修改时间, 开始保持不变的时刻)
+        self.candidates = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.last_scan = 0.0
+
+    def is_target(self, path):
+        path = pathlib.Path(path)
+        return (path.suffix.lower() in AUDIO_EXTENSIONS and not path.name.startswith('.')
+                and not path.name.endswith(TRANSCRIPT_SUFFIX))
+
+    def notice(self, path):
+        """记录一个可能需要处理的文件（文件事件或扫描时调用）"""
+        if not self.is_target(path):
+            return
+        with self.lock:
+            self.candidates.setdefault(str(pathlib.Path(path).resolve()), None)
+        self.wakeup.set()
+
+    def scan(self):
+        """扫描所有目录，把未处理或已修改的文件加入候选"""
+        self.last_scan = time.monotonic()
+        for directory in self.directories:
+            pattern = '**/*' if self.recursive else '*'
+            for path in directory.glob(pattern):
+                if path.is_file() and self.is_target(path):
+                    self.notice(path)
+
+    def ready_files(self, now):
+        """
+        检查候选文件，返回已经写完且需要处理的文件
+
+        返回:
+            list: [(路径, os.stat_result)]
+        """
+        ready = []
+        with self.lock:
+            for path, seen in list(self.candidates.items()):
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    del self.candidates[path]
+                    continue
+                if self.state.is_handled(path, stat):
+                    del self.candidates[path]
+                    continue
+                signature = (stat.st_size, stat.st_mtime)
+                if seen is None or seen[:2] != signature:
+                    self.candidates[path] = (*signature, now)
+                elif stat.st_size > 0 and now - seen[2] >= self.debounce:
+                    ready.append((path, stat))
+        return ready
+
+    def transcript_path(self, audio_path):
+        audio_path = pathlib.Path(audio_path)
+        if self.output == "next":
+            return audio_path.with_name(audio_path.stem + TRANSCRIPT_SUFFIX)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        return self.result_dir / f"{timestamp}-{audio_path.stem}-result.txt"
+
+    def process_batch(self, batch):
+        """
+        转录一批文件：短文件合并成一次调用，长文件按段识别，每个文件完成后立即保存结果和状态；
+        合并调用失败时短文件改为逐个识别
+        """
+        max_short = SEGMENT_SECONDS * 16000
+        loaded = []
+        for path, stat in batch:
+            try:
+                loaded.append((path, stat, read_audio_file(path, pcm_cache=self.pcm_cache)))
+            except Exception as e:
+                logging.error(f"{path}: 读取失败: {str(e)}")
+                self.state.record(path, stat, "failed", error=str(e))
+
+        with self.registry.acquire(self.preset["model"], self.preset["dtype"]) as pipe:
+            short = [(path, stat, audio) for path, stat, audio in loaded if len(audio) <= max_short]
+            texts = {}
+            misses = []
+            # 合并识别的短文件共用一份解码统计
+            batch_stats = DecodeStats()
+            for path, _, audio in short:
+                key = chunk_fingerprint(audio, self.scope) if self.cache is not None else None
+                text = self.cache.get(key) if key is not None else None
+                if text is None:
+                    misses.append((path, audio, key))
+                else:
+                    texts[path] = text
+            if misses:
+                start = time.perf_counter()
+                try:
+                    results = transcribe_batch(pipe, [audio for _, audio, _ in misses], self.options,
+                                               decode_stats=batch_stats)
+                except Exception as e:
+                    # 整批失败（显存不足、个别文件出错等）不代表每个文件都有问题：
+                    # 这些文件不记入 texts，下面逐个识别，只记录真正失败的文件
+                    logging.error(f"批量识别失败，改为逐个识别: {str(e)}")
+                    results = []
+                else:
+                    logging.info(f"批量识别 {len(misses)} 个短文件，用时 {time.perf_counter() - start:.1f} 秒")
+                for (path, audio, key), text in zip(misses, results):
+                    texts[path] = text
+                    if key is not None:
+                        self.cache.put(key, text, len(audio) / 16000)
+
+            for path, stat, audio in loaded:
+                start = time.perf_counter()
+                stats = {"batched": path in texts}
+                try:
+                    if path in texts:
+                        text = texts[path]
+                        stats["decoding_batch"] = batch_stats.report()
+                    else:
+                        decode_stats = DecodeStats()
+                        text, segment_stats = transcribe_segments(pipe, audio, cache=self.cache,
+                                                                  scope=self.scope, options=self.options,
+                                                                  decode_stats=decode_stats)
+                        stats.update(segment_stats, decoding=decode_stats.report())
+                    self.save_result(path, stat, audio, text, stats, time.perf_counter() - start)
+                except Exception as e:
+                    logging.error(f"{path}: 转录失败: {str(e)}")
+                    self.state.record(path, stat, "failed", error=str(e))
+
+    def save_result(self, path, stat, audio, text, stats, elapsed):
+        processed_text = process_text_with_punctuation(text)
+        result_file_path = self.transcript_path(path)
+        save_transcript(result_file_path, path, processed_text)
+        if self.output == "result":
+            save_metadata(result_file_path, {
+                "audio_path": path,
+                "audio_seconds": round(len(audio) / 16000, 2),
+                "model": self.preset["model"],
+                "preset": self.preset["name"],
+                "seconds": round(elapsed, 2),
+                **stats,
+            })
+        self.state.record(path, stat, "done", result=str(result_file_path))
+        logging.info(f"{path}: 结果已保存至 {result_file_path}")
+
+    def next_batch(self):
+        """等待至少一个文件就绪，再在 batch_window 内收集同一批的其他文件"""
+        deadline = None
+        while True:
+            now = time.monotonic()
+            # 文件事件可能遗漏（网络共享、监视启动前的文件），事件模式下也定期扫描
+            if now - self.last_scan >= self.poll_interval:
+                self.scan()
+            ready = self.ready_files(now)
+            if ready and (len(ready) >= self.batch_size
+                          or (deadline is not None and now >= deadline)):
+                return ready[:self.batch_size]
+            if ready and deadline is None:
+                deadline = now + self.batch_window
+            with self.lock:
+                pending = bool(self.candidates)
+            # 有候选文件时按防抖间隔检查；没有时等待文件事件或下一次扫描
+            timeout = min(1.0, self.debounce) if pending else self.poll_interval
+            timeout = min(timeout, max(0.0, self.last_scan + self.poll_interval - now))
+            if self.wakeup.wait(timeout):
+                self.wakeup.clear()
+
+    def run(self):
+        observer = None
+        if self.use_events:
+            observer = Observer()
+            handler = _EventHandler(self)
+            for directory in self.directories:
+                observer.schedule(handler, str(directory), recursive=self.recursive)
+            observer.start()
+        elif Observer is None:
+            logging.warning(f"未安装 watchdog，改为每 {self.poll_interval:g} 秒扫描一次，新文件最多延迟这么久才会处理"
+                            "（pip install watchdog 后使用文件事件）")
+        mode = "文件事件" if observer is not None else f"每 {self.poll_interval:g} 秒扫描"
+        logging.info(f"开始监视 {', '.join(map(str, self.directories))}（{mode}，预设 {self.preset['name']}）")
+        # 启动时完整扫描一次，补上程序未运行期间到达的文件
+        self.scan()
+        try:
+            while True:
+                batch = self.next_batch()
+                logging.info(f"开始处理 {len(batch)} 个文件")
+                try:
+                    self.process_batch(batch)
+                except Exception as e:
+                    # 模型加载失败等与文件无关的错误：不记入状态，稍后重试
+                    logging.error(f"处理失败，{self.poll_interval:g} 秒后重试: {str(e)}")
+                    time.sleep(self.poll_interval)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="监视文件夹，自动转录新文件")
+    parser.add_argument("directories", nargs="+", help="监视的目录")
+    parser.add_argument("--preset", default=DEFAULT_PRESET, choices=list(PRESETS), help="识别预设")
+    parser.add_argument("--output", choices=["next", "result"], default="next",
+                        help="next: 写到源文件旁；result: 写到 result 目录")
+    parser.add_argument("--state", default=str(DEFAULT_STATE_FILE), help="状态文件")
+    parser.add_argument("--debounce", type=float, default=5.0, help="文件保持不变多少秒后视为写完")
+    parser.add_argument("--batch-size", type=int, default=8, help="每批最多处理的文件数")
+    parser.add_argument("--batch-window", type=float, default=2.0, help="收集同一批文件的等待时间（秒）")
+    parser.add_argument("--poll", action="store_true", help="不使用文件事件，定期扫描（适合网络共享）")
+    parser.add_argument("--poll-interval", type=float, default=10.0, help="扫描间隔（秒）")
+    parser.add_argument("--recursive", action="store_true", help="包含子目录")
+    parser.add_argument("--no-cache", action="store_true", help="不复用分段识别缓存和解码缓存")
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            parser.error(f"目录不存在: {directory}")
+    setup_directories_and_logging()
+
+    watcher = FolderWatcher(args.directories, ModelRegistry(), WatchState(args.state),
+                            preset_name=args.preset, output=args.output, debounce=args.debounce,
+                            batch_size=args.batch_size, batch_window=args.batch_window,
+                            poll_interval=args.poll_interval, use_events=not args.poll,
+                            recursive=args.recursive,
+                            cache=None if args.no_cache else default_chunk_cache(),
+                            pcm_cache=None if args.no_cache else default_pcm_cache())
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logging.info("已停止监视")
+
+if __name__ == "__main__":
+    main()
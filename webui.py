@@ -1,32 +1,191 @@
 import os
 import sys
+import uuid
+import shutil
 import importlib.util
+import time
+import queue
+import threading
+import contextlib
+import collections
+import webbrowser
 import gradio as gr
 import logging
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 
 # 添加当前目录到Python路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(current_dir)
 
-# 动态导入模块
+# 动态导入模块（注册到 sys.modules，其他模块 import 时共用同一份）
 module_path = os.path.join(current_dir, "whisper_transcriber.py")
-spec = importlib.util.spec_from_file_location("whisper_module", module_path)
+spec = importlib.util.spec_from_file_location("whisper_transcriber", module_path)
 whisper_module = importlib.util.module_from_spec(spec)
+sys.modules["whisper_transcriber"] = whisper_module
 spec.loader.exec_module(whisper_module)
 
+from api_server import create_api_router
+from admission import AdmissionController, format_seconds
+from decoding_guard import DecodeStats
+from memory_guard import MemoryGuard, MemoryTracker
+from profiling import JobProfiler
+from scheduler import JobScheduler
+from chunk_cache import default_chunk_cache
+from pcm_cache import default_pcm_cache
+from job_broker import create_broker
+from model_registry import DEFAULT_MODEL, ModelRegistry, available_models
+from presets import DEFAULT_PRESET, cache_scope, get_preset, pipeline_options, preset_choices
+
 # 从模块中获取所需函数
-setup_whisper = whisper_module.setup_whisper
+print_welcome = whisper_module.print_welcome
 transcribe_audio = whisper_module.transcribe_audio
 setup_directories_and_logging = whisper_module.setup_directories_and_logging
+process_text_with_punctuation = whisper_module.process_text_with_punctuation
+InferenceTime = whisper_module.InferenceTime
+
+# Whisper 模型按需加载，同一模型在所有任务间共享
+registry = ModelRegistry()
+
+# 默认模型在后台线程加载，加载结束（无论成功与否）后置位
+model_ready = threading.Event()
+
+SERVER_PORT = int(os.environ.get('WHISPER_PORT', 7860))
+
+# 任务准入控制（解码前探测时长、估算耗时）
+admission = AdmissionController()
+
+# 任务内存预算（超出时改用低内存执行方式或排队等待）
+memory_guard = MemoryGuard()
+
+# 识别任务调度（按段抢占、用户公平、短任务优先；内容未变化的段复用缓存结果）
+scheduler = JobScheduler(registry, cache=default_chunk_cache())
+# 解码结果缓存（WHISPER_PCM_CACHE=1 时开启）
+pcm_cache = default_pcm_cache()
+
+# 分布式模式：设置 WHISPER_BROKER 后，网页只负责提交任务，识别由 worker.py 进程完成
+BROKER_URL = os.environ.get('WHISPER_BROKER')
+# 上传的音频复制到这个目录，所有 worker 需能以相同路径访问
+SHARED_DIR = os.environ.get('WHISPER_SHARED_DIR', os.path.join(current_dir, 'shared'))
+broker = create_broker(BROKER_URL) if BROKER_URL else None
+
+def transcribe_with_broker(audio_path, user, model_name, preset_name, status_callback):
+    """
+    把任务提交给代理并等待 worker 写回结果
+
+    返回:
+        tuple: (转录文本, 结果文件路径, worker 报告的推理耗时 dict 或 None)
+    """
+    os.makedirs(SHARED_DIR, exist_ok=True)
+    shared_path = os.path.join(SHARED_DIR, uuid.uuid4().hex + os.path.splitext(audio_path)[1])
+    shutil.copyfile(audio_path, shared_path)
+    try:
+        job_id = broker.submit({
+            "audio_path": shared_path,
+            "filename": os.path.basename(audio_path),
+            "user": user,
+            "priority": "interactive",
+            "model": model_name,
+            "preset": preset_name,
+        })
+        status_callback(f"任务已提交: {job_id}，等待 worker 处理...")
+
+        last_status = "queued"
+        while True:
+            job = broker.get(job_id)
+            if job is not None and job["status"] != last_status:
+                last_status = job["status"]
+                if last_status == "running":
+                    status_callback(f"正在进行语音识别...（worker: {job['worker_id']}）")
+                elif last_status == "queued":
+                    status_callback("worker 失联，任务已重新排队...")
+            if job is not None and job["status"] == "done":
+                return job["result"]["text"], job["result"]["result_file"], job["result"].get("inference")
+            if job is not None and job["status"] == "failed":
+                raise Exception(job["error"])
+            time.sleep(1)
+    finally:
+        try:
+            os.remove(shared_path)
+        except OSError:
+            pass
+
+def load_default_model():
+    """后台加载默认模型，界面无需等待"""
+    try:
+        print_welcome()
+        print(f"正在从国内镜像下载默认模型 {DEFAULT_MODEL}，请稍候...")
+        registry.get(DEFAULT_MODEL)
+        print("初始化完成！")
+    except Exception as e:
+        print(f"模型加载失败: {str(e)}")
+    finally:
+        model_ready.set()
+
+def model_status():
+    """默认模型的加载状态，供健康检查和界面横幅使用"""
+    if broker is not None:
+        return {"state": "ready", "model": DEFAULT_MODEL, "mode": "broker"}
+    status = registry.load_status(DEFAULT_MODEL)
+    status["model"] = DEFAULT_MODEL
+    if status["state"] == "idle" and not model_ready.is_set():
+        status["state"] = "loading"
+    return status
+
+def model_banner():
+    """界面顶部显示的模型加载进度"""
+    status = model_status()
+    if status.get("mode") == "broker":
+        return "🟢 分布式模式：识别由 worker 进程完成"
+    if status["state"] == "ready":
+        return f"🟢 模型 {DEFAULT_MODEL} 已就绪"
+    if status["state"] == "failed":
+        return f"❌ 模型 {DEFAULT_MODEL} 加载失败：{status['error']}。请检查网络连接后重启程序"
+    stage = status["stage"] or "准备中"
+    return (f"⏳ 模型 {DEFAULT_MODEL} 加载中（已用 {status['elapsed_seconds']:.0f} 秒）：{stage}　"
+            f"现在提交的任务会排队，加载完成后自动开始")
+
+# 首段文字延迟：从提交到第一段转录文字可以显示的时间，保留最近的样本供 /metrics 查看
+first_text_seconds = collections.deque(maxlen=1000)
+
+def first_text_metrics():
+    """首段文字延迟的统计（秒）"""
+    samples = sorted(first_text_seconds)
+    if not samples:
+        return {"count": 0}
+    def percentile(fraction):
+        return round(samples[min(len(samples) - 1, int(fraction * len(samples)))], 2)
+    return {"count": len(samples), "p50": percentile(0.5), "p95": percentile(0.95), "max": round(samples[-1], 2)}
+
+# 进度条各阶段的位置：识别阶段按已识别的音频时长在 INFER_START 和 INFER_END 之间推进
+INFER_START = 0.3
+INFER_END = 0.95
 
-# 初始化Whisper模型
-pipe = None  # 全局变量声明
+def process_audio(audio_path, preset_name=DEFAULT_PRESET, model_name=None, profile=False,
+                  progress=gr.Progress(), request: gr.Request = None):
+    """
+    处理音频文件，每识别完一段就把已有的转录结果推送到界面（生成器，每次产出 (转录结果, 处理状态)）
 
-def process_audio(audio_path, progress=gr.Progress()):
-    """处理音频文件并返回转录结果"""
+    参数:
+        preset_name: 识别预设，决定模型、解码方式、精度和分块
+        model_name: 可选，覆盖预设中的模型
+        profile: 为 True 时在结果旁保存性能分析文件
+    """
+    submitted = time.perf_counter()
     try:
-        if pipe is None:
-            return "错误：模型未能正确加载，请检查网络连接。", "❌ 转录失败"
+        preset = get_preset(preset_name)
+        model_name = model_name or preset["model"]
+        if broker is None and not model_ready.is_set():
+            # 模型还在加载，任务排队等待而不是直接报错
+            progress(0, desc="⏳ 模型加载中，任务已排队，加载完成后自动开始...")
+            model_ready.wait()
+        if broker is None and model_name == DEFAULT_MODEL and registry.load_status(DEFAULT_MODEL)["state"] == "failed":
+            yield "错误：模型未能正确加载，请检查网络连接。", "❌ 转录失败"
+            return
+        if not audio_path:
+            yield "错误：请先上传音频文件。", "❌ 转录失败"
+            return
         
         # 设置日志和结果保存路径
         progress(0, desc="准备转录环境...")
@@ -34,23 +193,164 @@ def process_audio(audio_path, progress=gr.Progress()):
         
         # 用于收集状态更新
         status_text = []
-        
-        def status_callback(message):
+
+        # 解码前先探测时长，估算耗时，拒绝损坏或超限的文件
+        progress(0.05, desc="正在检查音频文件...")
+        try:
+            estimate = admission.estimate(audio_path, preset=preset["name"])
+        except ValueError as e:
+            error_msg = f"❌ 文件未通过检查: {str(e)}"
+            logging.warning(error_msg)
+            yield error_msg, error_msg
+            return
+        eta_message = (f"音频时长 {format_seconds(estimate['duration'])}，"
+                       f"预计处理时间 {format_seconds(estimate['estimated_seconds'])}")
+        status_text.append(eta_message)
+        progress(0.1, desc=eta_message)
+
+        # 按预计内存占用选择执行方式
+        memory_plan = memory_guard.plan(estimate, batch_size=preset["batch_size"])
+        if memory_plan["low_memory"]:
+            message = (f"音频较长，预计占用内存 {memory_plan['projected_mb']['total']:.0f} MB，"
+                       f"改用低内存模式（批大小 {memory_plan['batch_size']}）")
+            status_text.append(message)
+            progress(0.1, desc=message)
+
+        # 识别在后台线程中进行，状态和每段结果通过队列交给本生成器，由本生成器更新界面
+        updates = queue.Queue()
+
+        def report(message, fraction=None):
             status_text.append(message)
-            # 更新进度条和状态
-            if "音频格式转换完成" in message:
-                progress(0.3, desc=message)
-            elif "正在加载音频文件" in message:
-                progress(0.4, desc=message)
-            elif "正在进行语音识别" in message:
-                progress(0.6, desc=message)
-            elif "正在保存转录结果" in message:
-                progress(0.9, desc=message)
+            updates.put(("status", message, fraction))
             return message
+
+        def advance(fraction):
+            # 只移动进度条，不增加状态文字
+            updates.put(("status", None, fraction))
+
+        def on_memory_wait(in_flight_mb):
+            report(f"⏳ 其他任务正在占用 {in_flight_mb:.0f} MB 内存，等待释放...", 0.1)
+
+        def on_wait(wait_seconds):
+            report(f"⏳ 当前任务较多，预计排队 {format_seconds(wait_seconds)}...", 0.1)
         
-        # 转录音频
-        progress(0.2, desc="开始处理音频...")
-        result = transcribe_audio(pipe, audio_path, result_file_path, status_callback)
+        def status_callback(message):
+            return report(message)
+        
+        user = request.client.host if request is not None and request.client else "anonymous"
+        metadata = {"model": model_name, "preset": preset["name"],
+                    "projected_memory_mb": memory_plan["projected_mb"]}
+
+        def on_segment(job, index, text):
+            # 在调度线程中调用；首段文字延迟在这里记录，保证写入结果元数据之前已经确定
+            if "time_to_first_text" not in metadata and text.strip():
+                metadata["time_to_first_text"] = round(time.perf_counter() - submitted, 2)
+                first_text_seconds.append(metadata["time_to_first_text"])
+                logging.info(f"首段文字延迟 {metadata['time_to_first_text']} 秒")
+            start, end = job.segments[index]
+            updates.put(("segment", index, text, (end - start) / job.sr, len(job.audio) / job.sr))
+
+        def run():
+            # 分布式模式下交给 worker 处理
+            if broker is not None:
+                result, path, inference = transcribe_with_broker(audio_path, user, model_name, preset["name"],
+                                                                 status_callback)
+                # 实时率只按 worker 上实际的推理耗时更新，不含排队和轮询的时间
+                if inference:
+                    admission.record(inference["audio_seconds"], inference["seconds"], preset=preset["name"])
+                return result, path
+
+            admission.acquire(estimate, on_wait=on_wait)
+            try:
+                memory_guard.acquire(memory_plan, on_wait=on_memory_wait)
+                try:
+                    report("开始处理音频...", 0.2)
+                    batch_size = memory_plan["batch_size"] if memory_plan["low_memory"] else None
+                    profile_dir = result_file_path.with_suffix('.profile') if profile else None
+                    if profile_dir is not None:
+                        metadata["profile_dir"] = str(profile_dir)
+                    decode_stats = DecodeStats()
+                    timer = InferenceTime()
+                    with MemoryTracker() as tracker, \
+                            (JobProfiler(profile_dir) if profile else contextlib.nullcontext()) as profiler:
+                        def infer(audio):
+                            advance(INFER_START)
+                            job = scheduler.submit(audio, user=user, priority="interactive", model=model_name,
+                                                   on_segment=on_segment,
+                                                   batch_size=batch_size, tracker=tracker, profiler=profiler,
+                                                   options=pipeline_options(preset), dtype=preset["dtype"],
+                                                   cache_scope=cache_scope(preset, model_name),
+                                                   decode_stats=decode_stats, timer=timer)
+                            if job.cached_seconds:
+                                report(f"有 {format_seconds(job.cached_seconds)} 的音频内容未变化，复用上次的识别结果")
+                            text = job.result()
+                            metadata["segments"] = len(job.segments)
+                            metadata["cached_seconds"] = round(job.cached_seconds, 2)
+                            advance(INFER_END)
+                            return text
+
+                        result = transcribe_audio(
+                            None, audio_path, result_file_path, status_callback, infer=infer,
+                            low_memory=memory_plan["low_memory"], batch_size=batch_size,
+                            tracker=tracker, metadata=metadata, pcm_cache=pcm_cache, decode_stats=decode_stats,
+                            timer=timer)
+                    # 只计模型推理耗时和实际识别的音频时长：排队、解码不计入，全部复用缓存时不更新
+                    admission.record(timer.audio_seconds, timer.seconds, preset=preset["name"])
+                    if profile_dir is not None:
+                        report(f"性能分析结果已保存至: {profile_dir}")
+                finally:
+                    memory_guard.release(memory_plan)
+            finally:
+                admission.release(estimate)
+            return result, result_file_path
+
+        outcome = {}
+
+        def run_in_background():
+            try:
+                outcome["result"] = run()
+            except Exception as e:
+                outcome["error"] = e
+            finally:
+                updates.put(("done",))
+
+        threading.Thread(target=run_in_background, daemon=True).start()
+
+        # 已完成的段（加好标点）按顺序显示，识别进度按已完成的音频时长计算
+        texts = {}
+        done_seconds = 0.0
+        fraction = 0.1
+        description = status_text[-1]
+        while True:
+            event = updates.get()
+            if event[0] == "done":
+                break
+            if event[0] == "status":
+                _, message, new_fraction = event
+                fraction = new_fraction if new_fraction is not None else fraction
+                description = message or description
+                progress(fraction, desc=description)
+            else:
+                _, index, text, seconds, total_seconds = event
+                texts[index] = process_text_with_punctuation(text) if text.strip() else ""
+                done_seconds += seconds
+                fraction = INFER_START + (INFER_END - INFER_START) * min(1.0, done_seconds / max(total_seconds, 1e-6))
+                description = f"已识别 {format_seconds(done_seconds)} / {format_seconds(total_seconds)}"
+                progress(fraction, desc=description)
+            partial = []
+            for index in range(len(texts)):
+                if index not in texts:
+                    break
+                partial.append(texts[index])
+            if partial:
+                yield (f"⏳ 正在转录，已完成 {fraction:.0%}...\n\n📌 转录内容:\n{''.join(partial)}",
+                       "\n".join(status_text))
+            else:
+                yield "", "\n".join(status_text)
+
+        if "error" in outcome:
+            raise outcome["error"]
+        result, result_file_path = outcome["result"]
         
         # 准备最终结果
         progress(1.0, desc="转录完成！")
@@ -58,11 +358,11 @@ def process_audio(audio_path, progress=gr.Progress()):
                        f"📝 结果已保存至: {result_file_path}\n\n"
                        f"📌 转录内容:\n{result}")
         
-        return final_result, "\n".join(status_text)
+        yield final_result, "\n".join(status_text)
     except Exception as e:
         error_msg = f"❌ 处理失败: {str(e)}"
         logging.error(error_msg)
-        return error_msg, error_msg
+        yield error_msg, error_msg
 
 # 创建Web界面
 def create_ui():
@@ -99,6 +399,9 @@ def create_ui():
             <div style="height: 2px; background: linear-gradient(90deg, #2196F3, #1976D2); margin: 20px auto;"></div>
         </div>
         """)
+
+        # 模型加载进度横幅，每秒刷新
+        gr.Markdown(value=model_banner, every=1)
         
         with gr.Row(equal_height=True):
             with gr.Column(scale=1, min_width=300):
@@ -133,6 +436,23 @@ def create_ui():
                     type="filepath",
                     elem_classes="audio-input"
                 )
+                preset_choice = gr.Dropdown(
+                    label="识别预设",
+                    choices=preset_choices(),
+                    value=DEFAULT_PRESET,
+                    info="快速适合草稿，精确适合最终稿；非默认模型首次使用需要下载",
+                )
+                model_choice = gr.Dropdown(
+                    label="识别模型",
+                    choices=[("按预设", "")] + available_models(),
+                    value="",
+                    info="一般保持按预设；tiny/base 速度快，medium 准确率高",
+                )
+                profile_choice = gr.Checkbox(
+                    label="性能分析",
+                    value=False,
+                    info="在结果旁保存 PyTorch 跟踪、Python 采样和算子汇总，用于排查处理慢的任务",
+                )
                 
                 with gr.Row():
                     process_btn = gr.Button(
@@ -159,9 +479,10 @@ def create_ui():
         
         process_btn.click(
             fn=process_audio,
-            inputs=[audio_input],
+            inputs=[audio_input, preset_choice, model_choice, profile_choice],
             outputs=[output_text, status],
             show_progress=True,  # 显示进度条
+            concurrency_limit=None,  # 并发由准入控制和推理锁管理
         )
         
         gr.Markdown("""
@@ -335,26 +656,44 @@ def create_ui():
 if __name__ == "__main__":
     demo = create_ui()
     
-    # 初始化Whisper模型（只初始化一次）
-    try:
-        pipe = setup_whisper()
-    except Exception as e:
-        print(f"模型加载失败: {str(e)}")
-        pipe = None
+    # 初始化Whisper模型（只初始化一次，在后台加载，界面立即可用）；分布式模式下模型由 worker 加载
+    if broker is not None:
+        print(f"分布式模式，任务代理: {BROKER_URL}")
+        model_ready.set()
+    else:
+        threading.Thread(target=load_default_model, daemon=True).start()
+
+    # Web 界面和 HTTP 接口挂在同一个服务上，共用已加载的模型
+    app = FastAPI()
+
+    @app.get("/health")
+    def health():
+        """存活检查，同时返回模型加载状态"""
+        return model_status()
+
+    @app.get("/metrics")
+    def metrics():
+        """首段文字延迟等界面指标"""
+        return {"time_to_first_text": first_text_metrics(), "queue_length": scheduler.queue_length()}
+
+    @app.get("/ready")
+    def ready():
+        """就绪检查，默认模型加载完成前返回 503"""
+        status = model_status()
+        return JSONResponse(status, status_code=200 if status["state"] == "ready" else 503)
+
+    app.include_router(create_api_router(registry, scheduler=scheduler))
+    app = gr.mount_gradio_app(app, demo, path="/")
 
     # 启动服务器
     try:
-        demo.launch(
-            server_name="127.0.0.1",
-            server_port=7860,
-            share=False,
-            inbrowser=True,
-            quiet=True
-        )
+        if not os.environ.get('WHISPER_NO_BROWSER'):
+            threading.Timer(2, webbrowser.open, args=(f"http://127.0.0.1:{SERVER_PORT}",)).start()
+        uvicorn.run(app, host="127.0.0.1", port=SERVER_PORT, log_level="warning")
     except Exception as e:
         print(f"启动失败: {str(e)}")
         print("\n可能的解决方案:")
-        print("1. 检查端口7860是否被占用")
+        print(f"1. 检查端口{SERVER_PORT}是否被占用")
         print("2. 检查网络连接")
         print("3. 尝试重启程序")
         input("\n按回车键退出...") 
\ No newline at end of file
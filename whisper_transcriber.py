@@ -1,19 +1,66 @@
 import os
 import tempfile
-from pydub import AudioSegment
-import torch
-from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
-import librosa
+import subprocess
+import time
+import threading
+import numpy as np
 import logging
+import contextlib
 from datetime import datetime
 import pathlib
 import re
+import json
+import struct
+
+from chunk_cache import chunk_fingerprint
+from decoding_guard import MAX_NEW_TOKENS, DecodeStats, collecting, guard_pipeline
+from memory_guard import MemoryTracker, instrument_pipeline, tracking
+from profiling import profiled_inference
+
+# torch、transformers、librosa、pydub 导入耗时较长，只在真正用到的函数里导入，
+# 这样 Web 界面可以在模型加载之前先启动
+
+def get_ffmpeg_binary():
+    """
+    查找可用的 ffmpeg 可执行文件
+
+    返回:
+        str: ffmpeg 路径，优先使用系统 PATH，其次是程序目录下的 ffmpeg.exe；都没有时返回 None
+    """
+    import shutil
+
+    system_ffmpeg = shutil.which('ffmpeg')
+    if system_ffmpeg is not None:
+        return system_ffmpeg
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    local_ffmpeg = os.path.join(current_dir, 'ffmpeg.exe')
+    if os.path.exists(local_ffmpeg):
+        return local_ffmpeg
+    return None
+
+def get_ffprobe_binary():
+    """
+    查找可用的 ffprobe 可执行文件，查找顺序与 get_ffmpeg_binary 相同
+    """
+    import shutil
+
+    system_ffprobe = shutil.which('ffprobe')
+    if system_ffprobe is not None:
+        return system_ffprobe
+
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    local_ffprobe = os.path.join(current_dir, 'ffprobe.exe')
+    if os.path.exists(local_ffprobe):
+        return local_ffprobe
+    return None
 
 def check_ffmpeg():
     """
     检查 ffmpeg 是否可用，如果不可用则尝试使用本地 ffmpeg
     """
     import shutil
+    from pydub import AudioSegment
 
     def is_ffmpeg_available():
         return shutil.which('ffmpeg') is not None
@@ -35,21 +82,28 @@ def check_ffmpeg():
             return False
     return True
 
-def convert_audio_to_wav(audio_path):
+def convert_audio_to_wav(audio_path, low_memory=False):
     """
     将音频文件转换为WAV格式
+
+    参数:
+        low_memory: 为 True 时由 ffmpeg 直接输出 16kHz 单声道 16 位 WAV，
+                    不经过 pydub（pydub 会把整段解码结果放在内存中）
     """
     try:
-        # 首先检查 ffmpeg
-        if not check_ffmpeg():
-            raise Exception("ffmpeg 未正确安装，无法处理非 WAV 格式的音频")
-
         # 获取文件扩展名
         ext = os.path.splitext(audio_path)[1].lower()
         
-        # 如果已经是wav格式，直接返回
+        # 如果已经是wav格式，直接返回（WAV 由 load_audio 直接读取，不需要 ffmpeg）
         if ext == '.wav':
             return audio_path
+
+        if low_memory and get_ffmpeg_binary() is not None:
+            return convert_audio_with_ffmpeg(audio_path)
+
+        # 检查 ffmpeg
+        if not check_ffmpeg():
+            raise Exception("ffmpeg 未正确安装，无法处理非 WAV 格式的音频")
             
         # 创建临时文件
         temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
@@ -58,6 +112,7 @@ def convert_audio_to_wav(audio_path):
         
         try:
             # 使用 pydub 转换音频
+            from pydub import AudioSegment
             audio = AudioSegment.from_file(audio_path)
             audio.export(temp_wav_path, format="wav")
             return temp_wav_path
@@ -75,70 +130,884 @@ def convert_audio_to_wav(audio_path):
         print("3. 有足够的磁盘空间")
         raise 
 
-def setup_whisper():
+# 视频容器格式，由 decode_audio_stream 只解码其中的音频流
+VIDEO_EXTENSIONS = {'.mp4', '.m4v', '.mkv', '.mov', '.webm', '.avi', '.flv', '.wmv',
+                    '.ts', '.mts', '.m2ts', '.3gp'}
+
+# 只输出第一条音频流：视频、字幕和数据流不进入解码器
+FFMPEG_AUDIO_ONLY = ['-map', '0:a:0', '-vn', '-sn', '-dn']
+
+def is_video_container(audio_path):
+    return os.path.splitext(audio_path)[1].lower() in VIDEO_EXTENSIONS
+
+def decode_audio_stream(audio_path, sr=16000):
     """
-    初始化并配置 Whisper 语音识别模型
+    用 ffmpeg 只解码文件中的第一条音频流，PCM 通过管道直接读入 float32 数组
+
+    与 pydub 相比，视频数据不会被解码，也不会产生中间的 WAV 文件和 AudioSegment 对象；
+    缓冲区按探测到的时长一次分配，结果数组直接使用这块内存。
+
+    返回:
+        np.ndarray: 单声道 float32 音频
     """
-    device = "cuda:0" if torch.cuda.is_available() else "cpu"
-    torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
-    model_id = "openai/whisper-small"
+    ffmpeg = get_ffmpeg_binary()
+    if ffmpeg is None:
+        raise Exception("ffmpeg 未正确安装，无法解码视频中的音频")
+    try:
+        duration = probe_audio(audio_path)['duration']
+    except ValueError:
+        duration = None
 
+    process = subprocess.Popen(
+        [ffmpeg, '-nostdin', '-hide_banner', '-loglevel', 'error',
+         '-i', audio_path, *FFMPEG_AUDIO_ONLY, '-ac', '1', '-ar', str(sr), '-f', 'f32le', 'pipe:1'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    errors = []
+    error_reader = threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)
+    error_reader.start()
+
+    # 多留 1 秒余量，时长未知时按 10 分钟起步，不够时按 1.5 倍扩容
+    buffer = bytearray(int(((duration or 600) + 1) * sr) * 4)
+    size = 0
     try:
-        print("\n" + "="*50)
-        print("欢迎使用语音转文字工具，by-程 v1.0")
-        print("初次启动可能需要多等待一会，请耐心等待...")
-        print("建议使用Chrome浏览器以获得最佳体验~")
-        print("="*50 + "\n")
-        
-        print("正在从国内镜像下载模型，请稍候...")
-        
-        # 设置 HuggingFace 镜像
-        os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
-        os.environ['HF_MIRROR'] = 'https://hf-mirror.com'
-        
+        while True:
+            if size == len(buffer):
+                buffer.extend(bytes(len(buffer) // 2))
+            with memoryview(buffer) as view:
+                count = process.stdout.readinto(view[size:])
+            if not count:
+                break
+            size += count
+    finally:
+        process.stdout.close()
+        returncode = process.wait()
+        error_reader.join()
+    if returncode != 0:
+        message = b''.join(errors).decode('utf-8', errors='replace').strip()
+        raise Exception(f"ffmpeg 解码失败: {message}")
+
+    del buffer[size - size % 4:]
+    return np.frombuffer(buffer, dtype=np.float32)
+
+def convert_audio_with_ffmpeg(audio_path, sr=16000):
+    """
+    用 ffmpeg 把音频直接转换为单声道 16 位 PCM WAV 临时文件，解码数据不经过 Python 进程
+
+    返回:
+        str: 临时 WAV 文件路径
+    """
+    temp_wav = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+    temp_wav_path = temp_wav.name
+    temp_wav.close()
+    command = [get_ffmpeg_binary(), '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+               '-i', audio_path, *FFMPEG_AUDIO_ONLY, '-ac', '1', '-ar', str(sr), '-c:a', 'pcm_s16le', temp_wav_path]
+    completed = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if completed.returncode != 0:
+        os.remove(temp_wav_path)
+        message = completed.stderr.decode('utf-8', errors='replace').strip()
+        raise Exception(f"ffmpeg 转换失败: {message}")
+    return temp_wav_path
+
+# WAV 快速路径每次转换的帧数（约 60 秒 16kHz 音频）
+WAV_BLOCK_FRAMES = 16000 * 60
+
+# WAVE_FORMAT_EXTENSIBLE 的格式标识
+_WAVE_FORMAT_PCM = 0x0001
+_WAVE_FORMAT_IEEE_FLOAT = 0x0003
+_WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+def read_wav_info(wav_path):
+    """
+    解析 WAV 文件头，返回采样格式和数据区位置
+
+    参数:
+        wav_path: WAV 文件路径
+    返回:
+        dict: 包含 format, channels, sample_rate, bits_per_sample, block_align,
+              data_offset, num_frames；不是可直接映射的 PCM/float WAV 时返回 None
+    """
+    file_size = os.path.getsize(wav_path)
+    with open(wav_path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            return None
+
+        fmt = None
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+
+            if chunk_id == b'fmt ':
+                fmt_data = f.read(chunk_size)
+                if len(fmt_data) < 16:
+                    return None
+                audio_format, channels, sample_rate, _, block_align, bits = struct.unpack(
+                    '<HHIIHH', fmt_data[:16])
+                # 扩展格式的真实编码保存在子格式 GUID 的前两个字节
+                if audio_format == _WAVE_FORMAT_EXTENSIBLE and len(fmt_data) >= 26:
+                    audio_format = struct.unpack('<H', fmt_data[24:26])[0]
+                fmt = {
+                    'format': audio_format,
+                    'channels': channels,
+                    'sample_rate': sample_rate,
+                    'bits_per_sample': bits,
+                    'block_align': block_align,
+                }
+                if chunk_size % 2:
+                    f.seek(1, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                if fmt is None or fmt['channels'] == 0 or fmt['block_align'] == 0:
+                    return None
+                data_offset = f.tell()
+                # 流式写出的 WAV 可能没有回填数据长度，以实际文件大小为准
+                data_size = min(chunk_size, file_size - data_offset)
+                fmt['data_offset'] = data_offset
+                fmt['num_frames'] = data_size // fmt['block_align']
+                break
+            else:
+                f.seek(chunk_size + (chunk_size % 2), os.SEEK_CUR)
+
+    supported = {
+        (_WAVE_FORMAT_PCM, 8): np.uint8,
+        (_WAVE_FORMAT_PCM, 16): np.int16,
+        (_WAVE_FORMAT_PCM, 32): np.int32,
+        (_WAVE_FORMAT_IEEE_FLOAT, 32): np.float32,
+    }
+    dtype = supported.get((fmt['format'], fmt['bits_per_sample']))
+    if dtype is None or fmt['block_align'] != fmt['channels'] * np.dtype(dtype).itemsize:
+        return None
+    fmt['dtype'] = dtype
+    return fmt
+
+def _pcm_to_float32(block):
+    """
+    将整型 PCM 数据块转换为 [-1, 1) 范围的 float32
+    """
+    if block.dtype == np.float32:
+        return block
+    if block.dtype == np.uint8:
+        return (block.astype(np.float32) - 128.0) * (1.0 / 128)
+    scale = 1.0 / float(2 ** (8 * block.dtype.itemsize - 1))
+    return block.astype(np.float32) * scale
+
+def load_wav_mmap(wav_path, sr=16000):
+    """
+    通过内存映射读取 PCM WAV 文件
+
+    16kHz 单声道 float32 文件直接返回映射视图，不做任何拷贝；
+    其余情况按块转换为 float32，仅在需要时混音和重采样。
+
+    参数:
+        wav_path: WAV 文件路径
+        sr: 目标采样率
+    返回:
+        tuple: (audio, sr)；文件格式不支持快速路径时返回 None
+    """
+    info = read_wav_info(wav_path)
+    if info is None:
+        return None
+
+    num_frames = info['num_frames']
+    channels = info['channels']
+    if num_frames == 0:
+        return np.zeros(0, dtype=np.float32), sr
+
+    shape = (num_frames,) if channels == 1 else (num_frames, channels)
+    raw = np.memmap(wav_path, dtype=info['dtype'], mode='r',
+                    offset=info['data_offset'], shape=shape)
+
+    # 已经是模型需要的格式，零拷贝返回
+    if info['dtype'] == np.float32 and channels == 1 and info['sample_rate'] == sr:
+        return raw, sr
+
+    audio = np.empty(num_frames, dtype=np.float32)
+    for start in range(0, num_frames, WAV_BLOCK_FRAMES):
+        end = min(start + WAV_BLOCK_FRAMES, num_frames)
+        block = _pcm_to_float32(raw[start:end])
+        if channels > 1:
+            block = block.mean(axis=1, dtype=np.float32)
+        audio[start:end] = block
+    del raw
+
+    if info['sample_rate'] != sr:
+        import librosa
+        audio = librosa.resample(audio, orig_sr=info['sample_rate'], target_sr=sr)
+    return audio, sr
+
+class PcmWindowReader:
+    """
+    按需读取 WAV 文件中的一段音频，整段音频不会同时出现在内存中
+
+    支持 len() 和切片，切片返回单声道 float32 数组，可以直接交给 split_audio 和 transcribe_segment。
+    只支持采样率与目标一致的 PCM/float WAV，其他情况由 open 返回 None。
+    """
+
+    def __init__(self, raw, channels):
+        self.raw = raw
+        self.channels = channels
+
+    @classmethod
+    def open(cls, wav_path, sr=16000):
+        info = read_wav_info(wav_path)
+        if info is None or info['sample_rate'] != sr or info['num_frames'] == 0:
+            return None
+        channels = info['channels']
+        shape = (info['num_frames'],) if channels == 1 else (info['num_frames'], channels)
+        raw = np.memmap(wav_path, dtype=info['dtype'], mode='r',
+                        offset=info['data_offset'], shape=shape)
+        return cls(raw, channels)
+
+    def __len__(self):
+        return len(self.raw)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            raise TypeError("PcmWindowReader 只支持切片")
+        block = _pcm_to_float32(np.array(self.raw[index]))
+        if self.channels > 1:
+            block = block.mean(axis=1, dtype=np.float32)
+        return block
+
+    def close(self):
+        # 释放映射，Windows 下映射未释放时无法删除文件
+        self.raw = None
+
+def load_audio(wav_path, sr=16000):
+    """
+    加载音频为单声道 float32 数组，PCM WAV 优先走内存映射快速路径
+
+    参数:
+        wav_path: 音频文件路径
+        sr: 目标采样率
+    返回:
+        tuple: (audio, sr)
+    """
+    if os.path.splitext(wav_path)[1].lower() == '.wav':
         try:
-            model = AutoModelForSpeechSeq2Seq.from_pretrained(
-                "openai/whisper-small",
-                torch_dtype=torch_dtype,
-                low_cpu_mem_usage=True,
-                use_safetensors=True,
-                local_files_only=False,
-                mirror='https://hf-mirror.com',
-                trust_remote_code=True
-            )
-            print("模型下载完成！")
-        except Exception as e:
-            print("\n模型下载失败，请检查网络连接")
-            print("详细错误信息：", str(e))
-            raise e
+            loaded = load_wav_mmap(wav_path, sr=sr)
+            if loaded is not None:
+                return loaded
+        except (OSError, ValueError, struct.error) as e:
+            logging.warning(f"WAV 快速加载失败，改用 librosa: {str(e)}")
+    import librosa
+    return librosa.load(wav_path, sr=sr)
+
+# 不需要 ffmpeg、由 soundfile（librosa 使用的解码库）读取的格式
+SOUNDFILE_EXTENSIONS = {'.wav', '.flac'}
+
+def _probe_with_soundfile(audio_path):
+    """
+    用 soundfile 读取音频信息，soundfile 未安装或无法识别时返回 None
+    """
+    try:
+        import soundfile
+        info = soundfile.info(audio_path)
+    except (ImportError, RuntimeError, OSError) as e:
+        logging.debug(f"soundfile 无法读取 {audio_path}: {str(e)}")
+        return None
+    return {
+        'duration': info.frames / info.samplerate if info.samplerate else None,
+        'channels': info.channels,
+        'sample_rate': info.samplerate,
+        'codec': info.subtype.lower(),
+    }
+
+def probe_audio(audio_path):
+    """
+    在不解码的情况下读取音频的时长、声道数和采样率
 
-        model.to(device)
+    WAV 文件直接解析文件头，无法直接解析的 WAV 和 FLAC 使用 soundfile，其他格式使用 ffprobe 读取容器信息。
 
+    参数:
+        audio_path: 音频文件路径
+    返回:
+        dict: duration（秒，未知时为 None）, channels, sample_rate, codec
+    异常:
+        ValueError: 文件损坏、不是音频或格式不支持
+    """
+    if not os.path.exists(audio_path):
+        raise ValueError(f"文件不存在: {audio_path}")
+
+    extension = os.path.splitext(audio_path)[1].lower()
+    if extension == '.wav':
         try:
-            print("正在下载处理器...")
-            processor = AutoProcessor.from_pretrained(
-                "openai/whisper-small",
-                local_files_only=False,
-                mirror='https://hf-mirror.com',
-                trust_remote_code=True
-            )
-            print("处理器下载完成！")
-        except Exception as e:
-            print("\n处理器下载失败，请检查网络连接")
-            print("详细错误信息：", str(e))
-            raise e
-
-        pipe = pipeline(
-            "automatic-speech-recognition",
-            model=model,
-            tokenizer=processor.tokenizer,
-            feature_extractor=processor.feature_extractor,
-            max_new_tokens=256,
-            chunk_length_s=15,
-            batch_size=16,
+            info = read_wav_info(audio_path)
+        except (OSError, struct.error):
+            info = None
+        if info is not None:
+            return {
+                'duration': info['num_frames'] / info['sample_rate'] if info['sample_rate'] else None,
+                'channels': info['channels'],
+                'sample_rate': info['sample_rate'],
+                'codec': f"pcm_{info['bits_per_sample']}bit",
+            }
+
+    if extension in SOUNDFILE_EXTENSIONS:
+        # 24 位、RF64 等无法直接映射的 WAV 以及 FLAC 由 soundfile 读取文件头，和 librosa 解码时一样不需要 ffmpeg
+        info = _probe_with_soundfile(audio_path)
+        if info is not None:
+            return info
+
+    ffprobe = get_ffprobe_binary()
+    if ffprobe is None:
+        raise ValueError("ffprobe 未正确安装，无法识别该格式的音频")
+
+    completed = subprocess.run(
+        [ffprobe, '-v', 'error', '-print_format', 'json',
+         '-show_entries', 'format=duration:stream=codec_type,codec_name,channels,sample_rate,duration',
+         audio_path],
+        capture_output=True,
+    )
+    if completed.returncode != 0:
+        message = completed.stderr.decode('utf-8', errors='replace').strip()
+        raise ValueError(f"文件已损坏或格式不支持: {message}")
+
+    probe = json.loads(completed.stdout or b'{}')
+    audio_streams = [st for st in probe.get('streams', []) if st.get('codec_type') == 'audio']
+    if not audio_streams:
+        raise ValueError("文件中没有音频流")
+    stream = audio_streams[0]
+
+    duration = stream.get('duration') or probe.get('format', {}).get('duration')
+    return {
+        'duration': float(duration) if duration not in (None, 'N/A') else None,
+        'channels': int(stream.get('channels') or 0),
+        'sample_rate': int(stream.get('sample_rate') or 0),
+        'codec': stream.get('codec_name', 'unknown'),
+    }
+
+class FfmpegPcmDecoder:
+    """
+    通过 ffmpeg 子进程把任意格式的字节流边接收边解码为单声道 float32 PCM
+
+    用法: 不断调用 feed() 写入原始字节，close() 表示输入结束；
+    解码结果可随时通过 num_samples / get_samples() 读取，用完的部分调用 discard() 释放，
+    内存中只保留尚未处理的样本。样本下标始终是从流开头算起的绝对位置。
+    """
+
+    def __init__(self, sr=16000):
+        ffmpeg = get_ffmpeg_binary()
+        if ffmpeg is None:
+            raise Exception("ffmpeg 未正确安装，无法进行流式解码")
+
+        self.sr = sr
+        self.process = subprocess.Popen(
+            [ffmpeg, '-hide_banner', '-loglevel', 'error',
+             '-i', 'pipe:0', *FFMPEG_AUDIO_ONLY, '-ac', '1', '-ar', str(sr),
+             '-f', 'f32le', 'pipe:1'],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self.finished = False
+        self.condition = threading.Condition()
+        self._buffer = bytearray()
+        # _buffer 第一个字节对应的样本下标（之前的样本已被 discard 释放）
+        self._base = 0
+        self._stderr = b''
+        self._reader = threading.Thread(target=self._read_stdout, daemon=True)
+        self._error_reader = threading.Thread(target=self._read_stderr, daemon=True)
+        self._reader.start()
+        self._error_reader.start()
+
+    def _read_stdout(self):
+        while True:
+            data = self.process.stdout.read1(1 << 16)
+            with self.condition:
+                if not data:
+                    self.finished = True
+                    self.condition.notify_all()
+                    return
+                self._buffer.extend(data)
+                self.condition.notify_all()
+
+    def _read_stderr(self):
+        self._stderr = self.process.stderr.read()
+
+    def feed(self, data):
+        """写入一段原始音频字节"""
+        self.process.stdin.write(data)
+
+    def close(self):
+        """输入结束，等待 ffmpeg 输出剩余数据"""
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+    def kill(self):
+        """放弃解码"""
+        self.process.kill()
+        self.close()
+
+    @property
+    def num_samples(self):
+        with self.condition:
+            return self._base + len(self._buffer) // 4
+
+    def wait_for_samples(self, count, timeout=None):
+        """
+        阻塞直到已解码样本数达到 count 或解码结束
+
+        返回:
+            int: 当前已解码的样本数
+        """
+        with self.condition:
+            self.condition.wait_for(
+                lambda: self.finished or self._base + len(self._buffer) // 4 >= count, timeout)
+            return self._base + len(self._buffer) // 4
+
+    def get_samples(self, start, end):
+        """
+        复制出 [start, end) 范围内的样本
+
+        异常:
+            ValueError: start 之前的样本已被 discard 释放
+        """
+        with self.condition:
+            if start < self._base:
+                raise ValueError(f"样本 {start} 已被释放（当前起点 {self._base}）")
+            # 只复制一次；不能直接返回视图，否则 bytearray 在视图释放前无法再追加数据
+            view = memoryview(self._buffer)[(start - self._base) * 4:(end - self._base) * 4]
+            samples = np.frombuffer(view, dtype=np.float32).copy()
+            view.release()
+            return samples
+
+    def discard(self, before):
+        """
+        释放 before 之前的样本，之后不能再读取
+        """
+        with self.condition:
+            count = min(max(before - self._base, 0), len(self._buffer) // 4)
+            if count:
+                del self._buffer[:count * 4]
+                self._base += count
+
+    def wait(self):
+        """
+        等待 ffmpeg 退出，解码失败时抛出异常
+        """
+        returncode = self.process.wait()
+        self._reader.join()
+        self._error_reader.join()
+        if returncode != 0:
+            message = self._stderr.decode('utf-8', errors='replace').strip()
+            raise Exception(f"ffmpeg 解码失败: {message}")
+
+def find_split_point(audio, target, search_samples, frame_samples=1600):
+    """
+    在 target 之前的一段范围内寻找能量最低的位置作为切分点，避免把一个词切成两半
+
+    参数:
+        audio: 音频数组
+        target: 期望的切分位置（样本下标）
+        search_samples: 向前搜索的样本数
+        frame_samples: 计算能量的帧长（默认 100ms）
+    返回:
+        int: 切分位置
+    """
+    start = max(0, target - search_samples)
+    region = np.asarray(audio[start:target], dtype=np.float32)
+    num_frames = len(region) // frame_samples
+    if num_frames < 2:
+        return target
+    frames = region[:num_frames * frame_samples].reshape(num_frames, frame_samples)
+    energy = np.square(frames).mean(axis=1)
+    quietest = int(np.argmin(energy))
+    return start + quietest * frame_samples + frame_samples // 2
+
+def _silence_middle(audio, start, end, limit):
+    """[start, end) 全为 0 时，向两侧延伸到整段数字静音（每侧最多 limit 个样本），返回其中点"""
+    before = np.asarray(audio[max(0, start - limit):start])
+    nonzero = np.flatnonzero(before)
+    first = start - len(before) + (int(nonzero[-1]) + 1 if len(nonzero) else 0)
+    after = np.asarray(audio[end:end + limit])
+    nonzero = np.flatnonzero(after)
+    last = end + (int(nonzero[0]) if len(nonzero) else len(after))
+    return (first + last) // 2
+
+def _sliding_min(values, width):
+    """values[j:j + width] 的最小值（j = 0 .. len(values) - width），按块计算前缀和后缀最小值，不展开窗口"""
+    count = -(-len(values) // width)
+    padded = np.full(count * width, np.inf)
+    padded[:len(values)] = values
+    blocks = padded.reshape(count, width)
+    prefix = np.minimum.accumulate(blocks, axis=1).ravel()
+    suffix = np.minimum.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].ravel()
+    size = len(values) - width + 1
+    return np.minimum(suffix[:size], prefix[width - 1:width - 1 + size])
+
+# 逐样本细化切分点时的搜索范围（前后各 1 秒）和最多移动次数
+REFINE_REACH_SAMPLES = 16000
+REFINE_STEPS = 8
+# 帧能量不超过前后范围内最低值的这个倍数时作为候选
+CANDIDATE_RATIO = 4
+
+def _quietest_near(audio, point, frame_samples, limit):
+    """point 前后 REFINE_REACH_SAMPLES 范围内能量最低的一帧长窗口的中心（整段数字静音取其中点）"""
+    start = max(0, point - frame_samples // 2 - REFINE_REACH_SAMPLES)
+    region = np.asarray(audio[start:point + frame_samples // 2 + REFINE_REACH_SAMPLES], dtype=np.float64)
+    if len(region) < frame_samples:
+        return point
+    sums = np.concatenate([[0.0], np.cumsum(np.square(region))])
+    windowed = sums[frame_samples:] - sums[:-frame_samples]
+    offset = int(np.argmin(windowed))
+    if windowed[offset] > 0:
+        return start + offset + frame_samples // 2
+    return _silence_middle(audio, start + offset, start + offset + frame_samples, limit)
+
+def quiet_points(audio, radius_samples, frame_samples=1600, block_frames=600):
+    """
+    寻找由内容决定的切分点：前后 radius_samples 范围内最安静的位置
+
+    先按帧找出接近前后范围内最低能量的帧，再逐样本滑动找到前后 1 秒内能量最低的位置，
+    移动到该位置后重复查找，直到位置不再变化（整段数字静音取其中点），最后按这些位置的能量选出前后范围内最安静的。
+    帧的划分随开头剪掉的长度变化，这样找到的位置与帧的划分无关。
+    结果只取决于该位置附近的音频，从开头剪掉一段或在末尾追加内容后，距离两端较远的切分点保持不变。
+
+    参数:
+        audio: 音频数组（或支持切片的 PcmWindowReader，按块读取）
+        radius_samples: 切分点之间的最小间隔
+        frame_samples: 计算能量的帧长（默认 100ms）
+    返回:
+        list: 切分位置（样本下标），从小到大
+    """
+    num_frames = len(audio) // frame_samples
+    radius = radius_samples // frame_samples
+    if num_frames < 2 or radius < 1:
+        return []
+    energy = np.empty(num_frames)
+    for first in range(0, num_frames, block_frames):
+        count = min(block_frames, num_frames - first)
+        block = np.asarray(audio[first * frame_samples:(first + count) * frame_samples], dtype=np.float32)
+        energy[first:first + count] = np.square(block.reshape(count, frame_samples)).mean(axis=1)
+    padded = np.concatenate([np.full(radius, np.inf), energy, np.full(radius, np.inf)])
+    nearby = _sliding_min(padded, 2 * radius + 1)
+    # 帧能量随帧的划分略有变化，接近前后范围内最低值的帧都逐样本细化，再按细化后的能量比较
+    close = np.flatnonzero(energy <= nearby * CANDIDATE_RATIO)
+    candidates = {}
+    for run in np.split(close, np.flatnonzero(np.diff(close) > 1) + 1):
+        if not len(run):
+            continue
+        frame = int(run[np.argmin(energy[run])])
+        point = frame * frame_samples + frame_samples // 2
+        for _ in range(REFINE_STEPS):
+            refined = _quietest_near(audio, point, frame_samples, radius_samples)
+            if refined == point:
+                break
+            point = refined
+        start = max(0, point - frame_samples // 2)
+        candidates[point] = float(np.square(np.asarray(audio[start:start + frame_samples], dtype=np.float64)).sum())
+
+    ordered = sorted(candidates)
+    points = []
+    for i, point in enumerate(ordered):
+        rank = (candidates[point], point)
+        left = right = i
+        while left > 0 and point - ordered[left - 1] <= radius_samples:
+            left -= 1
+        while right + 1 < len(ordered) and ordered[right + 1] - point <= radius_samples:
+            right += 1
+        if all(rank <= (candidates[other], other) for other in ordered[left:right + 1]):
+            points.append(point)
+    return points
+
+# 长音频切分成若干段依次识别，每段等于 pipeline 一个批次能处理的时长（15 秒 x 16）
+SEGMENT_SECONDS = 240
+# 在每段末尾这段范围内寻找静音位置作为切分点
+SPLIT_SEARCH_SECONDS = 5
+# 逐段识别时第一段较短，网页上可以很快显示出第一段文字
+FIRST_SEGMENT_SECONDS = 30
+
+def split_audio(audio, sr=16000, segment_seconds=SEGMENT_SECONDS, search_seconds=SPLIT_SEARCH_SECONDS,
+                first_segment_seconds=None, stable=False):
+    """
+    把长音频切分成若干段，切分点选在每段末尾附近最安静的位置
+
+    参数:
+        first_segment_seconds: 可选，第一段的时长，默认与其他段相同
+        stable: 为 True 时优先在 quiet_points 找到的位置切分（每段至少半段长），
+            切分点由内容决定，从开头剪掉一段后，除开头几段外的切分点不变，分段缓存仍然可以复用；
+            两个切分点相距超过一段时，中间按时长补充切分
+    返回:
+        list: [(start, end), ...] 样本下标范围
+    """
+    segment = int(segment_seconds * sr)
+    size = int((first_segment_seconds or segment_seconds) * sr)
+    search = int(search_seconds * sr)
+    anchors = quiet_points(audio, segment // 2) if stable else []
+    next_anchor = 0
+    segments = []
+    position = 0
+    while len(audio) - position > size:
+        while next_anchor < len(anchors) and anchors[next_anchor] <= position + search:
+            next_anchor += 1
+        if next_anchor < len(anchors) and anchors[next_anchor] <= position + size:
+            end = anchors[next_anchor]
+        else:
+            end = find_split_point(audio, position + size, search)
+        segments.append((position, end))
+        position = end
+        size = segment
+    if position < len(audio) or not segments:
+        segments.append((position, len(audio)))
+    return segments
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+# 同一个 pipeline 同时只允许一个线程推理
+inference_lock = threading.Lock()
+
+def _call_kwargs(options, batch_size):
+    kwargs = dict(options or {})
+    if batch_size is not None:
+        kwargs["batch_size"] = batch_size
+    return kwargs
+
+class InferenceTime:
+    """
+    一个任务在模型中实际花费的时间和识别的音频时长，不含排队、解码和缓存命中的部分，用于更新实时率
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seconds = 0.0
+        self.audio_seconds = 0.0
+
+    @contextlib.contextmanager
+    def measure(self, audio_seconds):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.seconds += elapsed
+                self.audio_seconds += audio_seconds
+
+    def report(self):
+        with self.lock:
+            return {"seconds": round(self.seconds, 3), "audio_seconds": round(self.audio_seconds, 2)}
+
+def _measured(timer, audio_seconds):
+    return timer.measure(audio_seconds) if timer is not None else contextlib.nullcontext()
+
+def transcribe_segment(pipe, audio, batch_size=None, tracker=None, profiler=None, options=None,
+                       decode_stats=None, timer=None):
+    """
+    对一段音频数组进行识别，返回原始文本（不做标点处理）
+
+    参数:
+        batch_size: 可选，覆盖 pipeline 的批大小（低内存模式下减小）
+        tracker: 可选，MemoryTracker，特征提取和推理的内存计入该任务
+        profiler: 可选，JobProfiler，记录本次推理的 PyTorch 跟踪
+        options: 可选，pipeline 调用参数（见 presets.pipeline_options）
+        decode_stats: 可选，DecodeStats，循环检测节省的 token 和时间计入该任务
+        timer: 可选，InferenceTime，推理耗时（不含等待推理锁的时间）计入该任务
+    """
+    if len(audio) == 0:
+        return ""
+    kwargs = _call_kwargs(options, batch_size)
+    with inference_lock, _measured(timer, len(audio) / 16000), tracking(tracker), collecting(decode_stats), \
+            profiled_inference(profiler):
+        result = pipe(audio, **kwargs)
+    return result["text"]
+
+def transcribe_segments(pipe, audio, sr=16000, batch_size=None, tracker=None, cache=None, scope='',
+                        profiler=None, options=None, decode_stats=None, timer=None):
+    """
+    按 split_audio 切分后逐段识别，同一时间只有一段音频在内存中
+
+    参数:
+        cache: 可选，ChunkCache；指纹未变化的段直接使用缓存文本
+        scope: 计算指纹时附带的配置（模型名称、预设等）
+        options: 可选，pipeline 调用参数
+        decode_stats: 可选，DecodeStats
+        timer: 可选，InferenceTime，只计入实际识别的段
+    返回:
+        tuple: (拼接后的原始文本, 统计信息 dict)
+    """
+    texts = []
+    stats = {"segments": 0, "cached_segments": 0, "cached_seconds": 0.0}
+    for start, end in split_audio(audio, sr=sr, first_segment_seconds=FIRST_SEGMENT_SECONDS, stable=True):
+        segment = audio[start:end]
+        key = chunk_fingerprint(segment, scope) if cache is not None else None
+        text = cache.get(key) if key is not None else None
+        if text is None:
+            text = transcribe_segment(pipe, segment, batch_size, tracker, profiler, options, decode_stats, timer)
+            if key is not None:
+                cache.put(key, text, (end - start) / sr)
+        else:
+            stats["cached_segments"] += 1
+            stats["cached_seconds"] += (end - start) / sr
+        texts.append(text)
+        stats["segments"] += 1
+    stats["cached_seconds"] = round(stats["cached_seconds"], 2)
+    return ''.join(texts), stats
+
+def transcribe_batch(pipe, audios, options=None, decode_stats=None):
+    """
+    在一次 pipeline 调用中识别多段短音频，各音频的分块合并成批，减少小文件逐个识别时的空闲
+
+    返回:
+        list: 与 audios 一一对应的原始文本
+    """
+    texts = [""] * len(audios)
+    indexes = [i for i, audio in enumerate(audios) if len(audio) > 0]
+    if not indexes:
+        return texts
+    with inference_lock, collecting(decode_stats):
+        results = pipe([audios[i] for i in indexes], **_call_kwargs(options, None))
+    for i, result in zip(indexes, results):
+        texts[i] = result["text"]
+    return texts
+
+def read_audio_file(audio_path, sr=16000, pcm_cache=None):
+    """
+    读取任意格式的音频（视频只解码音频流）为单声道 float32 数组，临时文件读取后即删除
+
+    参数:
+        pcm_cache: 可选，PcmCache；命中时直接映射缓存的解码结果，未命中时解码后保存
+    """
+    if pcm_cache is not None:
+        audio, _ = pcm_cache.load(audio_path, lambda: read_audio_file(audio_path, sr=sr), sr=sr)
+        return audio
+    if is_video_container(audio_path) and get_ffmpeg_binary() is not None:
+        return decode_audio_stream(audio_path, sr=sr)
+    wav_path = convert_audio_to_wav(audio_path)
+    try:
+        audio, _ = load_audio(wav_path, sr=sr)
+        if wav_path != audio_path:
+            audio = np.array(audio)
+        return audio
+    finally:
+        if wav_path != audio_path:
+            _remove_quietly(wav_path)
+
+def save_metadata(result_file_path, metadata):
+    """
+    把任务信息（执行方式、各阶段内存峰值等）保存到结果文件旁的同名 .json 文件
+    """
+    metadata_path = pathlib.Path(result_file_path).with_suffix('.json')
+    with open(metadata_path, 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, ensure_ascii=False, indent=2)
+    return metadata_path
+
+def save_transcript(result_file_path, audio_path, text, language='unknown'):
+    """
+    按统一格式保存转录结果
+    """
+    with open(result_file_path, 'w', encoding='utf-8') as f:
+        f.write(f"音频文件: {audio_path}\n")
+        f.write(f"转录时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"识别语言: {language}\n")
+        f.write("\n转录内容:\n")
+        f.write(text)
+
+def build_pipeline(model_id="openai/whisper-small", status_callback=None, dtype=None):
+    """
+    下载（或从缓存读取）指定的 Whisper 模型并构建识别 pipeline
+
+    参数:
+        model_id: HuggingFace 模型名称或本地模型目录
+        status_callback: 可选，接收加载阶段说明文字的回调
+        dtype: 可选，"float16" 或 "float32"；默认 GPU 上用 float16，CPU 上用 float32（CPU 始终用 float32）
+    返回:
+        pipeline: 语音识别 pipeline
+    """
+    def update_status(message):
+        print(message)
+        if status_callback:
+            status_callback(message)
+
+    update_status("正在导入 PyTorch 和 Transformers...")
+    import torch
+    from transformers import AutoModelForSpeechSeq2Seq, AutoProcessor, pipeline
+
+    device = "cuda:0" if torch.cuda.is_available() else "cpu"
+    if dtype is not None and torch.cuda.is_available():
+        torch_dtype = getattr(torch, dtype)
+    else:
+        torch_dtype = torch.float16 if torch.cuda.is_available() else torch.float32
+
+    # 设置 HuggingFace 镜像
+    os.environ['HF_ENDPOINT'] = 'https://hf-mirror.com'
+    os.environ['HF_MIRROR'] = 'https://hf-mirror.com'
+    
+    try:
+        update_status(f"正在下载/加载模型 {model_id}...")
+        model = AutoModelForSpeechSeq2Seq.from_pretrained(
+            model_id,
             torch_dtype=torch_dtype,
-            device=device,
+            low_cpu_mem_usage=True,
+            use_safetensors=True,
+            local_files_only=False,
+            mirror='https://hf-mirror.com',
+            trust_remote_code=True
+        )
+        update_status(f"模型 {model_id} 下载完成！")
+    except Exception as e:
+        print("\n模型下载失败，请检查网络连接")
+        print("详细错误信息：", str(e))
+        raise e
+
+    update_status(f"正在把模型移动到 {device}...")
+    model.to(device)
+
+    try:
+        update_status("正在下载处理器...")
+        processor = AutoProcessor.from_pretrained(
+            model_id,
+            local_files_only=False,
+            mirror='https://hf-mirror.com',
+            trust_remote_code=True
         )
+        update_status("处理器下载完成！")
+    except Exception as e:
+        print("\n处理器下载失败，请检查网络连接")
+        print("详细错误信息：", str(e))
+        raise e
+
+    pipe = pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=processor.tokenizer,
+        feature_extractor=processor.feature_extractor,
+        max_new_tokens=MAX_NEW_TOKENS,
+        chunk_length_s=15,
+        batch_size=16,
+        torch_dtype=torch_dtype,
+        device=device,
+    )
+    # 噪声、音乐片段上的重复循环提前停止（见 decoding_guard）；特征提取和推理阶段的内存计入当前任务（见 memory_guard）
+    return instrument_pipeline(guard_pipeline(pipe))
+
+def print_welcome():
+    """
+    打印启动欢迎信息
+    """
+    print("\n" + "="*50)
+    print("欢迎使用语音转文字工具，by-程 v1.0")
+    print("初次启动可能需要多等待一会，请耐心等待...")
+    print("建议使用Chrome浏览器以获得最佳体验~")
+    print("="*50 + "\n")
+
+def setup_whisper(model_id="openai/whisper-small"):
+    """
+    初始化并配置 Whisper 语音识别模型
+    """
+    try:
+        print_welcome()
+        print("正在从国内镜像下载模型，请稍候...")
+        pipe = build_pipeline(model_id)
         print("初始化完成！")
         return pipe
     except Exception as e:
@@ -255,10 +1124,36 @@ def process_text_with_punctuation(text):
     
     return result
 
-def transcribe_audio(pipe, audio_path, result_file_path, status_callback=None):
+def transcribe_audio(pipe, audio_path, result_file_path, status_callback=None, infer=None,
+                     low_memory=False, batch_size=None, tracker=None, metadata=None,
+                     cache=None, cache_scope='', profiler=None, options=None, pcm_cache=None,
+                     decode_stats=None, timer=None):
     """
     将音频文件转录为文本并保存结果
+
+    参数:
+        infer: 可选，接收音频数组并返回识别文本的函数（例如交给调度器排队执行）；
+               默认直接调用 pipe 识别整段音频
+        low_memory: 低内存执行方式：ffmpeg 直接转换、按段读取音频并逐段识别
+        batch_size: 可选，覆盖 pipeline 的批大小
+        tracker: 可选，MemoryTracker；不传时内部创建，各阶段内存峰值写入结果元数据
+        metadata: 可选，写入结果元数据的附加信息；传入 dict 时内存统计也会写回其中
+        cache: 可选，ChunkCache；传入时逐段识别，内容未变化的段复用上次的结果
+        cache_scope: 计算分段指纹时附带的配置，一般为模型名称
+        profiler: 可选，JobProfiler，记录推理的 PyTorch 跟踪（使用 infer 时由 infer 自行传递）
+        options: 可选，pipeline 调用参数（见 presets.pipeline_options）
+        pcm_cache: 可选，PcmCache，复用之前解码的 16kHz 音频；低内存模式下只使用已有的缓存
+        decode_stats: 可选，DecodeStats；不传时内部创建，循环检测节省的 token 和时间写入结果元数据
+                      （使用 infer 时由 infer 自行传递）
+        timer: 可选，InferenceTime；不传时内部创建，模型推理耗时写入结果元数据的 inference
+               （使用 infer 时由 infer 自行传递）
     """
+    if metadata is None:
+        metadata = {}
+    if decode_stats is None:
+        decode_stats = DecodeStats()
+    if timer is None:
+        timer = InferenceTime()
     try:
         def update_status(message):
             logging.info(message)
@@ -267,24 +1162,90 @@ def transcribe_audio(pipe, audio_path, result_file_path, status_callback=None):
         
         update_status("开始新的转录会话...")
         update_status(f"开始处理音频文件: {audio_path}")
-        
-        # 转换音频格式
-        wav_path = convert_audio_to_wav(audio_path)
-        update_status(f"音频格式转换完成: {wav_path}")
-        
-        # 加载音频
-        update_status("正在加载音频文件...")
-        audio, sr = librosa.load(wav_path, sr=16000)
-        
-        # 如果是临时文件，处理完后删除
-        if wav_path != audio_path:
-            try:
-                os.remove(wav_path)
-            except:
-                pass
-        
-        update_status("正在进行语音识别...")
-        result = pipe(audio)
+
+        with contextlib.ExitStack() as cleanup:
+            if tracker is None:
+                tracker = cleanup.enter_context(MemoryTracker())
+
+            audio = None
+            pcm_cache_hit = None
+            with tracker.stage("decode"):
+                if pcm_cache is not None:
+                    if low_memory:
+                        # 低内存模式不把整段解码结果放进内存，只映射已有的缓存
+                        audio = pcm_cache.get(pcm_cache.key(audio_path))
+                        pcm_cache_hit = audio is not None
+                    else:
+                        audio, pcm_cache_hit = pcm_cache.load(audio_path, lambda: read_audio_file(audio_path))
+                if audio is not None:
+                    pass
+                elif not low_memory and is_video_container(audio_path) and get_ffmpeg_binary() is not None:
+                    # 视频文件只解码音频流，PCM 直接读入内存，不经过 pydub 和临时 WAV 文件
+                    audio = decode_audio_stream(audio_path, sr=16000)
+                else:
+                    # 转换音频格式
+                    wav_path = convert_audio_to_wav(audio_path, low_memory=low_memory)
+            if pcm_cache_hit is not None:
+                metadata["pcm_cache_hit"] = pcm_cache_hit
+
+            if pcm_cache_hit:
+                update_status("音频格式转换完成: 使用缓存的解码结果")
+            elif audio is not None and pcm_cache is not None:
+                update_status("音频格式转换完成: 解码结果已保存到缓存")
+            elif audio is not None:
+                update_status("音频格式转换完成: 已直接解码视频中的音频流")
+            else:
+                update_status(f"音频格式转换完成: {wav_path}")
+                if wav_path != audio_path:
+                    # 临时文件识别结束后删除
+                    cleanup.callback(_remove_quietly, wav_path)
+
+                # 加载音频
+                update_status("正在加载音频文件...")
+                with tracker.stage("load"):
+                    if low_memory:
+                        audio = PcmWindowReader.open(wav_path, sr=16000)
+                    if audio is None:
+                        low_memory = False
+                        audio, sr = load_audio(wav_path, sr=16000)
+                        # 临时文件的映射视图需先复制出来，否则 Windows 下无法删除
+                        if wav_path != audio_path and isinstance(audio, np.memmap):
+                            audio = np.array(audio)
+                    else:
+                        cleanup.callback(audio.close)
+            audio_seconds = len(audio) / 16000
+
+            update_status("正在进行语音识别...")
+            if infer is not None:
+                result = {"text": infer(audio)}
+            elif low_memory or cache is not None:
+                text, segment_stats = transcribe_segments(pipe, audio, batch_size=batch_size, tracker=tracker,
+                                                          cache=cache, scope=cache_scope, profiler=profiler,
+                                                          options=options, decode_stats=decode_stats,
+                                                          timer=timer)
+                result = {"text": text}
+                metadata.update(segment_stats)
+                if segment_stats["cached_segments"]:
+                    update_status(f"{segment_stats['segments']} 段中有 {segment_stats['cached_segments']} 段内容未变化，"
+                                  f"已复用上次的识别结果")
+            else:
+                with inference_lock, timer.measure(audio_seconds), tracking(tracker), collecting(decode_stats), \
+                        profiled_inference(profiler):
+                    result = pipe(audio, **_call_kwargs(options, batch_size))
+            del audio
+
+        metadata.update({
+            "audio_path": str(audio_path),
+            "audio_seconds": round(audio_seconds, 2),
+            "low_memory": low_memory,
+            "batch_size": batch_size,
+            "memory": tracker.report(),
+            "decoding": decode_stats.report(),
+            "inference": timer.report(),
+        })
+        truncation_warning = decode_stats.truncation_warning()
+        if truncation_warning:
+            update_status(f"⚠️ {truncation_warning}")
         
         # 处理转录文本，添加标点符号
         text = result["text"]
@@ -293,12 +1254,8 @@ def transcribe_audio(pipe, audio_path, result_file_path, status_callback=None):
         
         # 保存转录结果
         update_status("正在保存转录结果...")
-        with open(result_file_path, 'w', encoding='utf-8') as f:
-            f.write(f"音频文件: {audio_path}\n")
-            f.write(f"转录时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"识别语言: {result.get('language', 'unknown')}\n")
-            f.write("\n转录内容:\n")
-            f.write(result["text"])
+        save_transcript(result_file_path, audio_path, result["text"], result.get('language', 'unknown'))
+        save_metadata(result_file_path, metadata)
         
         update_status(f"✅ 转录完成！结果已保存到: {result_file_path}")
         return result["text"]
@@ -0,0 +1,123 @@
+"""
+转录 worker 进程
+
+从任务代理领取任务、加载模型进行识别并写回结果。可以在多台主机上启动任意数量的 worker，
+它们共享同一个代理；音频文件需放在所有主机都能以相同路径访问的共享目录中。
+
+用法:
+    python worker.py --broker sqlite:///E:/whisper_queue/jobs.db
+    python worker.py --broker file:///mnt/share/whisper_queue
+    python worker.py --broker redis://192.168.1.10:6379/0
+"""
+
+import os
+import time
+import socket
+import logging
+import argparse
+import threading
+
+from job_broker import HEARTBEAT_TIMEOUT, create_broker
+from chunk_cache import default_chunk_cache
+from pcm_cache import default_pcm_cache
+from memory_guard import MemoryGuard
+from model_registry import ModelRegistry
+from presets import cache_scope, get_preset, pipeline_options
+from whisper_transcriber import probe_audio, setup_directories_and_logging, transcribe_audio
+
+# 心跳间隔，远小于超时时间，偶尔丢一次心跳不会被判定失联
+HEARTBEAT_INTERVAL = HEARTBEAT_TIMEOUT / 4
+# 队列为空时的轮询间隔
+POLL_INTERVAL = 2.0
+
+# worker 一次只处理一个任务，预算只用于选择执行方式
+memory_guard = MemoryGuard()
+# 分段识别结果缓存，多个 worker 可以通过 WHISPER_CHUNK_CACHE_DIR 共用同一个目录
+chunk_cache = default_chunk_cache()
+# 解码结果缓存（WHISPER_PCM_CACHE=1 时开启），同样可以通过 WHISPER_PCM_CACHE_DIR 共用
+pcm_cache = default_pcm_cache()
+
+def run_job(registry, broker, job, worker_id):
+    """
+    执行一个任务，执行期间后台线程定期发送心跳
+    """
+    job_id = job["job_id"]
+    payload = job["payload"]
+    stop = threading.Event()
+
+    def send_heartbeats():
+        while not stop.wait(HEARTBEAT_INTERVAL):
+            try:
+                if not broker.heartbeat(job_id, worker_id):
+                    logging.warning(f"任务 {job_id} 已被重新分配，本次结果将被丢弃")
+            except Exception as e:
+                logging.warning(f"发送心跳失败: {str(e)}")
+
+    heartbeat_thread = threading.Thread(target=send_heartbeats, daemon=True)
+    heartbeat_thread.start()
+    logging.info(f"领取任务 {job_id}（第 {job['attempts']} 次）: {payload.get('filename', payload['audio_path'])}")
+    try:
+        _, result_file_path = setup_directories_and_logging()
+        start_time = time.time()
+        preset = get_preset(payload.get("preset"))
+        model_name = payload.get("model") or preset["model"]
+        memory_plan = memory_guard.plan(probe_audio(payload["audio_path"]), batch_size=preset["batch_size"])
+        batch_size = memory_plan["batch_size"] if memory_plan["low_memory"] else None
+        metadata = {"model": model_name, "preset": preset["name"],
+                    "projected_memory_mb": memory_plan["projected_mb"]}
+        with registry.acquire(model_name, preset["dtype"]) as pipe:
+            text = transcribe_audio(pipe, payload["audio_path"], result_file_path,
+                                    low_memory=memory_plan["low_memory"], batch_size=batch_size,
+                                    metadata=metadata, cache=chunk_cache,
+                                    cache_scope=cache_scope(preset, model_name),
+                                    options=pipeline_options(preset), pcm_cache=pcm_cache)
+        broker.complete(job_id, worker_id, {
+            "text": text,
+            "result_file": str(result_file_path),
+            "worker_id": worker_id,
+            "elapsed_seconds": round(time.time() - start_time, 2),
+            "memory": metadata["memory"],
+            "inference": metadata["inference"],
+        })
+        logging.info(f"任务 {job_id} 完成")
+    except Exception as e:
+        logging.error(f"任务 {job_id} 失败: {str(e)}")
+        broker.fail(job_id, worker_id, str(e))
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="转录 worker 进程")
+    parser.add_argument("--broker", default=os.environ.get("WHISPER_BROKER"),
+                        help="任务代理地址，默认读取环境变量 WHISPER_BROKER")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+    if not args.broker:
+        parser.error("请通过 --broker 或环境变量 WHISPER_BROKER 指定任务代理地址")
+
+    setup_directories_and_logging()
+    broker = create_broker(args.broker)
+    registry = ModelRegistry()
+    # 预先加载默认模型，其他模型在任务需要时再加载
+    registry.get()
+    logging.info(f"worker {args.worker_id} 已启动，代理: {args.broker}")
+
+    while True:
+        try:
+            requeued = broker.requeue_stale()
+            if requeued:
+                logging.info(f"重新排队了 {requeued} 个失联 worker 的任务")
+            job = broker.claim(args.worker_id)
+        except Exception as e:
+            logging.error(f"访问任务代理失败: {str(e)}")
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        run_job(registry, broker, job, args.worker_id)
+
+if __name__ == "__main__":
+    main()